@@ -51,11 +51,28 @@ export default function Home() {
 
       // PHASE 2: GENERATION
       // This is another network call, ~2-5s
-      // Sending context back to server is stateless and efficient
-      const generateRes = await axios.post(`${API_BASE}/api/answer`, {
-        question: query,
-        context_docs: contextDocs
-      });
+      // The server keeps the retrieved context; we only send its handle back.
+      // If the handle expired (or hit another instance) fall back to sending the docs.
+      const contextId = retrieveRes.data.context_id;
+      let generateRes;
+      try {
+        generateRes = await postAnswer(API_BASE, contextId
+          ? { question: query, context_id: contextId }
+          : { question: query, context_docs: contextDocs });
+      } catch (err: any) {
+        if (!contextId || err?.response?.status !== 409) throw err;
+        generateRes = await postAnswer(API_BASE, {
+          question: query,
+          context_docs: contextDocs
+        });
+      }
+
+      // Answers only carry the query point; the static map is fetched once per version
+      let visData = generateRes.data.vis_data;
+      if (visData && !visData.map_points) {
+        const mapPoints = await loadMapPoints(API_BASE, visData.map_version);
+        visData = mapPoints.length > 0 ? { ...visData, map_points: mapPoints } : null;
+      }
 
       // Done
       if (progressTimer) clearInterval(progressTimer);
@@ -65,7 +82,7 @@ export default function Home() {
       // Construct final response object compatible with UI
       const finalResult = {
         answer: generateRes.data.answer,
-        vis_data: generateRes.data.vis_data, // Capture vis_data
+        vis_data: visData, // Capture vis_data
         sources: contextDocs.map((doc: any) => ({
           madde: doc.madde_no,
           text: doc.text,
@@ -346,6 +363,31 @@ function LegislationReader({ targetId, source }: { targetId: string, source: str
 }
 
 
+// Static map points, cached per version (browser HTTP cache handles reloads)
+const mapCache: { [version: string]: any[] } = {};
+// 504 = the answer deadline ran out before any model replied: show the server's
+// apology as the answer (like a 200 with every model failed) instead of an error popup.
+async function postAnswer(apiBase: string, body: any) {
+  try {
+    return await axios.post(`${apiBase}/api/answer`, body);
+  } catch (err: any) {
+    if (err?.response?.status !== 504) throw err;
+    return { data: { answer: err.response.data?.detail || "Yanıt süresi doldu. Lütfen tekrar deneyin.", vis_data: null } };
+  }
+}
+
+async function loadMapPoints(apiBase: string, version: string): Promise<any[]> {
+  if (mapCache[version]) return mapCache[version];
+  try {
+    const res = await axios.get(`${apiBase}/api/map`, { params: { v: version } });
+    mapCache[version] = res.data.map_points || [];
+  } catch (error) {
+    console.error(error);
+    return [];
+  }
+  return mapCache[version];
+}
+
 // Interactive Map Component
 function EmbeddingMap({ visData }: { visData: any }) {
   if (!visData || !visData.map_points) return null;
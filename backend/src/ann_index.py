@@ -0,0 +1,200 @@
+"""
+Approximate nearest-neighbour index (IVF, pure NumPy) for large corpora.
+
+Rows of the compiled embedding matrix are clustered with spherical k-means into
+`nlist` inverted lists. A query scores the centroids, then only the rows of the
+`nprobe` closest lists: nprobe is the recall/latency knob (nprobe = nlist is exact).
+
+  <prefix>.ivf.npz   centroids (nlist, D), offsets (nlist + 1), order (N,) row ids grouped by list
+
+The index is tied to the matrix version in <prefix>.meta.json and ignored if stale.
+Corpora below ANN_MIN_DOCS are searched exactly (a full scan is already sub-millisecond).
+
+Usage (from repo root):
+  python backend/src/ann_index.py build [prefix] [--nlist N]
+  python backend/src/ann_index.py bench [prefix] [--k 5] [--queries 200] [--synthetic N]
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from index_artifact import load_index, normalize_rows
+
+ANN_MIN_DOCS = int(os.getenv("ANN_MIN_DOCS", "5000"))
+DEFAULT_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+ASSIGN_BATCH = 4096 # Rows per assignment step, bounds the (rows, nlist) score block
+
+def ivf_path(prefix: str) -> str:
+    return prefix + ".ivf.npz"
+
+def default_nlist(n: int) -> int:
+    return max(1, min(4096, int(4 * np.sqrt(n))))
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    labels = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], ASSIGN_BATCH):
+        block = np.asarray(matrix[start:start + ASSIGN_BATCH], dtype=np.float32)
+        labels[start:start + ASSIGN_BATCH] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+def train_centroids(matrix: np.ndarray, nlist: int, iterations: int = 20, sample: int = 256, seed: int = 42) -> np.ndarray:
+    """Spherical k-means on (a sample of) unit rows; empty clusters are re-seeded from random rows."""
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    train = matrix[np.sort(rng.choice(n, min(n, nlist * sample), replace=False))]
+    train = np.asarray(train, dtype=np.float32)
+    centroids = train[rng.choice(train.shape[0], nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, train)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = train[rng.choice(train.shape[0], int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, order: np.ndarray, version: str = None):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.order = order
+        self.version = version
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: int = None, version: str = None, **kwargs) -> "IVFIndex":
+        nlist = min(nlist or default_nlist(matrix.shape[0]), matrix.shape[0])
+        centroids = train_centroids(matrix, nlist, **kwargs)
+        labels = _assign(matrix, centroids)
+        order = np.argsort(labels, kind="stable").astype(np.int32) # Corpus order inside each list
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))]).astype(np.int64)
+        return cls(centroids, offsets, order, version)
+
+    def save(self, path: str):
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, centroids=self.centroids, offsets=self.offsets, order=self.order,
+                     version=np.array(self.version or ""))
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["centroids"], data["offsets"], data["order"], str(data["version"]) or None)
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Row ids in the nprobe lists closest to a unit query vector."""
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_scores = self.centroids @ query
+        lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        return np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+
+    def search(self, matrix: np.ndarray, query: np.ndarray, k: int, nprobe: int = DEFAULT_NPROBE, row_mask: np.ndarray = None):
+        """
+        (row ids, similarities) of the approximate top k, best first. row_mask: (N,) bool, rows allowed.
+        If the probed lists hold fewer than k (allowed) rows, nprobe doubles until they do or every list is probed.
+        """
+        nprobe = max(1, min(nprobe, self.nlist))
+        while True:
+            ids = self.probe(query, nprobe)
+            if row_mask is not None:
+                ids = ids[row_mask[ids]]
+            # A filter (e.g. one small statute) can leave the closest lists nearly empty
+            if ids.size >= k or nprobe >= self.nlist:
+                break
+            nprobe = min(nprobe * 2, self.nlist)
+        if ids.size == 0:
+            return ids.astype(np.int64), np.empty(0, dtype=np.float32)
+        ids.sort() # Sequential reads from the (memory-mapped) matrix
+        scores = matrix[ids] @ query
+        k = min(k, ids.size)
+        top = np.argpartition(-scores, k - 1)[:k] if k < ids.size else np.arange(ids.size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return ids[top].astype(np.int64), scores[top]
+
+def load_ivf(prefix: str, version: str = None):
+    """IVF index for a compiled matrix, or None if missing or built for another version."""
+    path = ivf_path(prefix)
+    if not os.path.exists(path):
+        return None
+    index = IVFIndex.load(path)
+    if version is not None and index.version != version:
+        print(f"Ignoring stale ANN index {path} (built for {index.version}, matrix is {version})")
+        return None
+    return index
+
+def build_ivf(prefix: str, nlist: int = None) -> IVFIndex:
+    matrix, sidecar = load_index(prefix)
+    started = time.time()
+    index = IVFIndex.build(matrix, nlist=nlist, version=sidecar.get("version"))
+    index.save(ivf_path(prefix))
+    print(f"ANN index: {index.nlist} lists over {matrix.shape[0]} rows in {time.time() - started:.1f}s")
+    return index
+
+# --- recall benchmark --------------------------------------------------------
+
+def exact_top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    sims = queries @ matrix.T
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1), axis=1)
+
+def synthetic_corpus(n: int, dim: int = 768, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, shaped roughly like a multi-statute embedding corpus."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    rows = centers[rng.integers(0, clusters, n)] + 0.8 * rng.standard_normal((n, dim)).astype(np.float32)
+    return normalize_rows(rows)
+
+def sample_queries(matrix: np.ndarray, count: int, noise: float = 0.5, seed: int = 1) -> np.ndarray:
+    """Perturbed corpus rows: near-duplicates of real documents, like paraphrased questions."""
+    rng = np.random.default_rng(seed)
+    base = np.asarray(matrix[rng.choice(matrix.shape[0], count, replace=True)], dtype=np.float32)
+    noise_rows = normalize_rows(rng.standard_normal(base.shape).astype(np.float32))
+    return normalize_rows(base + noise * noise_rows)
+
+def benchmark(matrix: np.ndarray, index: IVFIndex, queries: np.ndarray, k: int = 5, nprobes=None) -> dict:
+    truth = exact_top_k(matrix, queries, k)
+    started = time.perf_counter()
+    for q in queries: # One query at a time, like a request
+        exact_top_k(matrix, q[None, :], k)
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    rows = []
+    for nprobe in nprobes or [1, 2, 4, 8, 16, 32, 64]:
+        if nprobe > index.nlist:
+            break
+        hits = 0
+        started = time.perf_counter()
+        for q, expected in zip(queries, truth):
+            ids, _ = index.search(matrix, q, k, nprobe)
+            hits += len(set(ids.tolist()) & set(expected.tolist()))
+        ms = (time.perf_counter() - started) * 1000 / len(queries)
+        rows.append({"nprobe": nprobe, f"recall@{k}": round(hits / truth.size, 4), "ms_per_query": round(ms, 3)})
+    return {"docs": matrix.shape[0], "nlist": index.nlist, "k": k, "exact_ms_per_query": round(exact_ms, 3), "results": rows}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or benchmark the IVF ANN index")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("prefix", nargs="?", default="backend/data/embeddings_gemini")
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--synthetic", type=int, default=0, help="Benchmark on N synthetic rows instead of the corpus")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_ivf(args.prefix, args.nlist)
+    else:
+        if args.synthetic:
+            matrix = synthetic_corpus(args.synthetic)
+            index = IVFIndex.build(matrix, nlist=args.nlist)
+        else:
+            matrix, sidecar = load_index(args.prefix)
+            index = load_ivf(args.prefix, sidecar.get("version")) or IVFIndex.build(matrix, nlist=args.nlist)
+        report = benchmark(matrix, index, sample_queries(matrix, args.queries), k=args.k)
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,120 @@
+"""
+Answer cache for /api/answer.
+
+An answer is reusable when it was generated from the same articles of the
+same corpus build for the same (or practically the same) question:
+  - exact hit: normalized question + context key + corpus version
+  - semantic hit: same context key + version, and the cached question's embedding
+    has cosine similarity >= threshold with the new one (paraphrases)
+"""
+import hashlib
+import threading
+import numpy as np
+from ttl_cache import TTLCache, normalize_question
+
+def context_key(context_docs: list) -> str:
+    """
+    Order-independent id of the context: sorted "source:madde" ids plus a hash of what the
+    prompt is built from (number, topic, text). /api/answer accepts client-sent context_docs,
+    so ids alone would let forged text under a real article id into everyone's cached answer.
+    """
+    docs = sorted(
+        (f"{d.get('metadata', {}).get('source', 'Anayasa')}:{d.get('madde_no')}",
+         f"{d.get('madde_no')}\x1f{d.get('metadata', {}).get('konu', '')}\x1f{d.get('text', '')}")
+        for d in context_docs
+    )
+    digest = hashlib.sha1("\x1e".join(content for _, content in docs).encode("utf-8")).hexdigest()[:16]
+    return "|".join(doc_id for doc_id, _ in docs) + "#" + digest
+
+class AnswerCache:
+    def __init__(self, max_size: int = 512, ttl: float = None, similarity_threshold: float = 0.95):
+        self.similarity_threshold = similarity_threshold
+        self.entries = TTLCache(max_size=max_size, ttl=ttl, on_evict=self._evicted) # exact key -> entry
+        self.by_context = {} # (version, context key) -> [exact keys], for the semantic lookup
+        self.version = None
+        self.semantic_hits = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        # Index rebuilt -> every cached answer may cite stale articles
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self.entries.clear()
+                    self.by_context = {}
+                    self.version = version
+
+    @staticmethod
+    def _unit(embedding):
+        if embedding is None:
+            return None
+        v = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else None
+
+    def lookup(self, question: str, context_docs: list, version: str = None, embedding=None):
+        """Cached entry dict ({"answer", "model_name", ...}) or None."""
+        self._check_version(version)
+        ctx = context_key(context_docs)
+        entry = self.entries.get(f"{version}|{ctx}|{normalize_question(question)}")
+        if entry is not None or embedding is None:
+            return entry
+
+        query = self._unit(embedding)
+        if query is None:
+            return None
+        with self._lock:
+            keys = list(self.by_context.get((version, ctx), []))
+        best, best_sim = None, self.similarity_threshold
+        for key in keys:
+            candidate = self.entries.peek(key)
+            if candidate is None or candidate["embedding"] is None:
+                continue
+            sim = float(candidate["embedding"] @ query)
+            if sim >= best_sim:
+                best, best_sim = candidate, sim
+        if best is not None:
+            self.semantic_hits += 1
+        return best
+
+    def put(self, question: str, context_docs: list, answer: str, model_name: str, version: str = None, embedding=None):
+        self._check_version(version)
+        ctx = context_key(context_docs)
+        key = f"{version}|{ctx}|{normalize_question(question)}"
+        self.entries.put(key, {
+            "answer": answer,
+            "model_name": model_name,
+            "embedding": self._unit(embedding),
+            "context": (version, ctx),
+        })
+        with self._lock:
+            keys = self.by_context.setdefault((version, ctx), [])
+            if key not in keys:
+                keys.append(key)
+
+    def _evicted(self, key, entry):
+        # Keeps by_context as small as the entries themselves: no list outlives its last entry
+        with self._lock:
+            keys = self.by_context.get(entry["context"])
+            if keys is None:
+                return
+            if key in keys:
+                keys.remove(key)
+            if not keys:
+                del self.by_context[entry["context"]]
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.by_context = {}
+
+    def stats(self) -> dict:
+        stats = self.entries.stats()
+        # A semantic hit first misses the exact lookup; count it once, as a hit
+        stats["exact_hits"] = stats["hits"]
+        stats["semantic_hits"] = self.semantic_hits
+        stats["hits"] += self.semantic_hits
+        stats["misses"] -= self.semantic_hits
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / total, 4) if total else 0.0
+        return stats
@@ -0,0 +1,304 @@
+"""
+Retrieval hot-path micro-benchmark over synthetic corpora of growing size.
+
+For each corpus size a synthetic legislation corpus shaped like chunks.json
+(sources of ~200 articles, madde numbers, konu + text drawn from the real
+vocabulary) is generated, embedded with a deterministic fake embedder (no
+network), compiled like precompute_embeddings.py would (npy + sidecar, IVF
+index from ANN_MIN_DOCS) and loaded through the real RAGEngine. Then per query:
+
+  query     VectorStoreVercel.query (embedding cache hit + vector search)
+  retrieve  RAGEngine.retrieve (vector + BM25 candidates, re-ranking, filtering)
+  prompt    RAGEngine.generate_prompt_content
+  vis       main.calculate_vis_data
+
+Latency is measured without tracing; peak Python/NumPy memory (tracemalloc) in a
+second pass, so tracing overhead does not leak into the timings. Memory-mapped
+matrix pages are not allocations and do not show up there.
+
+With a baseline (a previous report), stages whose p50 or peak memory grew by more
+than --tolerance are reported as regressions and the exit code is 1.
+
+Usage (from repo root):
+  python backend/src/benchmark.py                                   # 200, 10k, 100k articles
+  python backend/src/benchmark.py --sizes 200,10000 --queries 100
+  python backend/src/benchmark.py --save-baseline                   # refresh the stored baseline
+  python backend/src/benchmark.py --baseline none                   # no comparison
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SRC_DIR)
+# Nothing below talks to Gemini (query embeddings are pre-seeded in the cache)
+os.environ.setdefault("GEMINI_API_KEY", "offline")
+
+from bm25_index import tokenize
+from ann_index import ANN_MIN_DOCS, build_ivf
+from index_artifact import write_index
+
+DEFAULT_SIZES = [200, 10000, 100000]
+DEFAULT_BASELINE = "backend/data/benchmark_baseline.json"
+CHUNKS_PATH = "backend/data/chunks.json"
+STAGES = ["query", "retrieve", "prompt", "vis"]
+ARTICLES_PER_SOURCE = 200
+TOPICS = 300
+# Differences below these are noise, whatever the ratio
+MIN_DELTA_MS = 0.05
+MIN_DELTA_KB = 64
+
+class FakeEmbedder:
+    """
+    Deterministic bag-of-stems embedder: each stem (bm25_index.tokenize) gets a fixed
+    random direction seeded by its hash, a text is the sum of its stems. Texts sharing
+    words end up close, so the vector side of the search behaves roughly like real
+    embeddings and the same input always gives the same vector.
+    """
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+        self.stem_vectors = {}
+
+    def stem_vector(self, stem: str) -> np.ndarray:
+        vector = self.stem_vectors.get(stem)
+        if vector is None:
+            seed = int.from_bytes(hashlib.md5(stem.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self.stem_vectors[stem] = vector
+        return vector
+
+    def embed(self, text: str) -> np.ndarray:
+        stems = tokenize(text)
+        if not stems:
+            return np.zeros(self.dim, dtype=np.float32)
+        return np.sum([self.stem_vector(s) for s in stems], axis=0)
+
+def load_vocabulary(chunks_path: str = CHUNKS_PATH) -> list:
+    """Words of the real corpus, so BM25 postings have realistic lengths and stems."""
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    words = {}
+    for c in chunks:
+        for w in c["text"].split():
+            w = w.strip(".,;:()\"'–-")
+            if len(w) > 2 and not w.isdigit():
+                words[w] = None
+    return sorted(words)
+
+def synthetic_chunks(n: int, vocabulary: list, seed: int = 0) -> list:
+    """n chunks shaped like chunks.json: sources of ARTICLES_PER_SOURCE articles, topical word mixes."""
+    rng = np.random.default_rng(seed)
+    vocab = np.array(vocabulary, dtype=object)
+    topics = [rng.choice(len(vocab), 40, replace=False) for _ in range(TOPICS)]
+    chunks = []
+    for i in range(n):
+        s, madde = divmod(i, ARTICLES_PER_SOURCE)
+        madde += 1
+        source = "Anayasa" if s == 0 else f"Kanun {s}"
+        topic = topics[rng.integers(TOPICS)]
+        konu = " ".join(vocab[rng.choice(topic, rng.integers(2, 6))])
+        length = int(rng.integers(25, 90))
+        # Mostly topic words, some general vocabulary
+        words = np.where(rng.random(length) < 0.7, rng.choice(topic, length), rng.integers(0, len(vocab), length))
+        text = f"KONU: {konu}\nMadde {madde} – " + " ".join(vocab[words]) + "."
+        chunks.append({
+            "id": f"MADDE {madde}" if s == 0 else f"{source} MADDE {madde}",
+            "madde_no": madde,
+            "text": text,
+            "metadata": {"source": source, "madde": madde, "konu": konu, "page": 1 + madde // 3},
+        })
+    return chunks
+
+def synthetic_questions(chunks: list, count: int, seed: int = 1) -> list:
+    """Questions about random articles: topic words plus a few text words, some asking "Madde X" directly."""
+    rng = np.random.default_rng(seed)
+    questions = []
+    for i in rng.choice(len(chunks), count, replace=True):
+        chunk = chunks[int(i)]
+        body = chunk["text"].split("– ", 1)[-1].split()
+        picked = " ".join(body[j] for j in sorted(rng.choice(len(body), min(4, len(body)), replace=False)))
+        if rng.random() < 0.2:
+            questions.append(f"Madde {chunk['metadata']['madde']} {picked} nedir?")
+        else:
+            questions.append(f"{chunk['metadata']['konu']} {picked} nedir?")
+    return questions
+
+def write_corpus(chunks: list, embedder: FakeEmbedder, work_dir: str) -> str:
+    """Compiled index (+ IVF for large corpora) and map coords, laid out like backend/data. Returns the JSON path."""
+    embeddings_path = os.path.join(work_dir, "embeddings_gemini.json")
+    prefix = os.path.splitext(embeddings_path)[0]
+    records = [{"id": c["id"], "text": c["text"], "metadata": c["metadata"], "embedding": embedder.embed(c["text"])}
+               for c in chunks]
+    write_index(records, prefix)
+    if len(chunks) >= ANN_MIN_DOCS:
+        build_ivf(prefix)
+
+    rng = np.random.default_rng(2)
+    coords = [{"id": c["id"], "x": round(float(x), 4), "y": round(float(y), 4),
+               "madde": c["metadata"]["madde"], "source": c["metadata"]["source"]}
+              for c, (x, y) in zip(chunks, rng.random((len(chunks), 2)))]
+    with open(os.path.join(work_dir, "visualization_coords.json"), "w", encoding="utf-8") as f:
+        json.dump(coords, f, ensure_ascii=False)
+    return embeddings_path
+
+def summarize(samples_ms: list) -> dict:
+    samples = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        "mean_ms": round(float(samples.mean()), 4),
+    }
+
+def run_stages(engine, question: str, measure):
+    """One question through every stage; measure(stage, fn, *args) calls fn and records what it wants."""
+    import main
+    measure("query", engine.vector_store.query, question, 5)
+    context_docs = main.build_context_docs(measure("retrieve", engine.retrieve, question))
+    measure("prompt", engine.generate_prompt_content, question, context_docs)
+    measure("vis", main.calculate_vis_data, context_docs)
+
+def untimed(stage, fn, *args):
+    return fn(*args)
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def __call__(self, stage, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        self.samples[stage].append((time.perf_counter() - started) * 1000)
+        return result
+
+class StagePeakMemory:
+    """Largest tracemalloc peak per stage (tracemalloc must be running)."""
+
+    def __init__(self):
+        self.peaks = {stage: 0 for stage in STAGES}
+
+    def __call__(self, stage, fn, *args):
+        tracemalloc.reset_peak()
+        result = fn(*args)
+        self.peaks[stage] = max(self.peaks[stage], tracemalloc.get_traced_memory()[1])
+        return result
+
+def bench_size(n: int, vocabulary: list, queries: int, dim: int, work_dir: str) -> dict:
+    import main
+    from coords_index import CoordsIndex
+    from rag_engine import RAGEngine
+
+    embedder = FakeEmbedder(dim)
+    result = {"docs": n}
+    # Backend logs (load messages) go to stderr, stdout stays the report
+    with contextlib.redirect_stdout(sys.stderr):
+        started = time.perf_counter()
+        chunks = synthetic_chunks(n, vocabulary)
+        embeddings_path = write_corpus(chunks, embedder, work_dir)
+        result["build_s"] = round(time.perf_counter() - started, 2)
+
+        questions = synthetic_questions(chunks, queries)
+        query_vectors = [embedder.embed(q) for q in questions]
+
+        # Load twice: timed, then traced (tracemalloc slows the BM25 build several times over)
+        started = time.perf_counter()
+        engine = RAGEngine(embeddings_path=embeddings_path)
+        engine._initialize_lazy()
+        result["load_s"] = round(time.perf_counter() - started, 3)
+        tracemalloc.start()
+        RAGEngine(embeddings_path=embeddings_path)._initialize_lazy()
+        result["load_peak_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+
+        store = engine.vector_store
+        store.embedding_cache.max_size = max(store.embedding_cache.max_size, 2 * len(questions))
+        for q, v in zip(questions, query_vectors):
+            store.embedding_cache.put_vector(q, v)
+        main.coords_index = CoordsIndex(os.path.join(work_dir, "visualization_coords.json"))
+
+        for q in questions[:10]: # Warm-up: page in the matrix, fill the BM25 / numpy code paths
+            run_stages(engine, q, untimed)
+
+        timer = StageTimer()
+        for q in questions:
+            run_stages(engine, q, timer)
+
+        memory = StagePeakMemory()
+        tracemalloc.start()
+        for q in questions:
+            run_stages(engine, q, memory)
+        tracemalloc.stop()
+
+    result["ann"] = store.ann is not None
+    result["stages"] = {stage: {**summarize(timer.samples[stage]), "peak_kb": round(memory.peaks[stage] / 1024, 1)}
+                        for stage in STAGES}
+    main.coords_index = None
+    return result
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Stages slower / hungrier than the baseline by more than tolerance (a fraction, 0.5 = +50%)."""
+    regressions = []
+    old_sizes = {r["docs"]: r for r in baseline.get("results", [])}
+    for current in report["results"]:
+        old = old_sizes.get(current["docs"])
+        if old is None:
+            continue
+        checks = [("load_s", current["load_s"] * 1000, old["load_s"] * 1000, MIN_DELTA_MS, "ms")]
+        for stage, now in current["stages"].items():
+            before = old["stages"].get(stage)
+            if before:
+                checks.append((f"{stage}.p50_ms", now["p50_ms"], before["p50_ms"], MIN_DELTA_MS, "ms"))
+                checks.append((f"{stage}.peak_kb", now["peak_kb"], before["peak_kb"], MIN_DELTA_KB, "kb"))
+        for name, now, before, min_delta, unit in checks:
+            if now > before * (1 + tolerance) and now - before > min_delta:
+                regressions.append({"docs": current["docs"], "metric": name, "baseline": before, "current": now,
+                                    "ratio": round(now / before, 2) if before else None})
+    return regressions
+
+def run_benchmark(sizes, queries: int = 200, dim: int = 768, work_dir: str = None) -> dict:
+    vocabulary = load_vocabulary()
+    report = {"config": {"sizes": sizes, "queries": queries, "dim": dim, "ann_min_docs": ANN_MIN_DOCS,
+                         "numpy": np.__version__, "python": sys.version.split()[0]},
+              "results": []}
+    for n in sizes:
+        with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+            print(f"Benchmarking {n} docs...", file=sys.stderr)
+            report["results"].append(bench_size(n, vocabulary, queries, dim, tmp))
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval hot-path benchmark over synthetic corpora")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma separated corpus sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--work-dir", default=None, help="Where the temporary corpora go (default: system temp)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Report to compare against, 'none' to skip")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed growth before flagging, 0.5 = +50%%")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--output", default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report = run_benchmark([int(s) for s in args.sizes.split(",")], args.queries, args.dim, args.work_dir)
+    regressions = []
+    if args.baseline != "none" and os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report["baseline"] = args.baseline
+        report["regressions"] = regressions
+
+    print(json.dumps(report, indent=2))
+    for path in [args.output, args.baseline if args.save_baseline else None]:
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+    if regressions:
+        for r in regressions:
+            print(f"REGRESSION {r['docs']} docs {r['metric']}: {r['baseline']} -> {r['current']}", file=sys.stderr)
+        sys.exit(1)
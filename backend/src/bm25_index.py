@@ -0,0 +1,105 @@
+"""
+BM25 inverted index over the corpus (konu + article text), used for the
+keyword side of hybrid retrieval in RAGEngine.
+
+Built once when the engine loads. A query only touches the postings of its
+own terms, so cost grows with the query's postings, not with corpus size.
+"""
+import math
+import re
+import numpy as np
+from typing import Dict, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Turkish dotted/dotless I: plain str.lower() turns "İ" into "i" + combining dot
+TURKISH_LOWER = str.maketrans({"I": "ı", "İ": "i"})
+# Turkish is agglutinative ("egemenlik", "egemenliğin", "egemenliği"...);
+# the first 5 characters is a cheap, well known stemmer for Turkish retrieval.
+STEM_LENGTH = 5
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases (Turkish aware), splits on non-word chars, truncates to the stem prefix."""
+    tokens = TOKEN_PATTERN.findall(text.translate(TURKISH_LOWER).lower())
+    return [t[:STEM_LENGTH] for t in tokens if len(t) > 1 or t.isdigit()]
+
+class BM25Field:
+    """Postings, document lengths and IDF for one text field."""
+
+    def __init__(self, texts: List[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(texts)
+
+        term_freqs = [] # per doc: {term: tf}
+        lengths = np.zeros(self.num_docs, dtype=np.float32)
+        for i, text in enumerate(texts):
+            tf = {}
+            tokens = tokenize(text)
+            for t in tokens:
+                tf[t] = tf.get(t, 0) + 1
+            term_freqs.append(tf)
+            lengths[i] = len(tokens)
+        self.doc_lengths = lengths
+        avgdl = float(lengths.mean()) if self.num_docs else 0.0
+        self.avgdl = avgdl or 1.0
+
+        # Collect postings, then freeze them into arrays
+        postings: Dict[str, Tuple[list, list]] = {}
+        for doc_id, tf in enumerate(term_freqs):
+            for term, count in tf.items():
+                ids, counts = postings.setdefault(term, ([], []))
+                ids.append(doc_id)
+                counts.append(count)
+
+        self.idf = {}
+        self.postings = {} # term -> (doc_ids int32, tf weight float32)
+        for term, (ids, counts) in postings.items():
+            ids = np.asarray(ids, dtype=np.int32)
+            tf = np.asarray(counts, dtype=np.float32)
+            # Document length normalization is fixed per doc, so the whole
+            # tf part of BM25 is precomputed here; a query only multiplies by idf.
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[ids] / self.avgdl)
+            self.postings[term] = (ids, tf * (self.k1 + 1) / (tf + norm))
+            df = len(ids)
+            self.idf[term] = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def score(self, terms: List[str]) -> Dict[int, float]:
+        """
+        BM25 scores for docs containing at least one term, scaled to roughly [0, 1]
+        by the score a doc would get matching every query term once.
+        """
+        terms = [t for t in dict.fromkeys(terms) if t in self.postings]
+        if not terms:
+            return {}
+
+        ids = np.concatenate([self.postings[t][0] for t in terms])
+        weights = np.concatenate([self.postings[t][1] * self.idf[t] for t in terms])
+        docs, inverse = np.unique(ids, return_inverse=True)
+        totals = np.bincount(inverse, weights=weights)
+
+        max_score = sum(self.idf[t] for t in terms)
+        totals = np.minimum(totals / max_score, 1.0) if max_score > 0 else totals * 0
+        return dict(zip(docs.tolist(), totals.tolist()))
+
+class BM25Index:
+    """Multi-field BM25 index. Doc ids are row indices into the vector store."""
+
+    def __init__(self, fields: Dict[str, List[str]], k1: float = 1.2, b: float = 0.75):
+        self.fields = {name: BM25Field(texts, k1=k1, b=b) for name, texts in fields.items()}
+
+    @classmethod
+    def from_store(cls, store) -> "BM25Index":
+        """Indexes the topic (konu) and article text of every document in a VectorStoreVercel."""
+        return cls({
+            "konu": [m.get("konu", "") for m in store.metadatas],
+            "text": list(store.texts),
+        })
+
+    def score(self, query: str, weights: Dict[str, float]) -> Dict[int, float]:
+        """Weighted sum of normalized per-field scores: {doc_id: score}."""
+        terms = tokenize(query)
+        combined = {}
+        for name, weight in weights.items():
+            for doc_id, s in self.fields[name].score(terms).items():
+                combined[doc_id] = combined.get(doc_id, 0.0) + weight * s
+        return combined
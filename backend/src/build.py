@@ -0,0 +1,243 @@
+"""
+Incremental build of the data artifacts:
+
+  PDFs (manifest.json) -> chunks.json -> embeddings_gemini.{json,npy,meta.json}
+       -> visualization_coords.json -> test_questions_100.json
+
+Every step is content-addressed, so a rebuild only redoes what changed:
+  - parse:      a document is re-parsed only if its PDF bytes (or source name) changed;
+                parsed articles are cached per document under data/.build/parts/
+  - embed:      a chunk is re-embedded only if content_hash() of its embedding input
+                has no vector in the previous embeddings file
+  - coords:     new/changed chunks are placed at the similarity-weighted mean of their
+                nearest unchanged neighbours; t-SNE reruns only with --full-coords (or
+                when most of the map is stale)
+  - questions:  regenerated only when chunks.json changed
+
+Amending one article therefore costs one embedding call, not one per article.
+
+Usage (from repo root):
+  python backend/src/build.py [--manifest PATH] [--workers N] [--full-coords] [--dry-run]
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from ingest_all import DATA_DIR, DEFAULT_MANIFEST, load_manifest, ingest_document, merge_parts, iter_jsonl
+from precompute_embeddings import EMBED_MODEL, content_hash, embed_chunks, save_embeddings, checkpoint_path_for
+from index_artifact import normalize_rows
+
+STATE_VERSION = 1
+NEIGHBOURS = 5 # Unchanged neighbours used to place a changed point on the map
+MAX_STALE_FRACTION = 0.5 # Beyond this, incremental placement drifts too far -> full t-SNE
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _write_json(path: str, data, **kwargs):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, **kwargs)
+    os.replace(path + ".tmp", path)
+
+class Build:
+    def __init__(self, data_dir: str = DATA_DIR, manifest_path: str = DEFAULT_MANIFEST, model: str = EMBED_MODEL):
+        self.data_dir = data_dir
+        self.manifest_path = manifest_path
+        self.model = model
+        self.parts_dir = os.path.join(data_dir, ".build", "parts")
+        self.state_path = os.path.join(data_dir, "build_state.json")
+        self.chunks_json = os.path.join(data_dir, "chunks.json")
+        self.chunks_jsonl = os.path.join(data_dir, "chunks.jsonl")
+        self.embeddings_path = os.path.join(data_dir, "embeddings_gemini.json")
+        self.coords_path = os.path.join(data_dir, "visualization_coords.json")
+        self.questions_path = os.path.join(data_dir, "test_questions_100.json")
+        self.state = self._load_state()
+
+    def _load_state(self) -> dict:
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") == STATE_VERSION:
+                return state
+        return {"version": STATE_VERSION}
+
+    def save_state(self):
+        _write_json(self.state_path, self.state, indent=2)
+
+    # --- parse ---------------------------------------------------------------
+
+    def parse(self, workers: int = None, dry_run: bool = False) -> bool:
+        """Brings chunks.json up to date with the manifest. Returns True if it changed."""
+        os.makedirs(self.parts_dir, exist_ok=True)
+        documents = load_manifest(self.manifest_path)
+        parts, todo = [], []
+        for doc in documents:
+            key = hashlib.sha1(f"{doc['source']}\n{file_hash(doc['path'])}".encode("utf-8")).hexdigest()
+            part_path = os.path.join(self.parts_dir, f"{key}.jsonl")
+            parts.append(part_path)
+            if not os.path.exists(part_path):
+                todo.append((doc, part_path))
+
+        print(f"Parse: {len(todo)}/{len(documents)} documents changed.")
+        if todo and not dry_run:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(ingest_document, doc, part + ".tmp") for doc, part in todo]
+                for (doc, part), future in zip(todo, futures):
+                    print(f"  {doc['source']} Articles: {future.result()}")
+                    os.replace(part + ".tmp", part)
+
+        chunks_key = hashlib.sha1("\n".join(os.path.basename(p) for p in parts).encode("utf-8")).hexdigest()
+        if chunks_key == self.state.get("chunks") and os.path.exists(self.chunks_json):
+            return False
+        if dry_run:
+            return True
+
+        total = merge_parts(parts, self.chunks_jsonl, self.chunks_json)
+        print(f"  chunks.json rewritten: {total} articles.")
+        self.state["chunks"] = chunks_key
+        # Parts of documents no longer in the manifest (or of old PDF versions)
+        for name in os.listdir(self.parts_dir):
+            if os.path.join(self.parts_dir, name) not in parts:
+                os.remove(os.path.join(self.parts_dir, name))
+        return True
+
+    def load_chunks(self) -> list:
+        if os.path.exists(self.chunks_jsonl):
+            return list(iter_jsonl(self.chunks_jsonl))
+        with open(self.chunks_json, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    # --- embed ---------------------------------------------------------------
+
+    def embed(self, chunks: list, dry_run: bool = False) -> dict:
+        """Brings the embeddings up to date. Returns {chunk id: content hash} of the result."""
+        previous, previous_order = {}, []
+        if os.path.exists(self.embeddings_path):
+            with open(self.embeddings_path, "r") as f:
+                for record in json.load(f):
+                    h = content_hash(record, self.model)
+                    previous[h] = record["embedding"]
+                    previous_order.append((record["id"], h))
+
+        hashes = [content_hash(c, self.model) for c in chunks]
+        todo = [c for c, h in zip(chunks, hashes) if h not in previous]
+        print(f"Embed: {len(todo)}/{len(chunks)} chunks changed.")
+        hashes_by_id = {c["id"]: h for c, h in zip(chunks, hashes)}
+        if dry_run or previous_order == list(hashes_by_id.items()):
+            return hashes_by_id
+
+        checkpoint_path = checkpoint_path_for(self.embeddings_path)
+        if todo:
+            for record in embed_chunks(todo, self.model, checkpoint_path=checkpoint_path):
+                previous[content_hash(record, self.model)] = record["embedding"]
+
+        records = [{
+            "id": chunk["id"],
+            "text": chunk["text"],
+            "metadata": chunk.get("metadata", {}),
+            "embedding": previous[h],
+        } for chunk, h in zip(chunks, hashes)]
+        save_embeddings(records, self.embeddings_path, self.model)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        return hashes_by_id
+
+    # --- coords --------------------------------------------------------------
+
+    @staticmethod
+    def project(matrix: np.ndarray) -> np.ndarray:
+        """Full t-SNE layout scaled to [0, 1] (the map's coordinate space)."""
+        from sklearn.manifold import TSNE
+        xy = TSNE(n_components=2, perplexity=min(30, len(matrix) - 1), random_state=42,
+                  init='pca', learning_rate='auto', metric='cosine').fit_transform(matrix)
+        xy -= xy.min(axis=0)
+        span = xy.max(axis=0)
+        return xy / np.where(span > 0, span, 1)
+
+    @staticmethod
+    def place(matrix: np.ndarray, xy: np.ndarray, stale: np.ndarray, k: int = NEIGHBOURS) -> np.ndarray:
+        """Positions stale rows at the similarity-weighted mean of their k nearest fresh rows."""
+        fresh = np.flatnonzero(~stale)
+        xy = xy.copy()
+        for i in np.flatnonzero(stale):
+            sims = matrix[fresh] @ matrix[i]
+            top = np.argpartition(-sims, min(k, len(fresh)) - 1)[:k]
+            weights = np.clip(sims[top], 1e-6, None) ** 4 # Same sharpening as the answer centroid
+            xy[i] = weights @ xy[fresh[top]] / weights.sum()
+        return xy
+
+    def coords(self, hashes_by_id: dict, full: bool = False, dry_run: bool = False) -> bool:
+        with open(self.embeddings_path, "r") as f:
+            records = json.load(f)
+        old_points = {}
+        if os.path.exists(self.coords_path):
+            with open(self.coords_path, "r", encoding="utf-8") as f:
+                old_points = {p["id"]: p for p in json.load(f)}
+        # First incremental run: adopt the existing map as matching the current embeddings
+        placed = self.state.get("coords") or {i: hashes_by_id.get(i) for i in old_points}
+
+        ids = [r["id"] for r in records]
+        stale = np.array([i not in old_points or placed.get(i) != hashes_by_id.get(i) for i in ids], dtype=bool)
+        removed = set(old_points) - set(ids)
+        changed = full or stale.any() or removed
+        full = full or stale.mean() > MAX_STALE_FRACTION
+        print(f"Coords: {int(stale.sum())}/{len(ids)} points stale, {len(removed)} removed"
+              + (" -> full t-SNE" if changed and full else ""))
+        if dry_run:
+            return False
+        if not changed:
+            self.state["coords"] = {i: hashes_by_id.get(i) for i in ids}
+            return False
+
+        matrix = normalize_rows(np.array([r["embedding"] for r in records], dtype=np.float32))
+        if full:
+            xy = self.project(matrix)
+        else:
+            xy = np.array([[old_points[i]["x"], old_points[i]["y"]] if not s else [0.0, 0.0]
+                           for i, s in zip(ids, stale)], dtype=np.float64)
+            xy = self.place(matrix, xy, stale)
+
+        points = [{
+            "id": r["id"],
+            "x": round(float(x), 4),
+            "y": round(float(y), 4),
+            "madde": r["metadata"].get("madde"),
+            "source": r["metadata"].get("source"),
+        } for r, (x, y) in zip(records, xy)]
+        _write_json(self.coords_path, points)
+        self.state["coords"] = {i: hashes_by_id.get(i) for i in ids}
+        return True
+
+    # --- all -----------------------------------------------------------------
+
+    def run(self, workers: int = None, full_coords: bool = False, dry_run: bool = False):
+        chunks_changed = self.parse(workers=workers, dry_run=dry_run)
+        chunks = self.load_chunks()
+        hashes_by_id = self.embed(chunks, dry_run=dry_run)
+        if os.path.exists(self.embeddings_path):
+            self.coords(hashes_by_id, full=full_coords, dry_run=dry_run)
+
+        if (chunks_changed or not os.path.exists(self.questions_path)) and not dry_run:
+            from generate_questions import generate_questions
+            generate_questions(self.chunks_json, self.questions_path)
+        if not dry_run:
+            self.save_state()
+        print("Build complete." if not dry_run else "Dry run, nothing written.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally rebuild chunks, embeddings, map and questions")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--full-coords", action="store_true", help="Recompute the whole map with t-SNE")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be rebuilt")
+    args = parser.parse_args()
+
+    Build(data_dir=args.data_dir, manifest_path=args.manifest).run(
+        workers=args.workers, full_coords=args.full_coords, dry_run=args.dry_run)
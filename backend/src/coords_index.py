@@ -0,0 +1,46 @@
+"""
+Embedding map coordinates (visualization_coords.json), indexed once.
+
+Answers used to scan every point per context doc and ship the whole map
+with every response. Now lookups are a dict hit on (source, madde), and the
+static map is served separately from /api/map with a content version, so
+the browser can cache it indefinitely.
+"""
+import hashlib
+import json
+from http_cache import PreparedJSON
+
+class CoordsIndex:
+    def __init__(self, coords_path: str):
+        with open(coords_path, "rb") as f:
+            raw = f.read()
+        self.points = json.loads(raw)
+        self.version = hashlib.sha1(raw).hexdigest()[:12]
+
+        # (lowercase source, str(madde)) -> point. First point wins, like the old linear scan.
+        self.by_key = {}
+        self.sources = [] # Lowercase sources in file order
+        for p in self.points:
+            src = str(p.get("source", "")).lower()
+            if src not in self.sources:
+                self.sources.append(src)
+            self.by_key.setdefault((src, str(p.get("madde"))), p)
+
+        map_data = {"version": self.version, "map_points": self.points}
+        # ?v=<version> URLs never change content -> cache forever
+        self.versioned_body = PreparedJSON(map_data, cache_control="public, max-age=31536000, immutable")
+        self.latest_body = PreparedJSON(map_data, cache_control="public, max-age=300")
+
+    def lookup(self, source, madde):
+        """Point for an article, or None. Sources match loosely ("TIHEK" ~ "TIHEK Kanunu")."""
+        t_src = str(source).lower()
+        t_madde = str(madde)
+        point = self.by_key.get((t_src, t_madde))
+        if point is not None:
+            return point
+        for p_src in self.sources:
+            if p_src in t_src or t_src in p_src:
+                point = self.by_key.get((p_src, t_madde))
+                if point is not None:
+                    return point
+        return None
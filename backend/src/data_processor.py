@@ -2,7 +2,7 @@ import fitz  # PyMuPDF
 import re
 import json
 import os
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 class DataProcessor:
     def __init__(self, pdf_path: str, source_name: str = "Anayasa"):
@@ -11,16 +11,22 @@ class DataProcessor:
         self.pages = [] # List of tuples: (page_num, text)
         self.chunks = []
 
-    def load_pdf(self):
-        """Loads the PDF page by page."""
+    def iter_pages(self) -> Iterator[Tuple[int, str]]:
+        """Yields (page_num, text) one page at a time; only the current page is held in memory."""
         if not os.path.exists(self.pdf_path):
             raise FileNotFoundError(f"PDF file not found at {self.pdf_path}")
         
         doc = fitz.open(self.pdf_path)
-        self.pages = []
-        for i, page in enumerate(doc):
-            # Page numbers in PDF are 0-indexed usually, but browsers use 1-indexed for #page=
-            self.pages.append((i + 1, page.get_text()))
+        try:
+            for i, page in enumerate(doc):
+                # Page numbers in PDF are 0-indexed usually, but browsers use 1-indexed for #page=
+                yield (i + 1, page.get_text())
+        finally:
+            doc.close()
+
+    def load_pdf(self):
+        """Loads the PDF page by page."""
+        self.pages = list(self.iter_pages())
         return self.pages
 
     def clean_text(self, text: str) -> str:
@@ -29,18 +35,60 @@ class DataProcessor:
         text = re.sub(r'\s+', ' ', text)
         return text.strip()
 
-    def split_into_articles(self) -> List[Dict]:
+    def _build_article(self, lines: List[str], num: int, header: str, page: int, seen_ids: set):
+        """Article dict from its collected lines, or None for amendment-note chunks."""
+        text_content = "\n".join(lines).strip()
+        
+        # FILTER: Skip "Revision/Footer" articles that are just amendment notes
+        # These usually start with "Bu Kanun yayımı..." or are very specific metadata flakes.
+        if "Bu Kanun yayımı tarihinde yürürlüğe girer" in text_content:
+            return None
+            
+        cleaned_text = self.clean_text(text_content)
+        
+        # ENRICHMENT
+        rich_text = f"KONU: {header}\n{cleaned_text}"
+        
+        # Handle unique IDs (seen_ids grows with every article instead of being rebuilt each time)
+        if self.source_name == "Anayasa":
+             base_id = f"MADDE {num}"
+        else:
+             base_id = f"{self.source_name} MADDE {num}"
+        
+        unique_id = base_id
+        counter = 1
+        while unique_id in seen_ids:
+            unique_id = f"{base_id}_{counter}"
+            counter += 1
+        seen_ids.add(unique_id)
+
+        return {
+            "id": unique_id,
+            "madde_no": num,
+            "text": rich_text,
+            "metadata": {
+                "source": self.source_name,
+                "madde": num,
+                "konu": header,
+                "page": page # CAPTURED PAGE
+            }
+        }
+
+    def iter_articles(self, pages: Iterable[Tuple[int, str]] = None) -> Iterator[Dict]:
         """
         Splits text into articles while tracking Page Numbers.
+        Streams: consumes (page_num, text) pairs (default: straight from the PDF)
+        and yields each article as soon as the next one starts.
         """
-        articles = []
+        if pages is None:
+            pages = self.iter_pages()
+        seen_ids = set()
         
         current_header = "GENEL ESASLAR" # Context for current article being built
         next_header = None # Context found for the NEXT article
         
         current_article_lines = []
-        current_article_id = None
-        current_article_num = -1
+        current_article_num = None
         current_article_page = 1 # Default
         
         # Regex for Roman Numeral Headers (e.g., "I. Devletin şekli", "III. ...")
@@ -49,55 +97,10 @@ class DataProcessor:
         # Regex for MADDE start
         # Use simpler regex for robustness 
         madde_pattern = re.compile(r'^\s*MADDE\s+(\d+)', re.IGNORECASE)
-        
-        def save_current_article():
-            nonlocal current_article_lines, current_article_id, current_article_num, current_header, current_article_page
-            if current_article_id and current_article_lines:
-                text_content = "\n".join(current_article_lines).strip()
-                
-                # FILTER: Skip "Revision/Footer" articles that are just amendment notes
-                # These usually start with "Bu Kanun yayımı..." or are very specific metadata flakes.
-                if "Bu Kanun yayımı tarihinde yürürlüğe girer" in text_content:
-                    # Skip this garbage chunk
-                    current_article_lines = []
-                    return
-                    
-                cleaned_text = self.clean_text(text_content)
-                
-                # ENRICHMENT
-                rich_text = f"KONU: {current_header}\n{cleaned_text}"
-                
-                # Handle unique IDs
-                if self.source_name == "Anayasa":
-                     base_id = f"MADDE {current_article_num}"
-                else:
-                     base_id = f"{self.source_name} MADDE {current_article_num}"
-                
-                unique_id = base_id
-                counter = 1
-                existing_ids = {a['id'] for a in articles}
-                while unique_id in existing_ids:
-                    unique_id = f"{base_id}_{counter}"
-                    counter += 1
-
-                articles.append({
-                    "id": unique_id,
-                    "madde_no": current_article_num,
-                    "text": rich_text,
-                    "metadata": {
-                        "source": self.source_name,
-                        "madde": current_article_num,
-                        "konu": current_header,
-                        "page": current_article_page # CAPTURED PAGE
-                    }
-                })
-            current_article_lines = []
 
         # Iterate Page by Page
-        for page_num, page_text in self.pages:
-            lines = page_text.split('\n')
-            
-            for line in lines:
+        for page_num, page_text in pages:
+            for line in page_text.split('\n'):
                 line = line.strip()
                 if not line: 
                     continue
@@ -113,8 +116,11 @@ class DataProcessor:
                 # Check for New Article
                 madde_match = madde_pattern.match(line)
                 if madde_match:
-                    # Save previous article (it uses the OLD current_header)
-                    save_current_article()
+                    # Emit previous article (it uses the OLD current_header)
+                    if current_article_num is not None:
+                        article = self._build_article(current_article_lines, current_article_num, current_header, current_article_page, seen_ids)
+                        if article:
+                            yield article
                     
                     # Now update context for the NEW article
                     if next_header:
@@ -123,19 +129,22 @@ class DataProcessor:
                     
                     # Start new
                     current_article_num = int(madde_match.group(1))
-                    current_article_id = f"MADDE {current_article_num}"
                     current_article_lines = [line] 
                     current_article_page = page_num # Update Page Pointer
-                else:
+                elif current_article_num is not None:
                     # Continuation 
-                    if current_article_id:
-                         current_article_lines.append(line)
-        
-        # Save last
-        save_current_article()
+                    current_article_lines.append(line)
         
-        self.chunks = articles
-        return articles
+        # Emit last
+        if current_article_num is not None:
+            article = self._build_article(current_article_lines, current_article_num, current_header, current_article_page, seen_ids)
+            if article:
+                yield article
+
+    def split_into_articles(self) -> List[Dict]:
+        """Articles of the pages loaded by load_pdf(), as a list."""
+        self.chunks = list(self.iter_articles(self.pages))
+        return self.chunks
 
     def save_chunks(self, output_path: str):
         with open(output_path, 'w', encoding='utf-8') as f:
@@ -0,0 +1,105 @@
+"""
+Micro-batching of concurrent query embeddings.
+
+Under load many /api/retrieve requests miss the embedding cache within a few
+milliseconds of each other. Instead of one embedContent call each, the first
+miss opens a short window (EMBED_BATCH_WINDOW_MS); every miss arriving in it
+joins the batch, which goes out as one batchEmbedContents call when the window
+closes or the batch reaches max_batch, and each caller gets its own vector back.
+
+A request never waits more than the window before its call is sent, and a lone
+request is sent as a plain embedContent (same call as without batching). The same
+text twice in a window is embedded once. Window 0 disables batching.
+"""
+import asyncio
+from gemini_client import GeminiError
+
+class EmbeddingBatcher:
+    def __init__(self, client, model_name: str, window: float = 0.005, max_batch: int = 100,
+                 task_type: str = "retrieval_query", timeout: float = 30):
+        self.client = client
+        self.model_name = model_name
+        self.window = window # Seconds
+        self.max_batch = max_batch
+        self.timeout = timeout # Seconds a caller waits for its batch, whatever happens to the call
+        self.task_type = task_type
+        self.pending = {} # text -> future, the batch currently collecting
+        self._timer = None
+        self._loop = None
+        self.calls = 0
+        self.texts = 0
+        self.max_seen = 0
+
+    def _reset_for(self, loop):
+        # Futures belong to one event loop (scripts may run several asyncio.run() in a row)
+        self._loop = loop
+        self.pending = {}
+        self._timer = None
+
+    async def embed(self, text: str) -> list:
+        """The vector for text; raises what the underlying call raised (GeminiError etc.)."""
+        if self.window <= 0:
+            self._count(1)
+            return await self.client.aembed(self.model_name, text, task_type=self.task_type)
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._reset_for(loop)
+        future = self.pending.get(text)
+        if future is None:
+            future = loop.create_future()
+            self.pending[text] = future
+            if len(self.pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+        # shield: one caller giving up (client disconnect, timeout) must not cancel the shared result
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise GeminiError(f"Embedding batch not answered within {self.timeout}s", 504) from None
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, {}
+        if batch:
+            self._loop.create_task(self._send(batch))
+
+    async def _send(self, batch: dict):
+        texts = list(batch)
+        self._count(len(texts))
+        try:
+            if len(texts) == 1:
+                vectors = [await self.client.aembed(self.model_name, texts[0], task_type=self.task_type)]
+            else:
+                vectors = await self.client.abatch_embed(self.model_name, texts, task_type=self.task_type)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        futures = list(batch.values())
+        for future, vector in zip(futures, vectors):
+            if not future.done():
+                future.set_result(vector)
+        # A short reply must not leave the rest waiting forever
+        for future in futures[len(vectors):]:
+            if not future.done():
+                future.set_exception(GeminiError(f"Embedding reply had {len(vectors)} vectors for {len(texts)} texts"))
+
+    def _count(self, size: int):
+        self.calls += 1
+        self.texts += size
+        self.max_seen = max(self.max_seen, size)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": round(self.window * 1000, 3),
+            "max_batch": self.max_batch,
+            "calls": self.calls,
+            "texts": self.texts,
+            "avg_batch": round(self.texts / self.calls, 2) if self.calls else 0.0,
+            "max_batch_seen": self.max_seen,
+        }
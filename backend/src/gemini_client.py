@@ -0,0 +1,251 @@
+"""
+Shared HTTP client for the Gemini REST API (embedding + generation).
+
+One pooled keep-alive connection set per process instead of a fresh TLS
+handshake per call. The async client is what the FastAPI handlers use, so a
+slow LLM call no longer blocks the event loop; the sync client is kept for
+scripts and sync code paths.
+
+GEMINI_API_BASE can point the backend at another endpoint (e.g. a local mock).
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import httpx
+from metrics import stage
+
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+# Worth retrying: rate limit + transient server errors
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class GeminiError(Exception):
+    def __init__(self, message: str, status_code: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after # Seconds, from the Retry-After header of a 429/503
+
+def model_path(model_name: str) -> str:
+    return model_name if model_name.startswith("models/") else f"models/{model_name}"
+
+class GeminiClient:
+    def __init__(self, api_key: str, base_url: str = None, max_connections: int = 20,
+                 timeout: float = 30, max_retries: int = 2, backoff: float = 0.5):
+        self.api_key = api_key
+        self.base_url = (base_url or os.getenv("GEMINI_API_BASE") or DEFAULT_API_BASE).rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        # Key goes in a header, so it never shows up in URLs / exception messages
+        self.headers = {"x-goog-api-key": api_key}
+        self._sync_client = None
+        self._async_client = None
+        self._async_loop = None
+        self._closers = set() # Tasks that close each loop's AsyncClient when that loop shuts down
+        self._lock = threading.Lock()
+
+    # --- Clients -------------------------------------------------------
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(headers=self.headers, limits=self.limits, timeout=self.timeout)
+            return self._sync_client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        # An AsyncClient is bound to the loop it was first used on (scripts may
+        # call asyncio.run() several times), so make a new one if the loop changed.
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            client = httpx.AsyncClient(headers=self.headers, limits=self.limits, timeout=self.timeout)
+            self._async_client, self._async_loop = client, loop
+            # The old client can't be closed from this loop; each one closes its own pool when
+            # its loop shuts down (asyncio.run() cancels leftover tasks before closing the loop)
+            closer = loop.create_task(self._close_on_shutdown(client))
+            self._closers.add(closer)
+            closer.add_done_callback(self._closers.discard)
+        return self._async_client
+
+    @staticmethod
+    async def _close_on_shutdown(client: httpx.AsyncClient):
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await client.aclose()
+
+    async def awarm_up(self, connections: int = 2):
+        """Opens `connections` keep-alive connections (TLS handshake included) via a cheap models.list call."""
+        async def touch():
+            try:
+                await self.async_client.get(f"{self.base_url}/models", params={"pageSize": 1}, timeout=5)
+            except httpx.HTTPError as e:
+                print(f"Warm-up request failed: {e}")
+        await asyncio.gather(*[touch() for _ in range(connections)])
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+    # --- Transport with retries ----------------------------------------
+
+    def _url(self, model_name: str, method: str) -> str:
+        return f"{self.base_url}/{model_path(model_name)}:{method}"
+
+    @staticmethod
+    def _retry_after(resp: httpx.Response):
+        try:
+            return float(resp.headers["retry-after"])
+        except (KeyError, ValueError):
+            return None
+
+    def _retry_delay(self, attempt: int, resp: httpx.Response = None) -> float:
+        retry_after = self._retry_after(resp) if resp is not None else None
+        if retry_after is not None:
+            return min(retry_after, 10.0)
+        # Exponential backoff with jitter
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def _backoff(self, attempt: int, resp: httpx.Response = None):
+        # Waiting out a busy API is its own stage, not part of "embed" / "generate"
+        with stage("backoff"):
+            time.sleep(self._retry_delay(attempt, resp))
+
+    async def _abackoff(self, attempt: int, resp: httpx.Response = None):
+        with stage("backoff"):
+            await asyncio.sleep(self._retry_delay(attempt, resp))
+
+    @classmethod
+    def _check(cls, resp: httpx.Response) -> dict:
+        if resp.status_code >= 400:
+            raise GeminiError(f"Gemini API {resp.status_code}: {resp.text[:200]}", resp.status_code, cls._retry_after(resp))
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise GeminiError(f"Invalid JSON from Gemini API: {resp.text[:200]}", resp.status_code) from e
+
+    def post(self, url: str, payload: dict, timeout: float = None, retries: int = None) -> dict:
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                resp = self.sync_client.post(url, json=payload, timeout=timeout or self.timeout)
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    raise GeminiError(f"Gemini API unreachable: {e}") from e
+                self._backoff(attempt)
+                continue
+            if resp.status_code in RETRY_STATUS and attempt < retries:
+                self._backoff(attempt, resp)
+                continue
+            return self._check(resp)
+
+    async def apost(self, url: str, payload: dict, timeout: float = None, retries: int = None) -> dict:
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                resp = await self.async_client.post(url, json=payload, timeout=timeout or self.timeout)
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    raise GeminiError(f"Gemini API unreachable: {e}") from e
+                await self._abackoff(attempt)
+                continue
+            if resp.status_code in RETRY_STATUS and attempt < retries:
+                await self._abackoff(attempt, resp)
+                continue
+            return self._check(resp)
+
+    # --- Embedding -----------------------------------------------------
+
+    @staticmethod
+    def _embed_request(model_name: str, text: str, task_type: str) -> dict:
+        return {
+            "model": model_path(model_name),
+            "content": {"parts": [{"text": text}]},
+            "taskType": task_type
+        }
+
+    def embed(self, model_name: str, text: str, task_type: str = "retrieval_query", timeout: float = 10) -> list:
+        data = self.post(self._url(model_name, "embedContent"), self._embed_request(model_name, text, task_type), timeout=timeout)
+        return data["embedding"]["values"]
+
+    async def aembed(self, model_name: str, text: str, task_type: str = "retrieval_query", timeout: float = 10) -> list:
+        data = await self.apost(self._url(model_name, "embedContent"), self._embed_request(model_name, text, task_type), timeout=timeout)
+        return data["embedding"]["values"]
+
+    def batch_embed(self, model_name: str, texts: list, task_type: str = "retrieval_query", timeout: float = 30, retries: int = None) -> list:
+        payload = {"requests": [self._embed_request(model_name, t, task_type) for t in texts]}
+        data = self.post(self._url(model_name, "batchEmbedContents"), payload, timeout=timeout, retries=retries)
+        return [e["values"] for e in data["embeddings"]]
+
+    async def abatch_embed(self, model_name: str, texts: list, task_type: str = "retrieval_query", timeout: float = 30, retries: int = None) -> list:
+        payload = {"requests": [self._embed_request(model_name, t, task_type) for t in texts]}
+        data = await self.apost(self._url(model_name, "batchEmbedContents"), payload, timeout=timeout, retries=retries)
+        return [e["values"] for e in data["embeddings"]]
+
+    # --- Generation ----------------------------------------------------
+
+    @staticmethod
+    def _generate_request(prompt_text: str) -> dict:
+        return {"contents": [{"parts": [{"text": prompt_text}]}]}
+
+    @staticmethod
+    def _answer_text(data: dict) -> str:
+        # Extract text: candidates[0].content.parts[0].text
+        try:
+            return data["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError) as e:
+            raise GeminiError(f"Unexpected Gemini response: {str(data)[:200]}") from e
+
+    def generate(self, model_name: str, prompt_text: str, timeout: float = 30, retries: int = None) -> str:
+        data = self.post(self._url(model_name, "generateContent"), self._generate_request(prompt_text), timeout=timeout, retries=retries)
+        return self._answer_text(data)
+
+    async def agenerate(self, model_name: str, prompt_text: str, timeout: float = 30, retries: int = None) -> str:
+        data = await self.apost(self._url(model_name, "generateContent"), self._generate_request(prompt_text), timeout=timeout, retries=retries)
+        return self._answer_text(data)
+
+    async def astream_generate(self, model_name: str, prompt_text: str, timeout: float = 30):
+        """
+        streamGenerateContent (SSE): yields text pieces as Gemini produces them.
+        HTTP errors surface before the first piece, so callers can still fall back.
+        """
+        url = self._url(model_name, "streamGenerateContent") + "?alt=sse"
+        # timeout applies per read, so a long answer is fine as long as tokens keep coming
+        async with self.async_client.stream("POST", url, json=self._generate_request(prompt_text), timeout=timeout) as resp:
+            if resp.status_code >= 400:
+                body = (await resp.aread()).decode("utf-8", "replace")
+                raise GeminiError(f"Gemini API {resp.status_code}: {body[:200]}", resp.status_code, self._retry_after(resp))
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    data = json.loads(line[5:])
+                except ValueError:
+                    continue
+                parts = (data.get("candidates") or [{}])[0].get("content", {}).get("parts", [])
+                text = "".join(p.get("text", "") for p in parts)
+                if text:
+                    yield text
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> GeminiClient:
+    """Process-wide shared client (one connection pool for every caller)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY not found in env")
+                _client = GeminiClient(api_key)
+    return _client
@@ -1,9 +1,9 @@
 import json
 import random
 
-def generate_questions():
+def generate_questions(chunks_path: str = 'backend/data/chunks.json', output_path: str = 'backend/data/test_questions_100.json'):
     # Load chunks
-    with open('backend/data/chunks.json', 'r') as f:
+    with open(chunks_path, 'r') as f:
         chunks = json.load(f)
     
     # We want 100 questions.
@@ -56,7 +56,7 @@ def generate_questions():
             break
             
     # Save
-    with open('backend/data/test_questions_100.json', 'w') as f:
+    with open(output_path, 'w') as f:
         json.dump(questions, f, ensure_ascii=False, indent=2)
     
     print(f"Generated {len(questions)} questions.")
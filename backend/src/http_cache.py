@@ -0,0 +1,34 @@
+"""
+Pre-serialized JSON responses with gzip + ETag / 304 support.
+
+For static-ish payloads (legislation texts, map coordinates) the body is
+serialized and compressed once; serving a request is then a header check
+and a bytes copy.
+"""
+import gzip
+import hashlib
+import json
+from fastapi import Request
+from fastapi.responses import Response
+
+class PreparedJSON:
+    def __init__(self, data, cache_control: str = "public, max-age=300"):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.gzipped = gzip.compress(self.body, compresslevel=6)
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+        self.cache_control = cache_control
+
+    def respond(self, request: Request) -> Response:
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match", "")
+        if self.etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=self.gzipped, media_type="application/json", headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
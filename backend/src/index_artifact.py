@@ -0,0 +1,141 @@
+"""
+Compiled embedding index.
+
+embeddings_gemini.json stores every vector as a list of JSON floats, so each cold start
+has to parse ~160k numbers into Python objects. The compiled format splits it into:
+
+  <prefix>.npy        float32 (N, D) matrix, rows already L2-normalized -> np.load(mmap_mode='r')
+  <prefix>.meta.json  sidecar with ids / texts / metadatas (columnar, no vectors)
+
+The sidecar records which embeddings JSON it was compiled from (size, mtime, sha1),
+so a JSON re-embedded without recompiling is noticed (see source_matches()).
+
+Usage (from repo root):
+  python backend/src/index_artifact.py [embeddings_gemini.json] [output_prefix]
+"""
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+from typing import List, Dict, Any
+
+FORMAT_VERSION = 1
+
+def index_paths(prefix: str):
+    """Returns (matrix_path, sidecar_path) for an index prefix."""
+    return f"{prefix}.npy", f"{prefix}.meta.json"
+
+def index_exists(prefix: str) -> bool:
+    return all(os.path.exists(p) for p in index_paths(prefix))
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalizes rows in place. Zero rows stay zero."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+def file_fingerprint(path: str, digest: str = None) -> Dict[str, Any]:
+    """Size, mtime and sha1 of a file (digest: the sha1 if the caller already has it)."""
+    stat = os.stat(path)
+    if digest is None:
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": digest}
+
+def _write_sidecar(sidecar_path: str, sidecar: Dict[str, Any]):
+    with open(sidecar_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(sidecar, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(sidecar_path + ".tmp", sidecar_path)
+
+def source_matches(sidecar: Dict[str, Any], json_path: str, sidecar_path: str = None) -> bool:
+    """
+    False if json_path changed since the index was compiled from it. Size + mtime first;
+    an equal size with another mtime (checkout, copy) is settled by the sha1, after which
+    the new mtime is recorded in sidecar_path (if given), so only the first cold start hashes.
+    Indexes without a recorded source (older builds, synthetic corpora) are trusted.
+    """
+    recorded = sidecar.get("source_json")
+    if not recorded or not os.path.exists(json_path):
+        return True
+    stat = os.stat(json_path)
+    if stat.st_size != recorded["size"]:
+        return False
+    if stat.st_mtime_ns == recorded["mtime_ns"]:
+        return True
+    if file_fingerprint(json_path)["sha1"] != recorded["sha1"]:
+        return False
+    recorded["mtime_ns"] = stat.st_mtime_ns
+    if sidecar_path:
+        try:
+            _write_sidecar(sidecar_path, sidecar)
+        except OSError as e: # Read-only deployment: hash again next time, still correct
+            print(f"Could not update {sidecar_path}: {e}")
+    return True
+
+def write_index(records: List[Dict[str, Any]], prefix: str, model: str = "models/text-embedding-004",
+                source_path: str = None) -> Dict[str, Any]:
+    """
+    Writes records shaped like embeddings_gemini.json entries
+    ({"id", "text", "metadata", "embedding"}) as a compiled index.
+    source_path: the JSON the records were read from / written to, fingerprinted in the sidecar.
+    """
+    matrix = np.ascontiguousarray([r["embedding"] for r in records], dtype=np.float32)
+    if matrix.ndim != 2:
+        raise ValueError("Embeddings must all have the same dimension")
+    normalize_rows(matrix)
+
+    ids = [r["id"] for r in records]
+    # Content hash: lets caches detect a rebuilt index
+    digest = hashlib.sha1(matrix.tobytes())
+    digest.update("\n".join(ids).encode("utf-8"))
+
+    sidecar = {
+        "format": FORMAT_VERSION,
+        "model": model,
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "normalized": True,
+        "version": digest.hexdigest()[:16],
+        "ids": ids,
+        "texts": [r["text"] for r in records],
+        "metadatas": [r.get("metadata", {}) for r in records],
+    }
+    if source_path:
+        sidecar["source_json"] = file_fingerprint(source_path)
+
+    matrix_path, sidecar_path = index_paths(prefix)
+    # Write to temp files first so a running server never sees half an index
+    with open(matrix_path + ".tmp", "wb") as f:
+        np.save(f, matrix)
+    os.replace(matrix_path + ".tmp", matrix_path)
+    _write_sidecar(sidecar_path, sidecar)
+    return sidecar
+
+def load_index(prefix: str, mmap: bool = True):
+    """Returns (matrix, sidecar). The matrix is memory-mapped read-only by default."""
+    matrix_path, sidecar_path = index_paths(prefix)
+    with open(sidecar_path, "r", encoding="utf-8") as f:
+        sidecar = json.load(f)
+    if sidecar.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format: {sidecar.get('format')}")
+
+    matrix = np.load(matrix_path, mmap_mode="r" if mmap else None)
+    if matrix.shape != (sidecar["count"], sidecar["dim"]):
+        raise ValueError(f"Index matrix shape {matrix.shape} does not match sidecar")
+    return matrix, sidecar
+
+def convert_json(json_path: str, prefix: str = None) -> Dict[str, Any]:
+    """Compiles an embeddings_gemini.json file next to it."""
+    if prefix is None:
+        prefix = os.path.splitext(json_path)[0]
+    with open(json_path, "r") as f:
+        records = json.load(f)
+    return write_index(records, prefix, source_path=json_path)
+
+if __name__ == "__main__":
+    json_path = sys.argv[1] if len(sys.argv) > 1 else "backend/data/embeddings_gemini.json"
+    prefix = sys.argv[2] if len(sys.argv) > 2 else None
+    meta = convert_json(json_path, prefix)
+    print(f"Compiled {meta['count']} x {meta['dim']} index (version {meta['version']}).")
@@ -1,32 +1,124 @@
-from data_processor import DataProcessor
+"""
+Parses every legislation PDF into backend/data/chunks.json (+ chunks.jsonl).
+
+Documents come from a manifest (default backend/data/manifest.json):
+  {"documents": [{"path": "anayasa.pdf", "source": "Anayasa"}, ...]}
+or from a directory (--dir), where every *.pdf is ingested with its file name as source.
+
+Each document is parsed in its own worker process, streaming pages -> articles
+into a per-document JSONL part. The parts are then concatenated in manifest
+order, so memory stays flat regardless of corpus size.
+
+Usage (from repo root):
+  python backend/src/ingest_all.py [--manifest PATH | --dir DIR] [--workers N]
+"""
+import argparse
 import json
 import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List
+from data_processor import DataProcessor
+
+DATA_DIR = "backend/data"
+DEFAULT_MANIFEST = os.path.join(DATA_DIR, "manifest.json")
+
+def load_manifest(manifest_path: str) -> List[Dict]:
+    """Manifest documents, paths resolved relative to the manifest file."""
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(manifest_path)
+    return [
+        {"path": os.path.join(base_dir, d["path"]), "source": d["source"]}
+        for d in manifest["documents"]
+    ]
+
+def scan_directory(pdf_dir: str) -> List[Dict]:
+    """Every PDF in a directory, sorted by name; the file name (without .pdf) is the source."""
+    return [
+        {"path": os.path.join(pdf_dir, name), "source": os.path.splitext(name)[0]}
+        for name in sorted(os.listdir(pdf_dir))
+        if name.lower().endswith(".pdf")
+    ]
 
-def ingest_all():
-    all_chunks = []
-    
-    # 1. Ingest Constitution (Anayasa)
-    print("Processing Anayasa...")
-    p1 = DataProcessor("backend/data/anayasa.pdf", source_name="Anayasa")
-    p1.load_pdf()
-    chunks1 = p1.split_into_articles()
-    all_chunks.extend(chunks1)
-    print(f"Anayasa Articles: {len(chunks1)}")
-    
-    # 2. Ingest Human Rights Law (6701)
-    print("Processing Law 6701...")
-    p2 = DataProcessor("backend/data/6701.pdf", source_name="TIHEK Kanunu") # TIHEK = Turkiye Insan Haklari E. K.
-    p2.load_pdf()
-    chunks2 = p2.split_into_articles()
-    all_chunks.extend(chunks2)
-    print(f"Law 6701 Articles: {len(chunks2)}")
-    
-    # Save Combined
-    output_path = "backend/data/chunks.json"
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(all_chunks, f, ensure_ascii=False, indent=2)
-        
-    print(f"Total Articles Saved: {len(all_chunks)} to {output_path}")
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def ingest_document(doc: Dict, part_path: str) -> int:
+    """Worker: streams one PDF's articles into a JSONL part. Returns the article count."""
+    processor = DataProcessor(doc["path"], source_name=doc["source"])
+    count = 0
+    with open(part_path, "w", encoding="utf-8") as f:
+        for article in processor.iter_articles():
+            f.write(json.dumps(article, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+def merge_parts(part_paths: List[str], jsonl_path: str, json_path: str) -> int:
+    """
+    Concatenates parts into chunks.jsonl and chunks.json (same layout as json.dump(indent=2)),
+    one article at a time. IDs stay unique across documents with the same suffix scheme
+    DataProcessor uses within a document.
+    """
+    seen_ids = set()
+    total = 0
+    with open(jsonl_path + ".tmp", "w", encoding="utf-8") as out_jsonl, \
+         open(json_path + ".tmp", "w", encoding="utf-8") as out_json:
+        out_json.write("[")
+        for part_path in part_paths:
+            for article in iter_jsonl(part_path):
+                base_id = unique_id = article["id"]
+                counter = 1
+                while unique_id in seen_ids:
+                    unique_id = f"{base_id}_{counter}"
+                    counter += 1
+                seen_ids.add(unique_id)
+                article["id"] = unique_id
+
+                out_jsonl.write(json.dumps(article, ensure_ascii=False) + "\n")
+                body = json.dumps(article, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+                out_json.write(("," if total else "") + "\n  " + body)
+                total += 1
+        out_json.write("\n]" if total else "]")
+    # Swap in complete files only, a running server never reads half a corpus
+    os.replace(jsonl_path + ".tmp", jsonl_path)
+    os.replace(json_path + ".tmp", json_path)
+    return total
+
+def ingest_all(documents: List[Dict] = None, output_dir: str = DATA_DIR, workers: int = None) -> int:
+    if documents is None:
+        documents = load_manifest(DEFAULT_MANIFEST)
+    for doc in documents:
+        if not os.path.exists(doc["path"]):
+            raise FileNotFoundError(f"PDF file not found at {doc['path']}")
+
+    with tempfile.TemporaryDirectory(dir=output_dir, prefix=".ingest-") as parts_dir:
+        part_paths = [os.path.join(parts_dir, f"{i:05d}.jsonl") for i in range(len(documents))]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(ingest_document, doc, part) for doc, part in zip(documents, part_paths)]
+            for doc, future in zip(documents, futures):
+                print(f"{doc['source']} Articles: {future.result()}")
+
+        total = merge_parts(
+            part_paths,
+            os.path.join(output_dir, "chunks.jsonl"),
+            os.path.join(output_dir, "chunks.json"),
+        )
+
+    print(f"Total Articles Saved: {total} to {os.path.join(output_dir, 'chunks.json')}")
+    return total
 
 if __name__ == "__main__":
-    ingest_all()
+    parser = argparse.ArgumentParser(description="Parse legislation PDFs into chunks.json / chunks.jsonl")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--manifest", default=DEFAULT_MANIFEST, help="JSON manifest of {path, source} documents")
+    group.add_argument("--dir", help="Ingest every *.pdf in this directory instead")
+    parser.add_argument("--output-dir", default=DATA_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    args = parser.parse_args()
+
+    docs = scan_directory(args.dir) if args.dir else load_manifest(args.manifest)
+    ingest_all(docs, output_dir=args.output_dir, workers=args.workers)
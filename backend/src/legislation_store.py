@@ -0,0 +1,91 @@
+"""
+In-memory legislation corpus for the Reader View (/api/legislation).
+
+chunks.json is read once. Articles are grouped per source and pre-sorted,
+and the common responses (full text, table of contents) are pre-serialized
+and gzipped, so a request no longer parses a file or sorts anything.
+"""
+import json
+from http_cache import PreparedJSON
+from ttl_cache import TTLCache
+
+DEFAULT_SOURCE = "Anayasa"
+ALL_SOURCES = None # Key for "no source filter"
+
+class LegislationStore:
+    def __init__(self, chunks_path: str):
+        with open(chunks_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        # Only real articles (madde_no is an int), sorted by madde_no.
+        # Python's sort is stable, so articles with the same number keep file order.
+        articles = [d for d in data if isinstance(d.get("madde_no"), int)]
+        articles.sort(key=lambda x: x["madde_no"])
+
+        self.by_source = {ALL_SOURCES: articles}
+        self.by_madde = {} # (source, madde_no) -> [articles]
+        for a in articles:
+            source = a.get("metadata", {}).get("source", DEFAULT_SOURCE) # Default to Anayasa
+            self.by_source.setdefault(source, []).append(a)
+            self.by_madde.setdefault((source, a["madde_no"]), []).append(a)
+
+        self._full = {}
+        self._toc = {}
+        for source, items in self.by_source.items():
+            self._full[source] = PreparedJSON({"articles": items})
+            self._toc[source] = PreparedJSON({"articles": [self._toc_entry(a) for a in items], "total": len(items)})
+        self._pages = TTLCache(max_size=256) # (source, offset, limit) -> PreparedJSON
+        self._article_bodies = TTLCache(max_size=1024)
+        self._empty = PreparedJSON({"articles": []}) # Unknown source
+
+    @staticmethod
+    def _toc_entry(article: dict) -> dict:
+        meta = article.get("metadata", {})
+        return {
+            "id": article["id"],
+            "madde_no": article["madde_no"],
+            "source": meta.get("source", DEFAULT_SOURCE),
+            "konu": meta.get("konu", ""),
+            "page": meta.get("page"),
+        }
+
+    def sources(self) -> list:
+        return [s for s in self.by_source if s is not ALL_SOURCES]
+
+    def full(self, source: str = None) -> PreparedJSON:
+        """Every article of a source (or all sources) - the original /api/legislation payload."""
+        prepared = self._full.get(source)
+        return prepared if prepared is not None else self._empty
+
+    def toc(self, source: str = None) -> PreparedJSON:
+        """Table of contents: ids, numbers, topics and pages, no article bodies."""
+        prepared = self._toc.get(source)
+        return prepared if prepared is not None else self._empty
+
+    def page(self, source: str, offset: int, limit: int) -> PreparedJSON:
+        key = (source, offset, limit)
+        prepared = self._pages.get(key)
+        if prepared is None:
+            items = self.by_source.get(source, [])
+            prepared = PreparedJSON({
+                "articles": items[offset:offset + limit],
+                "total": len(items),
+                "offset": offset,
+                "limit": limit,
+            })
+            self._pages.put(key, prepared)
+        return prepared
+
+    def article(self, source: str, madde_no: int):
+        """
+        Body of a single article (a list: some numbers repeat, e.g. amended/geçici articles).
+        None if the source has no such article.
+        """
+        key = (source, madde_no)
+        if key not in self.by_madde:
+            return None
+        prepared = self._article_bodies.get(key)
+        if prepared is None:
+            prepared = PreparedJSON({"articles": self.by_madde[key]})
+            self._article_bodies.put(key, prepared)
+        return prepared
@@ -1,46 +1,93 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles # Import
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
+from typing import Optional
 from rag_engine import RAGEngine
+from gemini_client import GeminiError
+from model_router import DeadlineExceeded
+from ttl_cache import TTLCache, normalize_question
+from legislation_store import LegislationStore
+from coords_index import CoordsIndex
+from answer_cache import AnswerCache, context_key
+from single_flight import SingleFlight
+from metrics import ServerTimingMiddleware, stage, timed, observe_answer, render as render_metrics
+from rag_engine import GENERATION_MODELS
+from contextlib import asynccontextmanager
+import threading
+import uuid
 import uvicorn
 import asyncio
 import os
+import time
 
-app = FastAPI()
+# PRELOAD_ENGINE: "1"/"true" = load the index and open connections before serving,
+# "background" = start serving immediately and warm up in a task, unset = lazy (first request loads)
+PRELOAD_ENGINE = os.getenv("PRELOAD_ENGINE", "").lower()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_task = None
+    if PRELOAD_ENGINE in ("1", "true", "yes"):
+        await warm_up()
+    elif PRELOAD_ENGINE == "background":
+        warm_task = asyncio.create_task(warm_up())
+    yield
+    if warm_task is not None and not warm_task.done():
+        warm_task.cancel()
+    if engine is not None:
+        await engine.client.aclose()
+        if engine.vector_store is not None:
+            engine.vector_store.embedding_cache.save()
+
+app = FastAPI(lifespan=lifespan)
 
 # Mount Static Files (PDFs)
 # Ensures that http://localhost:8000/static/anayasa.pdf works
 static_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 app.mount("/static", StaticFiles(directory=static_path), name="static")
 
+# Legislation corpus, loaded once (see legislation_store.py)
+legislation_store = None
+legislation_lock = threading.Lock()
+def get_legislation_store():
+    global legislation_store
+    if legislation_store is None:
+        with legislation_lock:
+            if legislation_store is None:
+                legislation_store = LegislationStore(os.path.join(static_path, "chunks.json"))
+    return legislation_store
+
 @app.get("/api/legislation")
-def get_legislation(source: str = None):
-    """Returns the full text of the legislation for the Reader View."""
+def get_legislation(request: Request, source: str = None, mode: str = "full", offset: int = 0, limit: int = None):
+    """
+    Returns the legislation for the Reader View.
+      mode=full (default): every article of `source` (or all sources)
+      mode=toc: ids / numbers / topics only; fetch bodies via /api/legislation/{source}/{madde}
+      limit/offset: page through the full articles
+    Responses are pre-serialized, gzipped and carry an ETag (If-None-Match -> 304).
+    """
     chunks_path = os.path.join(static_path, "chunks.json")
     if not os.path.exists(chunks_path):
         return {"error": "Legislation data not found."}
-        
-    import json
-    with open(chunks_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-        
-    # Filter by Source if provided
-    filtered_data = []
-    source_query = source.lower() if source else None
-    
-    for d in data:
-        # Check source match
-        doc_source = d.get("metadata", {}).get("source", "Anayasa") # Default to Anayasa
-        if source and doc_source != source:
-            continue
-            
-        if isinstance(d.get("madde_no"), int):
-            filtered_data.append(d)
 
-    filtered_data.sort(key=lambda x: x["madde_no"])
-    
-    return {"articles": filtered_data}
+    store = get_legislation_store()
+    source = source or None # Empty string means no filter, as before
+    if mode == "toc":
+        return store.toc(source).respond(request)
+    if limit is not None:
+        return store.page(source, max(offset, 0), max(min(limit, 500), 1)).respond(request)
+    return store.full(source).respond(request)
+
+@app.get("/api/legislation/{source}/{madde_no}")
+def get_legislation_article(request: Request, source: str, madde_no: int):
+    """Single article body for lazy loading from the table of contents."""
+    prepared = get_legislation_store().article(source, madde_no)
+    if prepared is None:
+        raise HTTPException(status_code=404, detail="Article not found.")
+    return prepared.respond(request)
 
 app.add_middleware(
     CORSMiddleware,
@@ -48,89 +95,181 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Per-stage timings of each request as a Server-Timing header (+ /api/metrics histograms)
+app.add_middleware(ServerTimingMiddleware)
 
 # Initialize Engine (Global state)
 engine = None
+engine_state = "cold" # cold -> warming -> warm, or failed (retried on the next request)
+engine_error = None
+engine_lock = threading.Lock()
 def get_engine():
-    global engine
-    if engine is None:
-        try:
-            engine = RAGEngine()
-        except Exception as e:
-            print(f"Engine Init Error: {e}")
-            raise HTTPException(status_code=500, detail=f"Engine Init Failed: {str(e)}")
+    """The loaded engine. Concurrent first callers wait for a single load instead of racing."""
+    global engine, engine_state, engine_error
+    if engine_state == "warm":
+        return engine
+    with engine_lock:
+        if engine_state != "warm":
+            engine_state = "warming"
+            try:
+                if engine is None:
+                    engine = RAGEngine()
+                engine._initialize_lazy()
+                engine_state, engine_error = "warm", None
+            except Exception as e:
+                print(f"Engine Init Error: {e}")
+                engine_state, engine_error = "failed", str(e)
+                raise HTTPException(status_code=500, detail=f"Engine Init Failed: {str(e)}")
     return engine
 
+async def aget_engine():
+    """get_engine() for async handlers: a cold load runs in a worker thread, not on the event loop."""
+    if engine_state == "warm":
+        return engine
+    return await asyncio.to_thread(get_engine)
+
+async def warm_up():
+    """Loads the engine and pre-opens pooled Gemini connections. Never raises (state says why)."""
+    try:
+        loaded = await aget_engine()
+        await loaded.awarm_up()
+        print("Engine warm.")
+    except HTTPException:
+        pass
+
 # Visualization Data Helper
 import json
-coords_cache = None
-def get_coords():
-    global coords_cache
-    if coords_cache is None:
+coords_index = None
+def get_coords_index():
+    """CoordsIndex over visualization_coords.json, or None if it can't be loaded."""
+    global coords_index
+    if coords_index is None:
         try:
             # Re-use static_path defined above (backend/data)
-            coords_path = os.path.join(static_path, "visualization_coords.json")
-            with open(coords_path, "r") as f:
-                coords_cache = json.load(f)
+            coords_index = CoordsIndex(os.path.join(static_path, "visualization_coords.json"))
         except Exception as e:
             print(f"Coords Load Error: {e}") 
-            coords_cache = []
-    return coords_cache
+            return None
+    return coords_index
+
+def get_coords():
+    index = get_coords_index()
+    return index.points if index else []
 
 class VisData(BaseModel):
-    map_points: list
     query_point: dict
+    matched_ids: list = [] # Map point ids of the context docs
+    map_version: Optional[str] = None # Fetch the points from /api/map?v=<map_version>
+    map_points: Optional[list] = None # No longer sent with answers
 
 class RetrieveRequest(BaseModel):
     question: str
+    nprobe: Optional[int] = None # ANN lists to probe (more = better recall, slower); ignored for exact search
+    source: Optional[str] = None # Only search this law (metadata.source, as in /api/legislation?source=)
 
 class RetrieveResponse(BaseModel):
     context_docs: list
     message: str
+    # Short-lived handle: pass it to /api/answer instead of sending context_docs back
+    context_id: Optional[str] = None # None when nothing strong enough matched
+
+class RetrieveBatchRequest(BaseModel):
+    questions: list
+
+class RetrieveBatchResponse(BaseModel):
+    results: list # RetrieveResponse per question, in input order
+
+# Upper bound per /api/retrieve_batch call (keeps one request well inside maxDuration)
+MAX_BATCH_QUESTIONS = 500
 
 class GenerateRequest(BaseModel):
     question: str
-    context_docs: list
+    context_docs: Optional[list] = None
+    context_id: Optional[str] = None # From /api/retrieve; resolved server-side
 
 class GenerateResponse(BaseModel):
     answer: str
     prompt: str
-    vis_data: VisData = None # Optional visual data
+    vis_data: Optional[VisData] = None # None for greetings / no context / failed generation
+
+class ChatRequest(BaseModel):
+    question: str
+
+class ChatResponse(GenerateResponse):
+    context_docs: list = []
+
+# Retrieved context kept server-side for the two-step UI, so article texts
+# don't have to travel back up with /api/answer. In-memory per instance:
+# if the handle is gone (expired / other serverless instance) the client
+# resends context_docs.
+CONTEXT_TTL_SECONDS = 300
+context_handles = TTLCache(max_size=2048, ttl=CONTEXT_TTL_SECONDS)
+
+def store_context(context_docs: list) -> str:
+    context_id = uuid.uuid4().hex
+    context_handles.put(context_id, context_docs)
+    return context_id
+
+def resolve_context(request: GenerateRequest) -> list:
+    """context_docs for a GenerateRequest: the handle if it is still alive, else the inline docs."""
+    if request.context_id:
+        docs = context_handles.get(request.context_id)
+        if docs is not None:
+            return docs
+        if request.context_docs is None:
+            raise HTTPException(status_code=409, detail="Context expired. Resend context_docs or retrieve again.")
+    return request.context_docs or []
+
+def build_context_docs(results) -> list:
+    """Turns an engine.retrieve() result into context_docs (drops weak matches)."""
+    documents = results['documents'][0]
+    metadatas = results['metadatas'][0]
+    distances = results['distances'][0]
+
+    context_docs = []
+    for doc, meta, dist in zip(documents, metadatas, distances):
+         if dist > 0.6: 
+             continue
+             
+         context_docs.append({
+            "text": doc,
+            "madde_no": meta.get("madde", "?"),
+            "metadata": meta,
+            "score": 1 - dist
+        })
+    return context_docs
+
+def to_retrieve_response(results, with_handle: bool = True) -> RetrieveResponse:
+    if not results['distances'][0]:
+         return RetrieveResponse(context_docs=[], message="No results")
+
+    context_docs = build_context_docs(results)
+    return RetrieveResponse(
+        context_docs=context_docs,
+        message="Found matches" if context_docs else "No strong matches",
+        context_id=store_context(context_docs) if context_docs and with_handle else None
+    )
+
+# Identical questions in flight at the same moment (e.g. a viral question) share one
+# embedding + scan, and one LLM call per context. Only while in flight: no staleness.
+retrieve_flights = SingleFlight()
+answer_flights = SingleFlight()
+
+async def coalesced_retrieve(engine, question: str, nprobe: int = None, source: str = None):
+    key = (normalize_question(question), nprobe, source)
+    return await retrieve_flights.do(key, lambda: engine.aretrieve(question, nprobe=nprobe, source=source))
 
 @app.post("/api/retrieve", response_model=RetrieveResponse)
 async def retrieve_context(request: RetrieveRequest):
-    engine = get_engine()
+    engine = await aget_engine()
     
     try:
         # Step 1: Just retrieve documents
         # This should take < 5 seconds
-        results = engine.retrieve(request.question)
-        
-        documents = results['documents'][0]
-        metadatas = results['metadatas'][0]
-        distances = results['distances'][0]
-        
-        context_docs = []
-        
-        if not distances:
-             return RetrieveResponse(context_docs=[], message="No results")
-        
-        for i, (doc, meta, dist) in enumerate(zip(documents, metadatas, distances)):
-             if dist > 0.6: 
-                 continue
-                 
-             context_docs.append({
-                "text": doc,
-                "madde_no": meta.get("madde", "?"),
-                "metadata": meta,
-                "score": 1 - dist
-            })
-            
-        return RetrieveResponse(
-            context_docs=context_docs,
-            message="Found matches" if context_docs else "No strong matches"
-        )
+        results = await coalesced_retrieve(engine, request.question, nprobe=request.nprobe, source=request.source)
+        return to_retrieve_response(results)
         
     except HTTPException:
         raise
@@ -139,145 +278,264 @@ async def retrieve_context(request: RetrieveRequest):
         # Return empty list rather than fail, so flow continues
         return RetrieveResponse(context_docs=[], message=f"Error: {str(e)}")
 
-@app.post("/api/answer", response_model=GenerateResponse)
-async def generate_answer(request: GenerateRequest):
-    engine = get_engine()
-        
-    # Step 2: Generate Answer using provided context
-    # This also takes < 5-10 seconds
-    
+@app.post("/api/retrieve_batch", response_model=RetrieveBatchResponse)
+async def retrieve_context_batch(request: RetrieveBatchRequest):
+    """Retrieves context for many questions with one embedding call. Results keep input order."""
+    if len(request.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch.")
+    questions = [str(q) for q in request.questions]
+
+    engine = await aget_engine()
+    try:
+        batch_results = await engine.aretrieve_many(questions)
+        return RetrieveBatchResponse(results=[to_retrieve_response(r, with_handle=False) for r in batch_results])
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Batch Retrieval Error: {e}")
+        return RetrieveBatchResponse(
+            results=[RetrieveResponse(context_docs=[], message=f"Error: {str(e)}") for _ in questions]
+        )
+
+GREETINGS = ["merhaba", "selam", "günaydın", "iyi günler", "nasılsın", "hi", "hello"]
+
+def canned_answer(question: str, context_docs: list):
+    """Answers that need no LLM call (greeting / no context). None if the LLM is needed."""
     # 0. Check for greetings (in case context is empty but it's a greeting)
-    greetings = ["merhaba", "selam", "günaydın", "iyi günler", "nasılsın", "hi", "hello"]
-    if len(request.question) < 30 and any(g in request.question.lower() for g in greetings):
+    if len(question) < 30 and any(g in question.lower() for g in GREETINGS):
          return GenerateResponse(
             answer="Merhaba! Ben T.C. Anayasası yapay zeka asistanıyım. Size Anayasa maddeleri ve mevzuat hakkında nasıl yardımcı olabilirim?",
             prompt="Greeting"
         )
         
-    if not request.context_docs:
+    if not context_docs:
          return GenerateResponse(
             answer="Anayasa'da bu konuya ilişkin doğrudan bilgi bulunamadı.",
             prompt="No Context"
         )
+    return None
+
+def confidence_footer(context_docs: list, model_name: str) -> str:
+    # Append Debug info about retrieval confidence
+    scores = [f"%{int(d['score']*100)}" for d in context_docs[:3]]
+    return f"\n\n(AI Güveni: {', '.join(scores)} - Model: {model_name})"
+
+def all_models_failed_message(error) -> str:
+    return f"Üzgünüm, tüm yapay zeka modelleri şu an meşgul veya erişilemez durumda. Hata: {error}"
+
+# Same question (or a close paraphrase) over the same articles -> reuse the answer
+# instead of another generateContent call. Keyed on the corpus version too.
+answer_cache = AnswerCache(
+    max_size=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "21600")) or None,
+    similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+)
+
+def answer_cache_args(engine, question: str):
+    """(corpus version, query embedding if already cached) - None/None until the store is loaded."""
+    store = engine.vector_store
+    if store is None:
+        return None, None
+    return store.version, store.embedding_cache.peek_vector(question)
+
+def generation_outcome(model_name: str) -> str:
+    return "first_model" if model_name == GENERATION_MODELS[0] else "fallback"
+
+def client_budget(http_request: Request):
+    """The client's X-Request-Timeout-Ms in seconds, or None if it sent none (or garbage)."""
+    try:
+        return float(http_request.headers.get("x-request-timeout-ms", "")) / 1000
+    except ValueError:
+        return None
+
+def request_deadline(engine, http_request: Request, started: float) -> float:
+    """
+    time.monotonic() by which the answer must be done: the router's REQUEST_BUDGET (kept
+    inside Vercel's 60 s maxDuration) from when the request came in, or sooner if the
+    client sends X-Request-Timeout-Ms.
+    """
+    budget = engine.router.config["request_budget"]
+    custom = client_budget(http_request)
+    return started + (min(budget, custom) if custom is not None else budget)
+
+async def answer_with_context(engine, question: str, context_docs: list, deadline: float = None,
+                              budget: float = None) -> GenerateResponse:
+    """budget is the client's own X-Request-Timeout-Ms (client_budget()), None for the default one."""
+    started = time.perf_counter()
+    canned = canned_answer(question, context_docs)
+    if canned:
+        observe_answer("canned", time.perf_counter() - started)
+        return canned
 
     # Generate Prompt
-    prompt_text = engine.generate_prompt_content(request.question, request.context_docs)
-    
-    # Call LLM (REST API call happens here)
-    # Re-use engine's method but we need to bypass answer_question method's retrieve logic
-    # Or refactor engine. Let's just do REST call here or add a method to engine?
-    # Better to add a 'generate_answer_from_context' method to engine, or just duplicate the simple requests logic here.
-    # To keep it clean, let's call engine logic. 
-    # But wait, engine.answer_question does BOTH.
-    # We should add `engine.generate_only(question, context)` to rag_engine.py.
-    # For now, I will implement the REST call here to avoid editing rag_engine.py again right now if possible, 
-    # BUT I should edit rag_engine.py to expose generation logic cleanly.
-    # Actually I CANNOT edit rag_engine.py cleanly without tool call.
-    # I will inline the generation request here for speed.
-    
-    import requests
-    import time
-    
-    # Need API Key. defined in engine?
-    api_key = engine.api_key
-    
-    # Models to try in order (Based on available models for this Key)
-    models_to_try = ["gemini-2.0-flash", "gemini-2.0-flash-lite", "gemini-flash-latest"]
+    prompt_text = engine.generate_prompt_content(question, context_docs)
+
+    version, embedding = answer_cache_args(engine, question)
+    with stage("answer_cache"):
+        cached = answer_cache.lookup(question, context_docs, version, embedding)
+    if cached:
+        footer = confidence_footer(context_docs, f"{cached['model_name']}, önbellek")
+        observe_answer("cache", time.perf_counter() - started)
+        return GenerateResponse(answer=cached["answer"] + footer, prompt=prompt_text, vis_data=calculate_vis_data(context_docs))
     
-    last_error = None
+    async def generate():
+        answer, model_name = await engine.agenerate_answer(prompt_text, deadline)
+        answer_cache.put(question, context_docs, answer, model_name, version, embedding)
+        return answer, model_name
+
+    # Call LLM (async, pooled connection; falls back through the models), once per identical in-flight request
+    try:
+        # context_key() hashes the article texts: a forged context never joins a real one's flight.
+        # The flight runs on its leader's deadline, so only requests with the same budget share it
+        # (a 100 ms leader's 504 must not reach a follower that has the whole default budget left).
+        flight_key = (normalize_question(question), context_key(context_docs), version, budget)
+        answer, model_name = await answer_flights.do(flight_key, generate)
+    except DeadlineExceeded as e:
+        # The request's budget ran out: a gateway timeout, not an answer. A model (or upstream)
+        # timing out with budget left is just another failed model, answered below.
+        observe_answer("timeout", time.perf_counter() - started)
+        raise HTTPException(status_code=504, detail=all_models_failed_message(e))
+    except GeminiError as e:
+        observe_answer("all_failed", time.perf_counter() - started)
+        # Even on error, return structure
+        return GenerateResponse(answer=all_models_failed_message(e), prompt=prompt_text)
+    observe_answer(generation_outcome(model_name), time.perf_counter() - started)
+
+    # Success!
+    vis_data = calculate_vis_data(context_docs)
     
-    for model_name in models_to_try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
-        
-        payload = {
-            "contents": [{
-                "parts": [{"text": prompt_text}]
-            }]
-        }
+    return GenerateResponse(answer=answer + confidence_footer(context_docs, model_name), prompt=prompt_text, vis_data=vis_data)
+
+@app.post("/api/answer", response_model=GenerateResponse)
+async def generate_answer(request: GenerateRequest, http_request: Request):
+    started = time.monotonic()
+    engine = await aget_engine()
         
+    # Step 2: Generate Answer using provided context (or the server-held context_id)
+    # This also takes < 5-10 seconds
+    context_docs = resolve_context(request)
+    return await answer_with_context(engine, request.question, context_docs,
+                                     request_deadline(engine, http_request, started), client_budget(http_request))
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest, http_request: Request):
+    """Retrieve + generate in one round trip (context never leaves the server in between)."""
+    started = time.monotonic()
+    engine = await aget_engine()
+
+    try:
+        results = await coalesced_retrieve(engine, request.question)
+        context_docs = build_context_docs(results) if results['distances'][0] else []
+    except Exception as e:
+        print(f"Retrieval Error: {e}")
+        context_docs = []
+
+    generated = await answer_with_context(engine, request.question, context_docs,
+                                          request_deadline(engine, http_request, started), client_budget(http_request))
+    return ChatResponse(answer=generated.answer, prompt=generated.prompt, vis_data=generated.vis_data, context_docs=context_docs)
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/answer_stream")
+async def generate_answer_stream(request: GenerateRequest, http_request: Request):
+    """
+    Streaming /api/answer over Server-Sent Events. Event order:
+      sources -> vis (query point) -> token* -> done (confidence footer)
+    or a single `error` event if every model failed before producing text (with
+    "status": 504 when the answer deadline ran out, like /api/answer).
+    """
+    started = time.monotonic()
+    engine = await aget_engine()
+    context_docs = resolve_context(request)
+    deadline = request_deadline(engine, http_request, started)
+
+    async def events():
+        started = time.perf_counter()
+        canned = canned_answer(request.question, context_docs)
+        if canned:
+            observe_answer("canned", time.perf_counter() - started)
+            yield sse_event("token", {"text": canned.answer})
+            yield sse_event("done", {"footer": "", "model": None, "prompt": canned.prompt})
+            return
+
+        # Sources first: the UI can render them while the model is still thinking
+        yield sse_event("sources", {"context_docs": [
+            {"madde_no": d.get("madde_no"), "metadata": d.get("metadata", {}), "score": d.get("score")}
+            for d in context_docs
+        ]})
+        vis_data = calculate_vis_data(context_docs)
+        if vis_data:
+            yield sse_event("vis", jsonable_encoder(vis_data))
+
+        prompt_text = engine.generate_prompt_content(request.question, context_docs)
+
+        version, embedding = answer_cache_args(engine, request.question)
+        with stage("answer_cache"):
+            cached = answer_cache.lookup(request.question, context_docs, version, embedding)
+        if cached:
+            observe_answer("cache", time.perf_counter() - started)
+            yield sse_event("token", {"text": cached["answer"]})
+            yield sse_event("done", {
+                "footer": confidence_footer(context_docs, f"{cached['model_name']}, önbellek"),
+                "model": cached["model_name"],
+                "prompt": prompt_text
+            })
+            return
+
+        model_name = None
+        pieces = []
         try:
-            print(f"Trying model: {model_name}")
-            resp = requests.post(url, json=payload, timeout=30)
-            
-            if resp.status_code == 429:
-                # Rate limit? Wait and try next model or same?
-                # Let's simple wait and continue matching loop or retry same?
-                # For simplicity, move to next model if this one is busy/rate limited
-                time.sleep(2)
-                continue
-                
-            resp.raise_for_status()
-            data = resp.json()
-            answer = data['candidates'][0]['content']['parts'][0]['text']
-            
-            # Success!
-            # Append Debug info about retrieval confidence
-            scores = [f"%{int(d['score']*100)}" for d in request.context_docs[:3]]
-            debug_footer = f"\n\n(AI Güveni: {', '.join(scores)} - Model: {model_name})"
-            
-            vis_data = calculate_vis_data(request.context_docs)
-            
-            return GenerateResponse(answer=answer + debug_footer, prompt=prompt_text, vis_data=vis_data)
-            
+            async for model_name, piece in engine.astream_answer(prompt_text, deadline):
+                pieces.append(piece)
+                yield sse_event("token", {"text": piece})
         except Exception as e:
-            print(f"Model {model_name} failed: {e}")
-            last_error = e
-            time.sleep(1)
-
-    # If all failed
-    if last_error:
-        err_msg = str(last_error).replace(api_key, "HIDDEN_KEY")
-        answer = f"Üzgünüm, tüm yapay zeka modelleri şu an meşgul veya erişilemez durumda. Hata: {err_msg}"
-    else:
-        answer = "Beklenmedik hata."
+            print(f"Stream Error: {e}")
+            # The stream is already a 200, so the deadline's 504 travels in the error event
+            timed_out = isinstance(e, DeadlineExceeded)
+            observe_answer("timeout" if timed_out else "all_failed", time.perf_counter() - started)
+            yield sse_event("error", {"message": all_models_failed_message(e), "status": 504 if timed_out else None})
+            return
+        observe_answer(generation_outcome(model_name), time.perf_counter() - started)
+        answer_cache.put(request.question, context_docs, "".join(pieces), model_name, version, embedding)
 
-    # Even on error, return structure
-    return GenerateResponse(answer=answer, prompt=prompt_text)
+        yield sse_event("done", {
+            "footer": confidence_footer(context_docs, model_name),
+            "model": model_name,
+            "prompt": prompt_text
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # No proxy buffering, otherwise tokens arrive in one lump at the end
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Helper to calculate Vis Data
+@timed("vis")
 def calculate_vis_data(context_docs):
-    all_points = get_coords()
-    if not all_points or not context_docs:
+    index = get_coords_index()
+    if not index or not index.points or not context_docs:
         return None
         
     # Find matching points for context docs
-    # context_docs have 'text' and 'metadata'. We match by ? ID is not in context_docs directly usually?
-    # RAGEngine returns text/metadata. Metadata has 'source' and 'madde'.
-    # Our coords have 'source' and 'madde'.
-    
-    nearby_points = []
-    
-    # Simple matching (Naive O(N*M)) - acceptable for small N/M
+    # context_docs have 'text' and 'metadata'. Metadata has 'source' and 'madde',
+    # our coords have 'source' and 'madde' -> (source, madde) hash lookup.
     query_x = 0
     query_y = 0
     total_score = 0
+    matched_ids = []
     
     for doc in context_docs:
         meta = doc.get("metadata", {})
         score = doc.get("score", 0.5)
         
-        # Find coords
-        target_madde = meta.get("madde")
-        target_source = meta.get("source")
-        
         # Robust matching (Handle string/int mismatch and source variations)
-        match = None
-        for p in all_points:
-            # Check Source
-            # If p["source"] is "Anayasa", target must be "Anayasa"
-            # If p["source"] is "TIHEK Kanunu", target might be "TIHEK Kanunu" or "TIHEK"
-            p_src = str(p.get("source", "")).lower()
-            t_src = str(target_source).lower()
-            
-            if p_src not in t_src and t_src not in p_src:
-                continue
-                
-            # Check Madde No
-            if str(p.get("madde")) == str(target_madde):
-                match = p
-                break
+        match = index.lookup(meta.get("source"), meta.get("madde"))
         
         if match:
+            matched_ids.append(match.get("id"))
             # Weight the Top-1 result significantly more to prevent drift
             # If doc is Top-1 (implied by order usually, but let's use explicit score)
             # Use score^4 to punish lower scores heavily in the centroid
@@ -296,17 +554,62 @@ def calculate_vis_data(context_docs):
         query_y = 0.5
         
     return VisData(
-        map_points=all_points,
-        query_point={"x": query_x, "y": query_y, "label": "Soru"}
+        query_point={"x": query_x, "y": query_y, "label": "Soru"},
+        matched_ids=matched_ids,
+        map_version=index.version
     )
 
-# Keep legacy endpoint for backward compat if needed, but Frontend will switch
-# Removed @app.post("/api/chat") ... to force switch and save space.
+@app.get("/api/map")
+def get_map(request: Request, v: str = None):
+    """Static embedding map. With ?v=<current version> it is cacheable forever."""
+    index = get_coords_index()
+    if not index:
+        raise HTTPException(status_code=404, detail="Map data not found.")
+    if v == index.version:
+        return index.versioned_body.respond(request)
+    return index.latest_body.respond(request)
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/api/ready")
+def ready():
+    """Readiness probe: 200 once the index is loaded, 503 while cold/warming/failed."""
+    body = {"status": engine_state}
+    if engine_error:
+        body["error"] = engine_error
+    return JSONResponse(body, status_code=200 if engine_state == "warm" else 503)
+
+@app.post("/api/warmup")
+@app.get("/api/warmup")
+async def warmup():
+    """Loads the engine now (e.g. from a cron/deploy hook) so no user request pays the cold start."""
+    await warm_up()
+    return ready()
+
+@app.get("/api/cache_stats")
+def cache_stats():
+    """Hit/miss counters of the in-process caches (empty until the engine is loaded)."""
+    stats = {"answer_cache": answer_cache.stats()}
+    if engine is not None and engine.vector_store is not None:
+        stats["embedding_cache"] = engine.vector_store.embedding_cache.stats()
+        stats["embedding_batcher"] = engine.vector_store.embed_batcher.stats()
+    stats["single_flight"] = {"retrieve": retrieve_flights.stats(), "answer": answer_flights.stats()}
+    return stats
+
+@app.get("/api/model_stats")
+def model_stats():
+    """Model router state: circuit breakers, recent latency / error rate per model, hedges."""
+    if engine is None:
+        return {}
+    return engine.router.snapshot()
+
+@app.get("/api/metrics")
+def metrics():
+    """Per-stage / per-model / per-outcome latency histograms of this instance (Prometheus text format)."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/debug_map")
 def debug_map():
     """Debug endpoint to check if map data loads."""
@@ -0,0 +1,185 @@
+"""
+Per-stage latency metrics for the retrieve / answer paths.
+
+  with stage("embed"):      # times the block
+      ...
+
+Every timed block goes to an in-process histogram (exported at /api/metrics in the
+Prometheus text format) and, inside a request, to that request's Server-Timing
+header (ServerTimingMiddleware keeps the per-request list in a ContextVar, which
+asyncio.to_thread / the threadpool copy along, so stages timed in worker threads
+land in the right request).
+
+Histograms are per process; on Vercel each warm instance reports its own (the
+route sits under /api because vercel.json only sends /api/* to the function).
+Cost per observation: two perf_counter() calls, a bisect and a few dict lookups.
+"""
+import bisect
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+
+# Upper bounds in seconds: sub-millisecond scoring up to the 60 s function limit
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    """One label set: cumulative-ready bucket counts, sum and count."""
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1) # Last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+class HistogramFamily:
+    def __init__(self, name: str, help_text: str, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.children = {} # label values tuple -> Histogram
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, *label_values):
+        child = self.children.get(label_values)
+        with self._lock:
+            if child is None:
+                child = self.children.setdefault(label_values, Histogram())
+            child.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+            child.sum += seconds
+            child.count += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(h.counts), h.sum, h.count) for labels, h in sorted(self.children.items())]
+        for labels, counts, total, count in snapshot:
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+            sep = "," if base else ""
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {cumulative}')
+            suffix = f"{{{base}}}" if base else ""
+            lines.append(f"{self.name}_sum{suffix} {total:.6f}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+STAGE_SECONDS = HistogramFamily(
+    "rag_stage_seconds", "Time per pipeline stage (embed, backoff, vector_search, lexical, rerank, prompt, answer_cache, vis)", ["stage"])
+MODEL_SECONDS = HistogramFamily(
+    "rag_model_attempt_seconds", "Time per generation attempt, by model and outcome (ok, rate_limited, timeout, error, empty, cancelled)",
+    ["model", "outcome"])
+ANSWER_SECONDS = HistogramFamily(
+    "rag_answer_seconds", "Time to an answer, by how it was produced (first_model, fallback, all_failed, timeout, cache, canned)",
+    ["outcome"])
+REQUEST_SECONDS = HistogramFamily(
+    "http_request_seconds", "Request handling time (until the response headers), by route and status", ["route", "status"])
+FAMILIES = [STAGE_SECONDS, MODEL_SECONDS, ANSWER_SECONDS, REQUEST_SECONDS]
+
+# (name, milliseconds, description) entries of the current request, None outside requests
+_timings = contextvars.ContextVar("server_timings", default=None)
+
+def record_timing(name: str, seconds: float, description: str = None):
+    """Adds an entry to the current request's Server-Timing header (no-op outside a request)."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds * 1000, description))
+
+@contextlib.contextmanager
+def collect_timings():
+    """Collects record_timing() entries outside a request, e.g. per question in run_eval.py."""
+    timings = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+def observe_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, name)
+    record_timing(name, seconds)
+
+class stage:
+    """Context manager timing one pipeline stage into STAGE_SECONDS and Server-Timing."""
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe_stage(self.name, time.perf_counter() - self.started)
+        return False
+
+def timed(name: str):
+    """Decorator form of stage() for whole functions."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def observe_model(model: str, outcome: str, seconds: float):
+    MODEL_SECONDS.observe(seconds, model, outcome)
+    record_timing("generate", seconds, f"{model} {outcome}")
+
+def observe_answer(outcome: str, seconds: float):
+    ANSWER_SECONDS.observe(seconds, outcome)
+
+def server_timing_header(timings: list, total_seconds: float) -> str:
+    parts = []
+    for name, ms, description in timings:
+        desc = f';desc="{description}"' if description else ""
+        parts.append(f"{name}{desc};dur={ms:.2f}")
+    parts.append(f"total;dur={total_seconds * 1000:.2f}")
+    return ", ".join(parts)
+
+def render() -> str:
+    lines = []
+    for family in FAMILIES:
+        lines.extend(family.render())
+    return "\n".join(lines) + "\n"
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware: collects the stages timed during a request and sends them as a
+    Server-Timing header, and observes REQUEST_SECONDS. Streaming responses only carry
+    what happened before their headers went out (retrieval, not the generated tokens).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = []
+        token = _timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing_header(timings, elapsed).encode("latin-1")))
+                headers.append((b"timing-allow-origin", b"*")) # Let the (cross-origin) frontend see the timings
+                message = {**message, "headers": headers}
+                route = scope.get("route")
+                REQUEST_SECONDS.observe(elapsed, getattr(route, "path", "unmatched"), str(message["status"]))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
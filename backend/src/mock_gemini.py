@@ -0,0 +1,132 @@
+"""
+Local stand-in for the Gemini REST API, for offline load tests and precompute runs.
+
+Implements the endpoints gemini_client.py uses (embedContent, batchEmbedContents,
+generateContent, streamGenerateContent?alt=sse, models list) with:
+  - simulated latency (mean + jitter per request, per streamed piece)
+  - a per-minute request quota and random 429s, both with Retry-After
+  - random 5xx and "down" models that always return 503
+Embeddings are deterministic per text (seeded by its hash), so runs are repeatable.
+
+Usage:
+  python backend/src/mock_gemini.py --port 8765 --latency 0.2 --rate-429 0.05 --rpm 600
+  GEMINI_API_BASE=http://127.0.0.1:8765/v1beta GEMINI_API_KEY=test python backend/src/precompute_embeddings.py
+
+Settings are also read from MOCK_* environment variables (see MOCK_CONFIG).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MOCK_CONFIG = {
+    "latency": float(os.getenv("MOCK_LATENCY", "0.1")), # Seconds per request (mean)
+    "jitter": float(os.getenv("MOCK_JITTER", "0.5")), # +/- fraction of latency
+    "rate_429": float(os.getenv("MOCK_RATE_429", "0")), # Probability of a random 429
+    "rate_5xx": float(os.getenv("MOCK_RATE_5XX", "0")), # Probability of a random 503
+    "rpm": int(os.getenv("MOCK_RPM", "0")), # Requests per minute before 429s, 0 = unlimited
+    "retry_after": float(os.getenv("MOCK_RETRY_AFTER", "1")),
+    "down_models": [m for m in os.getenv("MOCK_DOWN_MODELS", "").split(",") if m], # Always 503
+    "dim": int(os.getenv("MOCK_DIM", "768")),
+    "stream_pieces": int(os.getenv("MOCK_STREAM_PIECES", "5")),
+}
+
+app = FastAPI()
+stats = {"requests": 0, "throttled": 0, "errors": 0, "embedded": 0}
+_window = {"start": 0.0, "count": 0}
+
+def fake_embedding(text: str) -> list:
+    seed = int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(MOCK_CONFIG["dim"]).astype(np.float32).round(6).tolist()
+
+def _text(content: dict) -> str:
+    return "".join(p.get("text", "") for p in content.get("parts", []))
+
+async def _delay(latency: float):
+    jitter = MOCK_CONFIG["jitter"]
+    await asyncio.sleep(max(0.0, latency * (1 + random.uniform(-jitter, jitter))))
+
+def _fault(model: str):
+    """A simulated error response for this request, or None."""
+    stats["requests"] += 1
+    now = time.monotonic()
+    if now - _window["start"] >= 60:
+        _window["start"], _window["count"] = now, 0
+    _window["count"] += 1
+
+    retry = {"Retry-After": str(MOCK_CONFIG["retry_after"])}
+    if model in MOCK_CONFIG["down_models"] or random.random() < MOCK_CONFIG["rate_5xx"]:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"code": 503, "message": "The model is overloaded."}}, status_code=503)
+    if (MOCK_CONFIG["rpm"] and _window["count"] > MOCK_CONFIG["rpm"]) or random.random() < MOCK_CONFIG["rate_429"]:
+        stats["throttled"] += 1
+        return JSONResponse({"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota)."}},
+                            status_code=429, headers=retry)
+    return None
+
+@app.get("/v1beta/models")
+async def list_models():
+    return {"models": [{"name": "models/text-embedding-004"}, {"name": "models/gemini-2.0-flash"}]}
+
+@app.post("/v1beta/models/{target}")
+async def model_method(target: str, request: Request):
+    model, _, method = target.partition(":")
+    body = await request.json()
+    fault = _fault(model)
+    if fault is not None:
+        await _delay(MOCK_CONFIG["latency"] / 4) # Errors come back faster than answers
+        return fault
+
+    if method == "embedContent":
+        await _delay(MOCK_CONFIG["latency"])
+        stats["embedded"] += 1
+        return {"embedding": {"values": fake_embedding(_text(body["content"]))}}
+
+    if method == "batchEmbedContents":
+        await _delay(MOCK_CONFIG["latency"])
+        stats["embedded"] += len(body["requests"])
+        return {"embeddings": [{"values": fake_embedding(_text(r["content"]))} for r in body["requests"]]}
+
+    prompt = _text(body["contents"][0])
+    answer = f"[{model}] {len(prompt)} karakterlik soruya örnek cevap."
+    if method == "generateContent":
+        await _delay(MOCK_CONFIG["latency"])
+        return {"candidates": [{"content": {"parts": [{"text": answer}]}}]}
+
+    if method == "streamGenerateContent":
+        pieces = MOCK_CONFIG["stream_pieces"]
+        words = answer.split(" ")
+        step = max(1, -(-len(words) // pieces))
+        async def events():
+            for i in range(0, len(words), step):
+                await _delay(MOCK_CONFIG["latency"] / pieces)
+                chunk = {"candidates": [{"content": {"parts": [{"text": " ".join(words[i:i + step]) + " "}]}}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return JSONResponse({"error": {"code": 404, "message": f"Unknown method {method}"}}, status_code=404)
+
+@app.get("/mock/stats")
+def mock_stats():
+    return {**stats, "config": MOCK_CONFIG}
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Local Gemini API stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=MOCK_CONFIG["latency"])
+    parser.add_argument("--rate-429", type=float, default=MOCK_CONFIG["rate_429"])
+    parser.add_argument("--rate-5xx", type=float, default=MOCK_CONFIG["rate_5xx"])
+    parser.add_argument("--rpm", type=int, default=MOCK_CONFIG["rpm"])
+    parser.add_argument("--down-models", default=",".join(MOCK_CONFIG["down_models"]))
+    args = parser.parse_args()
+
+    MOCK_CONFIG.update(latency=args.latency, rate_429=args.rate_429, rate_5xx=args.rate_5xx, rpm=args.rpm,
+                       down_models=[m for m in args.down_models.split(",") if m])
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
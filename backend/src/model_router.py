@@ -0,0 +1,378 @@
+"""
+Latency-aware routing of generation calls over GENERATION_MODELS.
+
+Replaces the fixed "try each model in order, sleep after errors" loop:
+  - per-model stats: recent latencies (successful calls), outcomes, error rate
+  - a circuit breaker per model: BREAKER_FAILURES consecutive 429/5xx/timeouts open
+    it for a cooldown (at least the Retry-After, doubling on every re-open up to
+    BREAKER_MAX_COOLDOWN); afterwards one probe request is let through (half-open)
+    and its result closes or re-opens the breaker. An open model is skipped at once
+    instead of costing every request an attempt and a sleep.
+  - optional hedging (MODEL_HEDGING=1): when the first model has not answered after
+    its HEDGE_PERCENTILE latency, the next model is started too; the first answer
+    wins and the other call is cancelled
+  - a deadline for the whole answer (REQUEST_BUDGET, inside Vercel's 60 s maxDuration):
+    every attempt gets at most the remaining time, and no attempt starts with less
+    than MIN_ATTEMPT left
+
+Models are tried in configured (quality) order; ones failing most of their recent
+calls move behind the healthy ones.
+
+Try it against the mock (from repo root):
+  python backend/src/mock_gemini.py --port 8765 --down-models gemini-2.0-flash &
+  GEMINI_API_BASE=http://127.0.0.1:8765/v1beta GEMINI_API_KEY=test python backend/src/model_router.py --requests 40
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+import os
+import time
+from collections import deque
+import numpy as np
+from gemini_client import GeminiError
+from metrics import observe_model
+
+class DeadlineExceeded(GeminiError):
+    """The answer's own deadline ran out; a single model timing out (or an upstream 504) is not this."""
+
+ROUTER_CONFIG = {
+    "attempt_timeout": float(os.getenv("MODEL_ATTEMPT_TIMEOUT", "30")), # Seconds per call
+    "request_budget": float(os.getenv("REQUEST_BUDGET", "55")), # Seconds per answer, all attempts included
+    "min_attempt": float(os.getenv("MODEL_MIN_ATTEMPT", "2")), # Don't start a call with less time than this left
+    "breaker_failures": int(os.getenv("BREAKER_FAILURES", "3")),
+    "breaker_cooldown": float(os.getenv("BREAKER_COOLDOWN", "20")),
+    "breaker_max_cooldown": float(os.getenv("BREAKER_MAX_COOLDOWN", "300")),
+    "hedging": os.getenv("MODEL_HEDGING", "").lower() in ("1", "true", "yes"),
+    "hedge_percentile": float(os.getenv("HEDGE_PERCENTILE", "90")),
+    "hedge_min_samples": 20, # Below this the percentile is noise, HEDGE_DEFAULT_DELAY is used
+    "hedge_default_delay": float(os.getenv("HEDGE_DEFAULT_DELAY", "8")),
+    "hedge_min_delay": 0.5,
+    "demote_error_rate": 0.5, # Recent error rate above which a model goes behind the healthy ones
+}
+# Failures that say something about the model (quota, overload, outage), not about the prompt
+TRIP_STATUS = {404, 429, 500, 502, 503, 504}
+
+def attempt_outcome(error: Exception) -> str:
+    """Metrics label for a failed generation attempt."""
+    status = getattr(error, "status_code", None)
+    if status == 429:
+        return "rate_limited"
+    if status == 504 or isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    return "error"
+
+def trips_breaker(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    # No status = transport error / timeout: the model (or its endpoint) is not answering
+    return status is None or status in TRIP_STATUS
+
+class ModelStats:
+    def __init__(self, window: int = 100):
+        self.latencies = deque(maxlen=window) # Seconds, successful calls
+        self.outcomes = deque(maxlen=window) # True = success
+        self.calls = 0
+        self.failures = 0
+
+    def record(self, ok: bool, seconds: float):
+        self.calls += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(seconds)
+        else:
+            self.failures += 1
+
+    @property
+    def error_rate(self) -> float:
+        return 1 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def percentile(self, q: float):
+        return float(np.percentile(self.latencies, q)) if self.latencies else None
+
+class CircuitBreaker:
+    """closed -> (N consecutive failures) -> open -> (cooldown) -> half-open: one probe -> closed / open."""
+
+    def __init__(self, failures: int, cooldown: float, max_cooldown: float):
+        self.threshold = failures
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.opened = 0
+
+    def available(self, now: float) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and now >= self.open_until:
+            self.state = "half_open"
+        return self.state == "half_open" and not self.probing
+
+    def begin(self):
+        if self.state == "half_open":
+            self.probing = True
+
+    def success(self):
+        self.state, self.consecutive, self.probing = "closed", 0, False
+        self.cooldown = self.base_cooldown
+
+    def failure(self, now: float, retry_after: float = None):
+        self.consecutive += 1
+        if self.state == "open": # A call started before the breaker opened
+            self.open_until = max(self.open_until, now + (retry_after or 0.0))
+        elif self.state == "half_open" or self.consecutive >= self.threshold:
+            if self.state == "half_open":
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self.state = "open"
+            self.open_until = now + max(self.cooldown, retry_after or 0.0)
+            self.opened += 1
+        self.probing = False
+
+    def release(self):
+        """Attempt ended without a verdict (cancelled hedge, bad request): let another probe through."""
+        self.probing = False
+
+class ModelRouter:
+    def __init__(self, client, models: list, config: dict = None):
+        self.client = client
+        self.models = list(models)
+        self.config = {**ROUTER_CONFIG, **(config or {})}
+        self.stats = {m: ModelStats() for m in self.models}
+        self.breakers = {m: CircuitBreaker(self.config["breaker_failures"], self.config["breaker_cooldown"],
+                                           self.config["breaker_max_cooldown"]) for m in self.models}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    def deadline(self, budget: float = None) -> float:
+        """Absolute (monotonic) deadline for an answer started now."""
+        return time.monotonic() + (budget or self.config["request_budget"])
+
+    def candidates(self) -> list:
+        """Models worth trying now, best first: breaker not open, healthy before failing, then configured order."""
+        now = time.monotonic()
+        usable = [m for m in self.models if self.breakers[m].available(now)]
+        demote = self.config["demote_error_rate"]
+        return sorted(usable, key=lambda m: self.stats[m].error_rate > demote)
+
+    def _unavailable(self) -> GeminiError:
+        now = time.monotonic()
+        wait = min((b.open_until - now for b in self.breakers.values() if b.state == "open"), default=0.0)
+        return GeminiError("All models are cooling down after repeated errors (circuit open).", 503, max(wait, 0.0))
+
+    def _out_of_time(self) -> GeminiError:
+        self.deadline_exceeded += 1
+        return DeadlineExceeded("Answer deadline exceeded before a model responded.", 504)
+
+    def _attempt_timeout(self, deadline: float):
+        remaining = deadline - time.monotonic()
+        if remaining < self.config["min_attempt"]:
+            return None
+        return min(self.config["attempt_timeout"], remaining)
+
+    def _record(self, model: str, started: float, error: Exception = None):
+        seconds = time.monotonic() - started
+        breaker = self.breakers[model]
+        if error is None:
+            self.stats[model].record(True, seconds)
+            breaker.success()
+            observe_model(model, "ok", seconds)
+        elif isinstance(error, asyncio.CancelledError):
+            breaker.release() # Lost a hedge race or the client left: says nothing about the model
+            observe_model(model, "cancelled", seconds)
+        else:
+            self.stats[model].record(False, seconds)
+            if trips_breaker(error):
+                breaker.failure(time.monotonic(), getattr(error, "retry_after", None))
+            else:
+                breaker.release()
+            observe_model(model, attempt_outcome(error), seconds)
+
+    async def _attempt(self, model: str, prompt_text: str, timeout: float) -> str:
+        self.breakers[model].begin()
+        started = time.monotonic()
+        try:
+            print(f"Trying model: {model}")
+            # No same-model retries: a busy model is better skipped for the next one
+            answer = await asyncio.wait_for(
+                self.client.agenerate(model, prompt_text, timeout=timeout, retries=0), timeout)
+        except asyncio.TimeoutError:
+            error = GeminiError(f"{model} did not answer within {timeout:.1f}s", 504)
+            self._record(model, started, error)
+            raise error
+        except BaseException as e: # CancelledError included, so a cancelled probe frees the breaker
+            self._record(model, started, e)
+            if isinstance(e, GeminiError):
+                print(f"Model {model} failed: {e}")
+            raise
+        self._record(model, started)
+        return answer
+
+    def hedge_delay(self, model: str) -> float:
+        stats = self.stats[model]
+        if len(stats.latencies) < self.config["hedge_min_samples"]:
+            return self.config["hedge_default_delay"]
+        return max(stats.percentile(self.config["hedge_percentile"]), self.config["hedge_min_delay"])
+
+    async def _hedged(self, primary: str, backup: str, prompt_text: str, deadline: float, tried: set):
+        """(answer, model). The backup starts (and joins tried) only if primary is slower than its usual."""
+        timeout = self._attempt_timeout(deadline)
+        first = asyncio.ensure_future(self._attempt(primary, prompt_text, timeout))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_delay(primary))
+            backup_timeout = self._attempt_timeout(deadline)
+            if done or backup_timeout is None or not self.breakers[backup].available(time.monotonic()):
+                return await first, primary
+
+            self.hedges += 1
+            tried.add(backup)
+            second = asyncio.ensure_future(self._attempt(backup, prompt_text, backup_timeout))
+            pending, errors = {first, second}, []
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            if task is second:
+                                self.hedge_wins += 1
+                            return task.result(), (primary if task is first else backup)
+                        errors.append(task.exception())
+                raise errors[-1]
+            finally:
+                for task in pending:
+                    task.cancel()
+        finally:
+            if not first.done():
+                first.cancel()
+
+    async def generate(self, prompt_text: str, deadline: float = None):
+        """Returns (answer, model_name). Raises GeminiError when every usable model failed or time ran out."""
+        deadline = deadline or self.deadline()
+        queue = self.candidates()
+        if not queue:
+            raise self._unavailable()
+        last_error, tried = None, set()
+        while queue:
+            model = queue.pop(0)
+            timeout = self._attempt_timeout(deadline)
+            if timeout is None:
+                raise self._out_of_time()
+            if not self.breakers[model].available(time.monotonic()):
+                continue # Opened (or another request took the half-open probe) since the queue was built
+            tried.add(model)
+            try:
+                if self.config["hedging"] and queue:
+                    return await self._hedged(model, queue[0], prompt_text, deadline, tried)
+                return await self._attempt(model, prompt_text, timeout), model
+            except GeminiError as e:
+                last_error = e
+            queue = [m for m in queue if m not in tried] # A backup that raced and failed has had its turn
+        if last_error is not None and time.monotonic() >= deadline:
+            raise self._out_of_time() # The last attempt was cut short by the deadline, not by its model
+        raise last_error or self._unavailable()
+
+    async def stream(self, prompt_text: str, deadline: float = None):
+        """
+        Streaming generate(): yields (model_name, text_piece). Falls back to the next
+        model only while nothing has been sent yet; no hedging (one token stream per client).
+        """
+        deadline = deadline or self.deadline()
+        queue = self.candidates()
+        if not queue:
+            raise self._unavailable()
+        last_error = None
+        for model in queue:
+            timeout = self._attempt_timeout(deadline)
+            if timeout is None:
+                raise self._out_of_time()
+            if not self.breakers[model].available(time.monotonic()):
+                continue
+            self.breakers[model].begin()
+            started_at = time.monotonic()
+            started = False
+            try:
+                print(f"Trying model (stream): {model}")
+                async for piece in self.client.astream_generate(model, prompt_text, timeout=timeout):
+                    if not started:
+                        started = True
+                        # Time to first token is what the user waits for; the stream length is the answer's
+                        self._record(model, started_at)
+                    yield model, piece
+                    if time.monotonic() > deadline:
+                        raise self._out_of_time()
+                if started:
+                    return
+                self.breakers[model].release()
+                observe_model(model, "empty", time.monotonic() - started_at)
+                last_error = GeminiError(f"Empty response from {model}")
+            except Exception as e:
+                if started:
+                    raise # Part of the answer is already out, can't switch models now
+                error = e if isinstance(e, GeminiError) else GeminiError(str(e))
+                self._record(model, started_at, error)
+                print(f"Model {model} failed: {e}")
+                last_error = error
+            except BaseException as e:
+                if not started:
+                    self._record(model, started_at, e)
+                raise
+        if last_error is not None and time.monotonic() >= deadline:
+            raise self._out_of_time()
+        raise last_error or self._unavailable()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        models = {}
+        for m in self.models:
+            stats, breaker = self.stats[m], self.breakers[m]
+            breaker.available(now) # Moves an expired open breaker to half-open for the report
+            p50, p90 = stats.percentile(50), stats.percentile(90)
+            models[m] = {
+                "state": breaker.state,
+                "open_for_s": round(max(breaker.open_until - now, 0.0), 1) if breaker.state == "open" else 0.0,
+                "times_opened": breaker.opened,
+                "calls": stats.calls,
+                "failures": stats.failures,
+                "recent_error_rate": round(stats.error_rate, 3),
+                "p50_s": round(p50, 3) if p50 is not None else None,
+                "p90_s": round(p90, 3) if p90 is not None else None,
+            }
+        return {"hedging": self.config["hedging"], "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+                "deadline_exceeded": self.deadline_exceeded, "models": models}
+
+async def simulate(requests: int, concurrency: int, hedging: bool, budget: float):
+    """Drives the router against GEMINI_API_BASE (e.g. mock_gemini.py) and reports outcomes + router state."""
+    from gemini_client import get_client
+    from rag_engine import GENERATION_MODELS
+    router = ModelRouter(get_client(), GENERATION_MODELS, {"hedging": hedging})
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes, latencies = {}, []
+
+    async def one(i):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                _, model = await router.generate(f"Soru {i}: Madde {i % 170 + 1} nedir?", router.deadline(budget))
+                key = model
+            except GeminiError as e:
+                key = f"failed ({e.status_code})"
+            outcomes[key] = outcomes.get(key, 0) + 1
+            latencies.append(time.monotonic() - started)
+
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    return {"outcomes": outcomes, "p50_s": round(float(np.percentile(latencies, 50)), 3),
+            "max_s": round(max(latencies), 3), "router": router.snapshot()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exercise the model router against GEMINI_API_BASE (e.g. the mock)")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--hedging", action="store_true")
+    parser.add_argument("--budget", type=float, default=ROUTER_CONFIG["request_budget"])
+    args = parser.parse_args()
+    with contextlib.redirect_stdout(sys.stderr): # Per-attempt logs, stdout stays the report
+        report = asyncio.run(simulate(args.requests, args.concurrency, args.hedging, args.budget))
+    print(json.dumps(report, indent=2))
@@ -1,69 +1,269 @@
-import google.generativeai as genai
+"""
+Embeds every chunk of chunks.json into embeddings_gemini.json (+ the compiled index).
+
+- batchEmbedContents: up to 100 chunks per request, `concurrency` requests in flight
+- AdaptiveRateLimiter: request rate grows while calls succeed and halves on every 429
+  (honouring Retry-After); failed batches are retried with backoff, a batch the API
+  rejects outright is split to isolate the bad chunk
+- progress is appended to <output>.checkpoint.jsonl after every batch, keyed by
+  content_hash(), so a rerun after a crash only embeds what is still missing
+
+Usage (from repo root):
+  python backend/src/precompute_embeddings.py [--concurrency N] [--batch-size N] [--rate RPS]
+
+Point GEMINI_API_BASE at mock_gemini.py to try it offline.
+"""
+import argparse
+import asyncio
+import hashlib
 import json
 import os
+import random
 import time
 from dotenv import load_dotenv
+from gemini_client import GeminiClient, GeminiError, RETRY_STATUS
+from index_artifact import write_index
+from ann_index import ANN_MIN_DOCS, build_ivf
+from quantized_index import build_quantized
+from vector_store_vercel import BATCH_EMBED_LIMIT
 
 load_dotenv()
 
 # TO RUN THIS: You need GEMINI_API_KEY in .env
 # If user hasn't provided it, this script will fail gracefully.
+EMBED_MODEL = 'models/text-embedding-004'
+RETRY_BASE_DELAY = 0.5 # Seconds; doubles per attempt, with jitter
+
+def document_text(chunk: dict) -> str:
+    """The text that actually gets embedded for a chunk (topic header + article)."""
+    text = chunk['text']
+    # Add context header
+    if "metadata" in chunk and "konu" in chunk["metadata"]:
+         return f"Bağlam: {chunk['metadata']['konu']}\n\n{text}"
+    return text
+
+def content_hash(chunk: dict, model: str = EMBED_MODEL) -> str:
+    """Content address of a chunk's embedding: same model + same input text -> same vector."""
+    return hashlib.sha1(f"{model}\n{document_text(chunk)}".encode("utf-8")).hexdigest()
+
+class AdaptiveRateLimiter:
+    """AIMD request pacing: +`increase` req/s per success, rate x `decrease` per 429."""
+
+    def __init__(self, rate: float = 2.0, min_rate: float = 0.2, max_rate: float = 20.0,
+                 increase: float = 0.2, decrease: float = 0.5):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.throttles = 0
+        self._next_slot = 0.0 # time.monotonic() of the next allowed request
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        start = max(now, self._next_slot, self._paused_until)
+        self._next_slot = start + 1.0 / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def throttled(self, retry_after: float = None):
+        now = time.monotonic()
+        self.throttles += 1
+        # Requests already in flight hit the same quota window: cut once per window, not once per reply
+        if now - self._last_decrease > 1.0 / self.rate:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._last_decrease = now
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
 
-def precompute_embeddings():
+class Checkpoint:
+    """Append-only JSONL of {"hash", "embedding"}; a half-written last line (crash) is ignored."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.vectors = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.vectors[entry["hash"]] = entry["embedding"]
+        self._file = open(path, "a", encoding="utf-8")
+
+    def add(self, hashes: list, vectors: list):
+        for h, vector in zip(hashes, vectors):
+            self._file.write(json.dumps({"hash": h, "embedding": vector}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def checkpoint_path_for(output_path: str) -> str:
+    return os.path.splitext(output_path)[0] + ".checkpoint.jsonl"
+
+async def join_queue(queue: asyncio.Queue, workers: list):
+    """queue.join(), except that it raises instead of hanging once every worker has stopped."""
+    joined = asyncio.create_task(queue.join())
+    alive = set(workers)
+    try:
+        while not joined.done():
+            if not alive:
+                errors = [w.exception() for w in workers if not w.cancelled() and w.exception()]
+                raise RuntimeError(f"All workers stopped with {queue.qsize()} batches left.") from (errors[0] if errors else None)
+            finished, _ = await asyncio.wait(alive | {joined}, return_when=asyncio.FIRST_COMPLETED)
+            alive -= finished
+    finally:
+        joined.cancel()
+
+async def aembed_chunks(chunks: list, model: str = EMBED_MODEL, batch_size: int = BATCH_EMBED_LIMIT,
+                        concurrency: int = 4, rate: float = 2.0, max_attempts: int = 8,
+                        checkpoint_path: str = None) -> list:
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
-        print("ERROR: GEMINI_API_KEY not found in .env")
-        return
-
-    genai.configure(api_key=api_key)
-    model = 'models/text-embedding-004'
+        raise RuntimeError("GEMINI_API_KEY not found in .env")
 
-    chunks_path = "backend/data/chunks.json"
-    output_path = "backend/data/embeddings_gemini.json"
+    hashes = [content_hash(c, model) for c in chunks]
+    checkpoint = Checkpoint(checkpoint_path) if checkpoint_path else None
+    vectors = dict(checkpoint.vectors) if checkpoint else {}
+    pending = {} # hash -> text, identical chunks are embedded once
+    for chunk, h in zip(chunks, hashes):
+        if h not in vectors:
+            pending.setdefault(h, document_text(chunk))
+    print(f"{len(chunks)} chunks: {len(chunks) - len(pending)} already embedded, {len(pending)} to go.")
 
-    with open(chunks_path, 'r') as f:
-        chunks = json.load(f)
+    items = list(pending.items())
+    queue = asyncio.Queue()
+    for i in range(0, len(items), batch_size):
+        queue.put_nowait((items[i:i + batch_size], 0))
 
-    print(f"Loaded {len(chunks)} chunks. Starting embedding...")
+    client = GeminiClient(api_key, max_connections=concurrency, max_retries=0)
+    limiter = AdaptiveRateLimiter(rate=rate)
+    failed = {}
+    done = len(chunks) - len(pending)
+    started = time.time()
 
-    doc_data = []
-    
-    # Batch if necessary, but simple loop is safer for rate limits
-    for i, chunk in enumerate(chunks):
-        text = chunk['text']
-        # Add context header
-        if "metadata" in chunk and "konu" in chunk["metadata"]:
-             full_text = f"Bağlam: {chunk['metadata']['konu']}\n\n{text}"
+    async def retry_or_give_up(batch, attempt, error, backoff=True):
+        if attempt + 1 < max_attempts:
+            if backoff:
+                await asyncio.sleep(RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random()))
+            queue.put_nowait((batch, attempt + 1))
         else:
-             full_text = text
-             
-        try:
-            # Task type retrieval_document is optimized for search
-            embedding = genai.embed_content(
-                model=model,
-                content=full_text,
-                task_type="retrieval_document"
-            )
-            
-            doc_data.append({
-                "id": chunk["id"],
-                "text": text,
-                "metadata": chunk.get("metadata", {}),
-                "embedding": embedding['embedding']
-            })
-            
-            if i % 10 == 0:
-                print(f"Processed {i}/{len(chunks)}")
-            
-            time.sleep(0.1) # Be gentle with free tier rate limits
-
-        except Exception as e:
-            print(f"Error at index {i}: {e}")
+            print(f"Giving up on {len(batch)} chunks: {error}")
+            failed.update(batch)
+
+    async def worker():
+        nonlocal done
+        while True:
+            batch, attempt = await queue.get()
+            try:
+                try:
+                    await limiter.acquire()
+                    result = await client.abatch_embed(model, [text for _, text in batch],
+                                                       task_type="retrieval_document", timeout=60)
+                except GeminiError as e:
+                    if e.status_code == 429:
+                        limiter.throttled(e.retry_after)
+                    retryable = e.status_code is None or e.status_code in RETRY_STATUS
+                    if not retryable and len(batch) > 1:
+                        # Rejected request (e.g. one oversized text): split to find the culprit
+                        half = len(batch) // 2
+                        queue.put_nowait((batch[:half], attempt))
+                        queue.put_nowait((batch[half:], attempt))
+                    elif retryable:
+                        # 429s are paced by the limiter instead
+                        await retry_or_give_up(batch, attempt, e, backoff=e.status_code != 429)
+                    else:
+                        print(f"Giving up on {len(batch)} chunks: {e}")
+                        failed.update(batch)
+                    continue
+                except Exception as e:
+                    # Anything else (malformed reply, network bug, ...) must not take the worker down
+                    # with it: the batch is retried like a transient error, then recorded as failed
+                    await retry_or_give_up(batch, attempt, repr(e))
+                    continue
+
+                limiter.success()
+                batch_hashes = [h for h, _ in batch]
+                vectors.update(zip(batch_hashes, result))
+                if checkpoint:
+                    checkpoint.add(batch_hashes, result)
+                done += len(batch)
+                print(f"Processed {done}/{len(chunks)} ({limiter.rate:.1f} req/s, {limiter.throttles} throttled)")
+            finally:
+                queue.task_done()
 
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        await join_queue(queue, workers)
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await client.aclose()
+        if checkpoint:
+            checkpoint.close()
+
+    if items:
+        print(f"Embedded {len(items) - len(failed)} chunks in {time.time() - started:.1f}s")
+    if failed:
+        raise RuntimeError(f"{len(failed)} chunks could not be embedded; progress is saved, rerun to resume.")
+
+    return [{
+        "id": chunk["id"],
+        "text": chunk["text"],
+        "metadata": chunk.get("metadata", {}),
+        "embedding": vectors[h],
+    } for chunk, h in zip(chunks, hashes)]
+
+def embed_chunks(chunks: list, model: str = EMBED_MODEL, **kwargs) -> list:
+    """Embeds chunks, returning embeddings_gemini.json records (in chunk order). Raises if any chunk failed."""
+    return asyncio.run(aembed_chunks(chunks, model, **kwargs))
+
+def save_embeddings(doc_data: list, output_path: str, model: str = EMBED_MODEL):
     with open(output_path, 'w') as f:
         json.dump(doc_data, f)
         
     print(f"Successfully saved {len(doc_data)} embeddings to {output_path}")
 
+    # Compiled, memory-mappable copy used by VectorStoreVercel at runtime
+    meta = write_index(doc_data, os.path.splitext(output_path)[0], model=model, source_path=output_path)
+    print(f"Compiled index written (version {meta['version']}).")
+    build_quantized(os.path.splitext(output_path)[0]) # int8 + binary first-pass codes
+    if meta["count"] >= ANN_MIN_DOCS:
+        build_ivf(os.path.splitext(output_path)[0])
+
+def precompute_embeddings(chunks_path: str = "backend/data/chunks.json",
+                          output_path: str = "backend/data/embeddings_gemini.json", resume: bool = True, **kwargs):
+    if not os.getenv("GEMINI_API_KEY"):
+        print("ERROR: GEMINI_API_KEY not found in .env")
+        return
+
+    with open(chunks_path, 'r') as f:
+        chunks = json.load(f)
+
+    print(f"Loaded {len(chunks)} chunks. Starting embedding...")
+    checkpoint_path = checkpoint_path_for(output_path)
+    if not resume and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    save_embeddings(embed_chunks(chunks, checkpoint_path=checkpoint_path, **kwargs), output_path)
+    os.remove(checkpoint_path) # Everything is in the output now
+
 if __name__ == "__main__":
-    precompute_embeddings()
+    parser = argparse.ArgumentParser(description="Embed chunks.json with Gemini")
+    parser.add_argument("--chunks", default="backend/data/chunks.json")
+    parser.add_argument("--output", default="backend/data/embeddings_gemini.json")
+    parser.add_argument("--batch-size", type=int, default=BATCH_EMBED_LIMIT)
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--rate", type=float, default=2.0, help="Initial requests/second (adapts)")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    precompute_embeddings(args.chunks, args.output, resume=not args.no_resume,
+                          batch_size=args.batch_size, concurrency=args.concurrency, rate=args.rate)
@@ -0,0 +1,220 @@
+"""
+Quantized copies of the compiled embedding matrix, for a cheap first pass.
+
+  <prefix>.int8.npz    int8 codes (N, D) + one float32 scale per row     ~4x smaller
+  <prefix>.binary.npz  sign bits packed to (N, D / 8) uint8              ~32x smaller
+
+A query scores the codes, keeps a shortlist (k x RESCORE_FACTOR rows) and rescores
+only those rows against the float32 matrix, which stays memory-mapped on disk: the
+resident set is the codes plus the few float rows that get touched.
+
+Enable with VECTOR_QUANTIZATION=int8|binary (default off = exact float32 scan).
+
+Usage (from repo root):
+  python backend/src/quantized_index.py build [prefix]
+  python backend/src/quantized_index.py report [prefix] [--k 5]
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from index_artifact import load_index
+
+QUANT_MODES = ("int8", "binary")
+# Shortlist size = max(k * factor, MIN_SHORTLIST): coarser codes need a longer shortlist
+RESCORE_FACTOR = {"int8": 4, "binary": 20}
+MIN_SHORTLIST = 50
+SCORE_BLOCK = 8192 # Rows decoded per step, bounds the temporary float32 block
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else: # numpy < 2.0
+    _POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    def _popcount(a):
+        return _POPCOUNT[a]
+
+def quantized_path(prefix: str, mode: str) -> str:
+    return f"{prefix}.{mode}.npz"
+
+class QuantizedMatrix:
+    def __init__(self, mode: str, codes: np.ndarray, scales: np.ndarray = None, dim: int = None, version: str = None):
+        if mode not in QUANT_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        self.mode = mode
+        self.codes = codes
+        self.scales = scales # int8 only
+        self.dim = dim or codes.shape[1]
+        self.version = version
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray, mode: str, version: str = None) -> "QuantizedMatrix":
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if mode == "binary":
+            return cls(mode, np.packbits(matrix > 0, axis=1), dim=matrix.shape[1], version=version)
+        # Symmetric per-row scale: each row's largest component maps to +-127
+        peak = np.abs(matrix).max(axis=1)
+        scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        codes = np.round(matrix / scales[:, None]).astype(np.int8)
+        return cls(mode, codes, scales, version=version)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def save(self, path: str):
+        arrays = {"codes": self.codes, "dim": np.array(self.dim), "version": np.array(self.version or "")}
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str, mode: str) -> "QuantizedMatrix":
+        with np.load(path, allow_pickle=False) as data:
+            scales = data["scales"] if "scales" in data else None
+            return cls(mode, data["codes"], scales, int(data["dim"]), str(data["version"]) or None)
+
+    def approx_scores(self, query: np.ndarray, rows=slice(None)) -> np.ndarray:
+        """First-pass similarity of a unit query to the selected rows (slice or id array). Order-preserving, not exact."""
+        codes = self.codes[rows]
+        if self.mode == "binary":
+            query_bits = np.packbits(query > 0)
+            # Fewer differing signs = closer; dim - 2 * hamming is the +-1 dot product
+            return self.dim - 2.0 * _popcount(codes ^ query_bits).sum(axis=1, dtype=np.int32)
+        scales = self.scales[rows]
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK):
+            block = codes[start:start + SCORE_BLOCK].astype(np.float32)
+            out[start:start + SCORE_BLOCK] = (block @ query) * scales[start:start + SCORE_BLOCK]
+        return out
+
+    def shortlist_size(self, k: int) -> int:
+        return max(k * RESCORE_FACTOR[self.mode], MIN_SHORTLIST)
+
+    def search(self, matrix: np.ndarray, query: np.ndarray, k: int, rows=slice(None), row_ids: np.ndarray = None):
+        """
+        (row ids, exact similarities) of the top k: codes first pass, float32 rescoring of the shortlist.
+        rows selects a part of the matrix (a shard); row_ids maps its positions back to matrix rows.
+        """
+        approx = self.approx_scores(query, rows)
+        if approx.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        m = min(self.shortlist_size(k), approx.size)
+        short = np.argpartition(-approx, m - 1)[:m] if m < approx.size else np.arange(approx.size)
+        ids = np.sort(row_ids[short] if row_ids is not None else short).astype(np.int64) # Sorted = sequential reads
+        exact = matrix[ids] @ query
+        k = min(k, ids.size)
+        top = np.argpartition(-exact, k - 1)[:k] if k < ids.size else np.arange(ids.size)
+        top = top[np.argsort(-exact[top], kind="stable")]
+        return ids[top], exact[top]
+
+def load_quantized(prefix: str, mode: str, version: str = None):
+    """Quantized matrix for a compiled index, or None if missing or built for another version."""
+    path = quantized_path(prefix, mode)
+    if not os.path.exists(path):
+        return None
+    quantized = QuantizedMatrix.load(path, mode)
+    if version is not None and quantized.version != version:
+        print(f"Ignoring stale quantized index {path} (built for {quantized.version}, matrix is {version})")
+        return None
+    return quantized
+
+def build_quantized(prefix: str, modes=QUANT_MODES) -> dict:
+    matrix, sidecar = load_index(prefix)
+    built = {}
+    for mode in modes:
+        built[mode] = QuantizedMatrix.from_matrix(matrix, mode, sidecar.get("version"))
+        built[mode].save(quantized_path(prefix, mode))
+    return built
+
+# --- report --------------------------------------------------------------------
+
+def load_question_vectors(questions_path: str, replay_path: str):
+    """
+    Query embeddings of the test questions from the replay cache (see run_eval.py),
+    embedding and caching the missing ones when GEMINI_API_KEY is set. None if unavailable.
+    """
+    from ttl_cache import EmbeddingCache
+    if not os.path.exists(replay_path) and not os.getenv("GEMINI_API_KEY"):
+        return None
+    with open(questions_path, "r", encoding="utf-8") as f:
+        questions = [q["question"] for q in json.load(f)]
+    cache = EmbeddingCache("models/text-embedding-004", max_size=100000, persist_path=replay_path)
+    missing = [q for q in questions if cache.peek_vector(q) is None]
+    if missing and os.getenv("GEMINI_API_KEY"):
+        from gemini_client import get_client
+        from vector_store_vercel import BATCH_EMBED_LIMIT
+        client = get_client()
+        for i in range(0, len(missing), BATCH_EMBED_LIMIT):
+            chunk = missing[i:i + BATCH_EMBED_LIMIT]
+            for q, v in zip(chunk, client.batch_embed(cache.model_name, chunk, task_type="retrieval_query")):
+                cache.put_vector(q, v)
+        cache.save()
+    vectors = [cache.peek_vector(q) for q in questions]
+    if any(v is None for v in vectors):
+        return None
+    return np.asarray(vectors, dtype=np.float32)
+
+def report(prefix: str, k: int = 5, questions_path: str = "backend/data/test_questions_100.json",
+           replay_path: str = "backend/data/query_embeddings.json") -> dict:
+    from ann_index import exact_top_k, sample_queries
+    from index_artifact import normalize_rows
+    matrix, sidecar = load_index(prefix, mmap=False)
+    queries = load_question_vectors(questions_path, replay_path)
+    query_source = f"{questions_path} ({replay_path})"
+    if queries is None:
+        queries = sample_queries(matrix, 100)
+        query_source = "perturbed corpus rows (no cached question embeddings and no GEMINI_API_KEY)"
+    queries = normalize_rows(queries)
+    truth = exact_top_k(matrix, queries, k)
+
+    started = time.perf_counter()
+    for q in queries:
+        exact_top_k(matrix, q[None, :], k)
+    float_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    json_path = prefix + ".json"
+    result = {
+        "docs": matrix.shape[0], "dim": matrix.shape[1], "k": k, "queries": query_source,
+        "float32": {"bytes": matrix.nbytes, "ms_per_query": round(float_ms, 3)},
+    }
+    if os.path.exists(json_path):
+        # What the pre-compiled store held: per row a list of Python floats (8 B pointer + 24 B object each)
+        result["json_float_lists"] = {"file_bytes": os.path.getsize(json_path),
+                                      "approx_python_bytes": matrix.shape[0] * (56 + 32 * matrix.shape[1])}
+
+    for mode in QUANT_MODES:
+        quantized = QuantizedMatrix.from_matrix(matrix, mode)
+        hits_codes = hits = 0
+        started = time.perf_counter()
+        for q, expected in zip(queries, truth):
+            ids, _ = quantized.search(matrix, q, k)
+            hits += len(set(ids.tolist()) & set(expected.tolist()))
+        ms = (time.perf_counter() - started) * 1000 / len(queries)
+        for q, expected in zip(queries, truth):
+            codes_top = np.argsort(-quantized.approx_scores(q), kind="stable")[:k]
+            hits_codes += len(set(codes_top.tolist()) & set(expected.tolist()))
+        result[mode] = {
+            "bytes": quantized.nbytes,
+            "reduction": round(matrix.nbytes / quantized.nbytes, 1),
+            "shortlist": min(quantized.shortlist_size(k), matrix.shape[0]),
+            f"recall@{k}_codes_only": round(hits_codes / truth.size, 4),
+            f"recall@{k}_rescored": round(hits / truth.size, 4),
+            "ms_per_query": round(ms, 3),
+        }
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build quantized matrices or report their memory / recall")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("prefix", nargs="?", default="backend/data/embeddings_gemini")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for mode, quantized in build_quantized(args.prefix).items():
+            print(f"{mode}: {quantized.nbytes} bytes -> {quantized_path(args.prefix, mode)}")
+    else:
+        print(json.dumps(report(args.prefix, k=args.k), indent=2))
@@ -1,73 +1,199 @@
-from vector_store_vercel import VectorStoreVercel
+from vector_store_vercel import VectorStoreVercel, empty_result, SHARD_KEY, DEFAULT_SOURCE
+from bm25_index import BM25Index, tokenize
+from gemini_client import get_client
+from metrics import observe_stage
+from model_router import ModelRouter
+import asyncio
 import os
+import re
+import threading
+import time
+
+MADDE_PATTERN = re.compile(r"madde\s*(\d+)")
+
+def source_stems(text: str) -> list:
+    """tokenize() with dotless ı folded to i: source names are often ASCII ("TIHEK"), users type "TİHEK"."""
+    return [t.replace("ı", "i") for t in tokenize(text)]
+
+# Hybrid search: candidates = vector top-N  U  BM25 top-N  U  explicitly asked "Madde X"
+VECTOR_CANDIDATES = 20
+LEXICAL_CANDIDATES = 20
+# BM25 field scores are normalized to [0, 1]; these cap the keyword boost per field.
+# Matching most of the query in the topic (konu) is enough to count as "boosted" (> +0.1).
+LEXICAL_WEIGHTS = {"konu": 0.2, "text": 0.05}
+
+# Models to try in order (Based on available models for this Key)
+GENERATION_MODELS = ["gemini-2.0-flash", "gemini-2.0-flash-lite", "gemini-flash-latest"]
 
 class RAGEngine:
-    def __init__(self, device: str = None):
+    def __init__(self, device: str = None, embeddings_path: str = None):
         print("Initializing RAG Engine (Lazy Mode)...")
+        self.embeddings_path = embeddings_path # None = the bundled corpus (benchmarks point this elsewhere)
         self.vector_store = None
+        self.bm25 = None
+        self.madde_rows = {}
+        self.source_names = {} # First stem of each source name ("tihek") -> source
         self.model = None
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found")
+        self.client = get_client()
+        # Picks the model per request: circuit breakers, optional hedging, deadline
+        self.router = ModelRouter(self.client, GENERATION_MODELS)
+        self._init_lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.vector_store is not None
             
     def _initialize_lazy(self):
-        if self.vector_store is None:
+        if self.vector_store is not None:
+            return
+        # Single-flight: concurrent first requests wait for one load instead of each building a store
+        with self._init_lock:
+            if self.vector_store is not None:
+                return
             print("Lazy Loading: Vector Store...")
             # genai import REMOVED
-            self.vector_store = VectorStoreVercel()
+            vector_store = VectorStoreVercel(self.embeddings_path) if self.embeddings_path else VectorStoreVercel()
+            # Keyword side of the hybrid search, built once over the whole corpus
+            self.bm25 = BM25Index.from_store(vector_store)
+            self.madde_rows = {}
+            for i, meta in enumerate(vector_store.metadatas):
+                self.madde_rows.setdefault(meta.get("madde"), []).append(i)
+            by_stem = {}
+            for name in vector_store.sources():
+                stems = source_stems(name)
+                if stems:
+                    by_stem.setdefault(stems[0], []).append(name)
+            # A stem shared by several sources ("Kanun 1", "Kanun 2") names none of them
+            self.source_names = {stem: names[0] for stem, names in by_stem.items() if len(names) == 1}
+            self.vector_store = vector_store
             # No need to configure genai or init model object
             print("Lazy Loading Complete.")
 
-    def retrieve(self, question: str, k: int = 5):
+    async def ainitialize(self):
+        """_initialize_lazy() for async callers: loads in a worker thread so the event loop keeps serving."""
+        if self.vector_store is None:
+            await asyncio.to_thread(self._initialize_lazy)
+
+    async def awarm_up(self, connections: int = 2):
+        """Loads the store and opens pooled connections, so the first real request pays for neither."""
+        await self.ainitialize()
+        await self.client.awarm_up(connections)
+
+    def madde_source(self, question: str, source: str = None) -> str:
+        """
+        Whose "Madde X" a question means: the source filter if set, else a source the
+        question names ("TİHEK madde 3"), else DEFAULT_SOURCE. Every law has a Madde 1.
+        """
+        if source is not None:
+            return source
+        for stem in source_stems(question):
+            if stem in self.source_names:
+                return self.source_names[stem]
+        return DEFAULT_SOURCE
+
+    def retrieve(self, question: str, k: int = 5, nprobe: int = None, source: str = None):
+        """
+        nprobe: ANN recall/latency knob (only used when the store has an ANN index).
+        source: restrict to one metadata.source (e.g. "TIHEK Kanunu"); only its shard is scanned.
+        """
         self._initialize_lazy()
-        # Fetch more candidates for re-ranking (Hybrid Search)
-        results = self.vector_store.query(question, n_results=20)
-        
-        documents = results['documents'][0]
-        metadatas = results['metadatas'][0]
-        distances = results['distances'][0]
-        
+        query_vector = self.vector_store.embed_query(question)
+        if query_vector is None:
+            return empty_result()
+        return self._rerank(question, query_vector, k, nprobe=nprobe, source=source)
+
+    async def aretrieve(self, question: str, k: int = 5, nprobe: int = None, source: str = None):
+        """Async retrieve(): only the embedding call awaits, scoring is in-process."""
+        await self.ainitialize()
+        query_vector = await self.vector_store.aembed_query(question)
+        if query_vector is None:
+            return empty_result()
+        return self._rerank(question, query_vector, k, nprobe=nprobe, source=source)
+
+    def retrieve_many(self, questions: list, k: int = 5) -> list:
+        """Batch retrieve: one embedding call + one matrix product, re-ranked per question, input order kept."""
+        self._initialize_lazy()
+        return self._rerank_many(questions, self.vector_store.embed_queries(questions), k)
+
+    async def aretrieve_many(self, questions: list, k: int = 5) -> list:
+        await self.ainitialize()
+        return self._rerank_many(questions, await self.vector_store.aembed_queries(questions), k)
+
+    def _rerank_many(self, questions: list, vectors: list, k: int) -> list:
+        ok = [i for i, v in enumerate(vectors) if v is not None]
+
+        results = [empty_result() for _ in questions]
+        if ok and not self.vector_store.exact_scan:
+            for i in ok:
+                results[i] = self._rerank(questions[i], vectors[i], k)
+        elif ok:
+            sims = self.vector_store.scores_many([vectors[i] for i in ok])
+            for row, i in enumerate(ok):
+                results[i] = self._rerank(questions[i], vectors[i], k, sims=sims[row])
+        return results
+
+    def _rerank(self, question: str, query_vector, k: int, sims=None, nprobe: int = None, source: str = None):
+        """
+        Fuses vector similarity with BM25 keyword scores, then applies strict filtering.
+        sims: precomputed similarities to every document (batch path); otherwise the store's
+        nearest() picks the vector candidates and only the candidates get scored.
+        """
+        store = self.vector_store
+        question_lower = question.lower()
+        madde_pattern = MADDE_PATTERN.search(question_lower)
+        target_num = int(madde_pattern.group(1)) if madde_pattern else None
+        target_source = self.madde_source(question, source) if target_num is not None else None
+
+        # Keyword Boosting (BM25 over the whole corpus, not just the vector candidates)
+        started = time.perf_counter()
+        lexical = self.bm25.score(question, LEXICAL_WEIGHTS)
+        if source is not None:
+            lexical = {i: s for i, s in lexical.items() if store.in_source(i, source)}
+        lexical_done = time.perf_counter()
+        observe_stage("lexical", lexical_done - started)
+
+        if sims is not None:
+            candidate_ids = [int(i) for i in store.top_k(sims, VECTOR_CANDIDATES)]
+        else:
+            candidate_ids = [int(i) for i in store.nearest(query_vector, VECTOR_CANDIDATES, nprobe, source)[0]]
+        vector_done = time.perf_counter()
+        observe_stage("vector_search", vector_done - lexical_done)
+        candidate_ids += sorted(lexical, key=lexical.get, reverse=True)[:LEXICAL_CANDIDATES]
+        if target_num is not None:
+            candidate_ids += [i for i in self.madde_rows.get(target_num, []) if store.in_source(i, target_source)]
+        candidate_ids = list(dict.fromkeys(candidate_ids))
+        vector_scores = sims[candidate_ids] if sims is not None else store.score_rows(query_vector, candidate_ids)
+
         # Combine into objects for sorting
         candidates = []
-        for doc, meta, dist in zip(documents, metadatas, distances):
+        for idx, vector_score in zip(candidate_ids, vector_scores):
+            vector_score = float(vector_score)
             candidates.append({
-                "text": doc,
-                "metadata": meta,
-                "vector_score": 1 - dist, # Similarity
-                "final_score": 1 - dist
+                "text": store.texts[idx],
+                "metadata": store.metadatas[idx],
+                "vector_score": vector_score, # Similarity
+                "final_score": vector_score + lexical.get(idx, 0.0)
             })
-            
-        # Keyword Boosting (Simple BM25-ish luck)
-        # Normalize keys
-        q_tokens = set(question.lower().split())
-        
+
+        is_yonetim_sekli = "yönetim" in question_lower and "şekli" in question_lower
+
         for cand in candidates:
-            # Boost if Topic matches
-            topic = cand["metadata"].get("konu", "").lower()
-            topic_score = sum(1 for t in q_tokens if t in topic) * 0.05
-            
-            # Boost if Text matches (less weight)
-            text_lower = cand["text"].lower()
-            text_score = sum(1 for t in q_tokens if t in text_lower) * 0.01
-            
             # Specific Hardcoded Boosts for Common Failures
             # "Yönetim şekli" -> Madde 1 (Devletin Şekli)
-            if "yönetim" in question.lower() and "şekli" in question.lower() and cand["metadata"].get("madde") == 1:
+            if is_yonetim_sekli and cand["metadata"].get("madde") == 1:
                 cand["final_score"] += 0.3
-                
-            cand["final_score"] += topic_score + text_score
             
             # --- NEW: Generic "Madde X" Booster ---
-            # If user asks "Madde 3 nedir?", we must boost actual Madde 3
-            import re
-            madde_pattern = re.search(r"madde\s*(\d+)", question.lower())
-            if madde_pattern:
-                target_num = int(madde_pattern.group(1))
+            # If user asks "Madde 3 nedir?", we must boost actual Madde 3 (of the law the question means)
+            if target_num is not None:
                 # Check if this candidate is that madde
                 # cand["metadata"] has 'madde' (int)
-                if cand["metadata"].get("madde") == target_num:
+                meta = cand["metadata"]
+                if meta.get("madde") == target_num and meta.get(SHARD_KEY, DEFAULT_SOURCE) == target_source:
                     cand["final_score"] += 0.5  # Huge boost -> Guarantees "Winner Takes All" logic
-                    print(f"DEBUG: Boosted Madde {target_num} by +0.5")
 
         # Sort by Final Score
         candidates.sort(key=lambda x: x["final_score"], reverse=True)
@@ -109,6 +235,7 @@ class RAGEngine:
                     if other["final_score"] > best["final_score"] - 0.15:
                         final_top_k.append(other)
         
+        observe_stage("rerank", time.perf_counter() - vector_done)
         # Re-construct return format
         return {
             "documents": [[c["text"] for c in final_top_k]],
@@ -120,6 +247,7 @@ class RAGEngine:
         """Constructs the prompt string for Gemini."""
         if not context_docs:
             return ""
+        started = time.perf_counter()
             
         context_str = "\n\n".join([f"Madde {d['madde_no']} ({d['metadata'].get('konu', '')}):\n{d.get('text', '')}" for d in context_docs])
         
@@ -136,8 +264,25 @@ Bağlam:
 
 Soru: {question}""")
         
+        observe_stage("prompt", time.perf_counter() - started)
         return prompt
         
+    async def agenerate_answer(self, prompt_text: str, deadline: float = None):
+        """
+        Generates with the first model that answers (see model_router.py for the order).
+        deadline: time.monotonic() by which the answer must be done (router.deadline() if None).
+        Returns (answer, model_name). Raises GeminiError if all fail or time runs out.
+        """
+        return await self.router.generate(prompt_text, deadline)
+
+    async def astream_answer(self, prompt_text: str, deadline: float = None):
+        """
+        Streaming agenerate_answer(): yields (model_name, text_piece).
+        Falls back to the next model only while nothing has been sent yet.
+        """
+        async for model_name, piece in self.router.stream(prompt_text, deadline):
+            yield model_name, piece
+
     def answer_question(self, question: str):
         # 0. Check for greetings (No need to load engine for this!)
         greetings = ["merhaba", "selam", "günaydın", "iyi günler", "nasılsın", "hi", "hello"]
@@ -191,22 +336,8 @@ Soru: {question}""")
         
         # 3. Call LLM (REST API)
         print("Generating answer with Gemini (REST)...")
-        import requests
-        
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={self.api_key}"
-        
-        payload = {
-            "contents": [{
-                "parts": [{"text": prompt_text}]
-            }]
-        }
-        
         try:
-            resp = requests.post(url, json=payload, timeout=30)
-            resp.raise_for_status()
-            data = resp.json()
-            # Extract text: candidates[0].content.parts[0].text
-            answer = data['candidates'][0]['content']['parts'][0]['text']
+            answer = self.client.generate(GENERATION_MODELS[0], prompt_text, timeout=30)
         except Exception as e:
             return {
                 "answer": f"API Hatası: {str(e)}",
@@ -4,19 +4,29 @@ import os
 import sys
 from vector_store import VectorStore
 
-# Clean existing DB to prevent duplicates/ghosts
+# Incremental by default: only new/changed chunks are (re-)embedded and chunks that
+# disappeared from chunks.json are deleted. --full wipes the DB and re-upserts everything.
 db_path = "backend/chroma_db"
-if os.path.exists(db_path):
+if "--full" in sys.argv and os.path.exists(db_path):
     print(f"Removing existing DB at {db_path}...")
     shutil.rmtree(db_path)
 
-print("Initializing Vector Store (New DB)...")
+print("Initializing Vector Store...")
 vs = VectorStore(persist_directory=db_path)
 
 print("Loading chunks...")
 with open("backend/data/chunks.json", 'r') as f:
     chunks = json.load(f)
 
-print(f"Upserting {len(chunks)} documents...")
-vs.add_documents(chunks)
+existing = vs.collection.get(include=["documents", "metadatas"])
+indexed = {i: (doc, meta) for i, doc, meta in zip(existing["ids"], existing["documents"], existing["metadatas"])}
+
+changed = [c for c in chunks if indexed.get(c["id"]) != (c["text"], c["metadata"])]
+removed = sorted(set(indexed) - {c["id"] for c in chunks}) # Ghosts of deleted/renumbered articles
+
+print(f"{len(changed)} new/changed, {len(removed)} removed, {len(chunks) - len(changed)} unchanged.")
+if removed:
+    vs.collection.delete(ids=removed)
+if changed:
+    vs.add_documents(changed)
 print("Re-indexing Complete.")
@@ -1,13 +1,37 @@
+"""
+Evaluation over test_questions_100.json.
+
+  python backend/src/run_eval.py                      # full answers (LLM) on a 10 question sample
+  python backend/src/run_eval.py --retrieval          # retrieval only, all questions, no generation
+  python backend/src/run_eval.py --retrieval --offline --k 1,3,5 --workers 8
+
+Retrieval mode keeps the query embeddings in a replay file (REPLAY_PATH, the same
+EmbeddingCache format the server persists): the first run embeds the questions in
+batches, later runs re-use them, so with --offline no network call is made at all.
+Questions are then re-ranked in parallel and scored with recall@k and MRR against
+target_madde, plus p50/p95 timings per retrieval stage (lexical, vector_search,
+rerank, ...), collected from the same record_timing() entries as Server-Timing.
+"""
+import argparse
+import contextlib
 import json
 import sys
 import os
-import torch
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 # Ensure backend directory is in path
 sys.path.append(os.path.join(os.getcwd(), 'backend/src'))
 
+from metrics import collect_timings
 from rag_engine import RAGEngine
+from vector_store_vercel import DEFAULT_SOURCE
+
+QUESTIONS_PATH = 'backend/data/test_questions_100.json'
+REPLAY_PATH = 'backend/data/query_embeddings.json'
+RETRIEVAL_RESULTS_PATH = 'backend/data/eval_retrieval.json'
 
 def run_evaluation():
     print("Initializing RAG Engine...")
@@ -75,5 +99,120 @@ def run_evaluation():
             
     print(f"Evaluation Complete. Results saved to {output_path}")
 
+def is_target(meta: dict, question: dict) -> bool:
+    # TIHEK Kanunu has its own Madde 1..30, so the source has to match too
+    return (meta.get("madde") == question["target_madde"]
+            and meta.get("source", DEFAULT_SOURCE) == question.get("source", DEFAULT_SOURCE))
+
+def load_replay(engine, questions: list, replay_path: str, offline: bool) -> dict:
+    """Puts the replay file behind the store's embedding cache and embeds what is missing (unless offline)."""
+    from ttl_cache import EmbeddingCache
+    store = engine.vector_store
+    store.embedding_cache = EmbeddingCache(store.model_name, max_size=100000, persist_path=replay_path)
+    texts = [q["question"] for q in questions]
+    missing = [t for t in dict.fromkeys(texts) if store.embedding_cache.peek_vector(t) is None]
+    stage = {"replayed": len(set(texts)) - len(missing), "embedded": 0, "seconds": 0.0}
+    if missing and offline:
+        raise SystemExit(f"{len(missing)} questions have no replayed embedding in {replay_path}; run once without --offline.")
+    if missing:
+        started = time.perf_counter()
+        vectors = store.embed_queries(missing) # batchEmbedContents, BATCH_EMBED_LIMIT per call
+        stage["embedded"] = sum(v is not None for v in vectors)
+        stage["seconds"] = round(time.perf_counter() - started, 3)
+        store.embedding_cache.save()
+    return stage
+
+def run_retrieval_evaluation(ks=(1, 3, 5), workers: int = None, replay_path: str = REPLAY_PATH,
+                             offline: bool = False, output_path: str = RETRIEVAL_RESULTS_PATH) -> dict:
+    if offline:
+        os.environ.setdefault("GEMINI_API_KEY", "offline") # Never used: every embedding comes from the replay file
+    from main import build_context_docs
+
+    with open(QUESTIONS_PATH, 'r') as f:
+        questions = json.load(f)
+    k = max(ks)
+
+    started = time.perf_counter()
+    engine = RAGEngine()
+    engine._initialize_lazy()
+    load_seconds = time.perf_counter() - started
+    embed_stage = load_replay(engine, questions, replay_path, offline)
+
+    def evaluate(question):
+        # Embedding is a replay cache hit, so this is lookup + vector search + BM25 + re-ranking
+        started = time.perf_counter()
+        with collect_timings() as timings:
+            results = engine.retrieve(question["question"], k=k)
+        latency_ms = (time.perf_counter() - started) * 1000
+        stages_ms = {}
+        for name, ms, _ in timings:
+            stages_ms[name] = stages_ms.get(name, 0.0) + ms
+        metadatas = results['metadatas'][0]
+        rank = next((i + 1 for i, meta in enumerate(metadatas) if is_target(meta, question)), None)
+        context_hit = any(is_target(d["metadata"], question) for d in build_context_docs(results))
+        return {
+            "id": question["id"],
+            "question": question["question"],
+            "target_madde": question["target_madde"],
+            "retrieved_maddes": [meta.get("madde") for meta in metadatas],
+            "rank": rank,
+            "context_hit": context_hit, # Survives the distance cutoff, i.e. reaches the prompt
+            "latency_ms": round(latency_ms, 3),
+            "stages_ms": {name: round(ms, 3) for name, ms in stages_ms.items()},
+        }
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        results = list(pool.map(evaluate, questions))
+    scoring_seconds = time.perf_counter() - started
+
+    ranks = [r["rank"] for r in results]
+    latencies = np.array([r["latency_ms"] for r in results])
+    # A stage a question skipped (e.g. embed on a replay hit) is left out of that stage's percentiles
+    stage_names = sorted({name for r in results for name in r["stages_ms"]})
+    stages = {}
+    for name in stage_names:
+        values = np.array([r["stages_ms"][name] for r in results if name in r["stages_ms"]])
+        stages[name] = {"p50": round(float(np.percentile(values, 50)), 3),
+                        "p95": round(float(np.percentile(values, 95)), 3), "count": len(values)}
+    report = {
+        "questions": len(results),
+        **{f"recall@{n}": round(sum(1 for r in ranks if r is not None and r <= n) / len(results), 4) for n in ks},
+        f"mrr@{k}": round(sum(1 / r for r in ranks if r is not None) / len(results), 4),
+        "context_hit_rate": round(sum(r["context_hit"] for r in results) / len(results), 4),
+        "timings": {
+            "load_s": round(load_seconds, 3),
+            "embed": embed_stage,
+            "retrieve_ms": {"p50": round(float(np.percentile(latencies, 50)), 3),
+                            "p95": round(float(np.percentile(latencies, 95)), 3),
+                            "mean": round(float(latencies.mean()), 3)},
+            "stages_ms": stages,
+            "scoring_wall_s": round(scoring_seconds, 3),
+        },
+        "misses": [{"id": r["id"], "question": r["question"], "target_madde": r["target_madde"],
+                    "retrieved_maddes": r["retrieved_maddes"]} for r in results if r["rank"] is None],
+    }
+
+    if output_path:
+        with open(output_path, 'w') as f:
+            json.dump({"summary": report, "results": results}, f, ensure_ascii=False, indent=2)
+    return report
+
 if __name__ == "__main__":
-    run_evaluation()
+    parser = argparse.ArgumentParser(description="Evaluate the RAG pipeline on test_questions_100.json")
+    parser.add_argument("--retrieval", action="store_true", help="Retrieval only (no answer generation), all questions")
+    parser.add_argument("--k", default="1,3,5", help="Comma separated cutoffs for recall@k")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel scoring threads (default: CPU count)")
+    parser.add_argument("--replay", default=REPLAY_PATH, help="Query embedding replay file")
+    parser.add_argument("--offline", action="store_true", help="Only use replayed embeddings, never call the API")
+    parser.add_argument("--output", default=RETRIEVAL_RESULTS_PATH, help="Per-question results ('' = don't write)")
+    args = parser.parse_args()
+
+    if args.retrieval:
+        with contextlib.redirect_stdout(sys.stderr): # Engine logs, stdout stays the JSON summary
+            summary = run_retrieval_evaluation(ks=[int(n) for n in args.k.split(",")], workers=args.workers,
+                                               replay_path=args.replay, offline=args.offline,
+                                               output_path=args.output)
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        run_evaluation()
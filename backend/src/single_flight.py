@@ -0,0 +1,45 @@
+"""
+Single-flight coalescing of identical in-flight work.
+
+When a question goes viral, many users send it at the same moment. The first
+request for a key starts the work; identical requests arriving while it runs
+await the same result (or exception) instead of repeating the embedding, the
+scan and the LLM call. Nothing is kept after the flight lands, so unlike a cache
+there is no staleness: a request arriving afterwards starts a new flight.
+
+The work runs in its own task, so the request that started it disconnecting does
+not cancel it for the others.
+"""
+import asyncio
+
+class SingleFlight:
+    def __init__(self):
+        self.flights = {} # key -> asyncio.Task
+        self.started = 0
+        self.joined = 0
+
+    async def do(self, key, fn):
+        """Result of fn() (a coroutine function) for key, shared with concurrent callers of the same key."""
+        task = self.flights.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.joined += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self.flights[key] = task
+            task.add_done_callback(lambda t: self._land(key, t))
+            self.started += 1
+        return await asyncio.shield(task)
+
+    def _land(self, key, task):
+        if self.flights.get(key) is task:
+            del self.flights[key]
+        if not task.cancelled():
+            task.exception() # Retrieved here, so nobody-left-waiting doesn't log "never retrieved"
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.flights),
+            "started": self.started,
+            "joined": self.joined,
+            "join_rate": round(self.joined / (self.started + self.joined), 3) if self.started + self.joined else 0.0,
+        }
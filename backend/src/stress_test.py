@@ -1,5 +1,33 @@
-import requests
+"""
+Load generator for the backend API.
+
+Drives /api/retrieve, /api/answer, /api/legislation (and optionally /api/chat) with a
+weighted request mix, either closed-loop (--concurrency workers back to back) or
+open-loop (--rate requests/second, Poisson arrivals, capped at --concurrency in flight).
+Reports per endpoint: requests, errors by status, p50/p95/p99/max latency and
+throughput, as JSON.
+
+--offline starts mock_gemini.py and a backend pointed at it (GEMINI_API_BASE), so the
+whole run needs no network and no API quota; --mock-latency / --mock-429 / --mock-5xx /
+--mock-down-models shape the simulated Gemini and --workers sizes the backend.
+
+Usage (from repo root):
+  python backend/src/stress_test.py --offline --duration 30 --concurrency 50 --workers 2
+  python backend/src/stress_test.py --url http://localhost:8000 --rate 20 --mix retrieve=6,answer=2,legislation=2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
 import time
+import httpx
+import numpy as np
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
 
 questions = [
     "Türkiye Devletinin yönetim şekli nedir?",
@@ -24,42 +52,267 @@ questions = [
     "Düşünce ve kanaat hürriyeti nedir?"
 ]
 
-def run_test():
-    print(f"Starting stress test with {len(questions)} questions on Qwen 7B...")
-    print("-" * 50)
-    
-    total_start = time.time()
-    successful = 0
-    
-    for i, q in enumerate(questions):
-        print(f"\nQuestion {i+1}/{len(questions)}: {q}")
-        start_time = time.time()
+LEGISLATION_PATHS = [
+    "/api/legislation?mode=toc",
+    "/api/legislation?source=Anayasa&offset=0&limit=20",
+    "/api/legislation?source=TIHEK%20Kanunu",
+    "/api/legislation/Anayasa/10",
+    "/api/legislation/Anayasa/90",
+]
+
+class Stats:
+    def __init__(self):
+        self.latencies = {} # endpoint -> [seconds] of successful requests
+        self.statuses = {} # endpoint -> {status: count}
+
+    def record(self, endpoint: str, status, seconds: float):
+        by_status = self.statuses.setdefault(endpoint, {})
+        by_status[str(status)] = by_status.get(str(status), 0) + 1
+        if status == 200:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint, by_status in sorted(self.statuses.items()):
+            total = sum(by_status.values())
+            ok = self.latencies.get(endpoint, [])
+            entry = {
+                "requests": total,
+                "errors": total - len(ok),
+                "error_rate": round((total - len(ok)) / total, 4),
+                "statuses": by_status,
+                "throughput_rps": round(total / elapsed, 2),
+            }
+            if ok:
+                p50, p95, p99 = np.percentile(ok, [50, 95, 99]) * 1000
+                entry.update(latency_ms={
+                    "p50": round(p50, 1), "p95": round(p95, 1), "p99": round(p99, 1),
+                    "mean": round(float(np.mean(ok)) * 1000, 1), "max": round(max(ok) * 1000, 1),
+                })
+            endpoints[endpoint] = entry
+        total = sum(e["requests"] for e in endpoints.values())
+        errors = sum(e["errors"] for e in endpoints.values())
+        return {
+            "duration_s": round(elapsed, 2),
+            "requests": total,
+            "errors": errors,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+class LoadGenerator:
+    def __init__(self, base_url: str, mix: dict, question_pool: list, timeout: float = 60):
+        self.base_url = base_url.rstrip("/")
+        self.endpoints = list(mix)
+        self.weights = [mix[e] for e in self.endpoints]
+        self.questions = question_pool
+        self.timeout = timeout
+        self.stats = Stats()
+        self.contexts = {} # question -> context_docs, so /api/answer is measured on its own
+
+    async def prepare(self, client: httpx.AsyncClient):
+        """
+        Retrieves context for every question once (the frontend's step 1 before /api/answer).
+        Questions without a match (e.g. mock embeddings are random) get a real article as
+        context, so /api/answer still exercises generation instead of the canned "no context" reply.
+        """
+        if "answer" not in self.endpoints:
+            return
+        async def fetch(i, q):
+            try:
+                resp = await client.post("/api/retrieve", json={"question": q})
+                if resp.status_code == 200:
+                    self.contexts[q] = resp.json().get("context_docs", [])
+                if not self.contexts.get(q):
+                    resp = await client.get(f"/api/legislation/Anayasa/{i % 170 + 1}")
+                    self.contexts[q] = [
+                        {"text": a["text"], "madde_no": a["madde_no"], "metadata": a["metadata"], "score": 0.7}
+                        for a in resp.json().get("articles", [])
+                    ]
+            except (httpx.HTTPError, ValueError):
+                pass
+        await asyncio.gather(*[fetch(i, q) for i, q in enumerate(self.questions)])
+
+    async def one(self, client: httpx.AsyncClient):
+        endpoint = random.choices(self.endpoints, weights=self.weights)[0]
+        question = random.choice(self.questions)
+        started = time.perf_counter()
         try:
-            # Set a long timeout (e.g., 5 minutes per question)
-            response = requests.post("http://localhost:8000/api/chat", json={"question": q}, timeout=300)
-            elapsed = time.time() - start_time
-            
-            if response.status_code == 200:
-                data = response.json()
-                answer = data.get("answer", "")
-                print(f"✅ Answered in {elapsed:.2f}s")
-                print(f"Preview: {answer[:100]}...")
-                successful += 1
+            if endpoint == "retrieve":
+                resp = await client.post("/api/retrieve", json={"question": question})
+            elif endpoint == "answer":
+                resp = await client.post("/api/answer", json={"question": question, "context_docs": self.contexts.get(question, [])})
+            elif endpoint == "chat":
+                resp = await client.post("/api/chat", json={"question": question})
             else:
-                print(f"❌ Failed (Status {response.status_code}) in {elapsed:.2f}s")
-                print(response.text)
-                
-        except requests.exceptions.Timeout:
-            print(f"❌ Timeout after {time.time() - start_time:.2f}s")
-        except Exception as e:
-            print(f"❌ Error: {e}")
-
-    total_time = time.time() - total_start
-    print("-" * 50)
-    print(f"Test Complete.")
-    print(f"Successful: {successful}/{len(questions)}")
-    print(f"Total Time: {total_time:.2f}s")
-    print(f"Average Time: {total_time/len(questions):.2f}s/q")
+                resp = await client.get(random.choice(LEGISLATION_PATHS))
+            status = resp.status_code
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.stats.record(endpoint, status, time.perf_counter() - started)
+
+    async def run(self, duration: float = None, total_requests: int = None, concurrency: int = 10, rate: float = None) -> dict:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            await self.prepare(client)
+            deadline = time.perf_counter() + duration if duration else None
+            remaining = [total_requests] if total_requests else None
+
+            def more() -> bool:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return False
+                if remaining is not None:
+                    if remaining[0] <= 0:
+                        return False
+                    remaining[0] -= 1
+                return True
+
+            started = time.perf_counter()
+            if rate:
+                # Open loop: arrivals don't wait for responses (a slow server builds a queue, like real traffic)
+                in_flight = asyncio.Semaphore(concurrency)
+                tasks = set()
+                async def guarded():
+                    async with in_flight:
+                        await self.one(client)
+                while more():
+                    task = asyncio.create_task(guarded())
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    await asyncio.sleep(random.expovariate(rate))
+                await asyncio.gather(*tasks)
+            else:
+                async def worker():
+                    while more():
+                        await self.one(client)
+                await asyncio.gather(*[worker() for _ in range(concurrency)])
+            elapsed = time.perf_counter() - started
+
+            result = self.stats.report(elapsed)
+            for key, path in [("cache_stats", "/api/cache_stats"), ("model_stats", "/api/model_stats")]:
+                try:
+                    result[key] = (await client.get(path)).json()
+                except (httpx.HTTPError, ValueError):
+                    pass
+            return result
+
+def port_in_use(port: int) -> bool:
+    with socket.socket() as sock:
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+def wait_until_up(url: str, timeout: float = 60, proc: subprocess.Popen = None):
+    """Polls url until it answers 200; with proc, fails as soon as that process exits."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"Process for {url} exited with code {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def start_offline(args) -> list:
+    """Starts mock_gemini.py and a backend pointed at it; returns the processes to stop."""
+    mock_cmd = [sys.executable, os.path.join(SRC_DIR, "mock_gemini.py"), "--port", str(args.mock_port),
+                "--latency", str(args.mock_latency), "--rate-429", str(args.mock_429), "--rpm", str(args.mock_rpm),
+                "--rate-5xx", str(args.mock_5xx), "--down-models", args.mock_down_models]
+    env = dict(os.environ, GEMINI_API_BASE=f"http://127.0.0.1:{args.mock_port}/v1beta",
+               GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "offline"), PRELOAD_ENGINE="1")
+    backend_cmd = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", SRC_DIR,
+                   "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"]
+    # Whatever already listens there would answer the health checks and get load-tested instead
+    for port in (args.mock_port, args.port):
+        if port_in_use(port):
+            raise RuntimeError(f"Port {port} is already in use; stop that server or pick another port")
+    # Server logs go to stderr, stdout stays the JSON report
+    procs = [subprocess.Popen(mock_cmd, stdout=sys.stderr)]
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.mock_port}/v1beta/models", proc=procs[0])
+        procs.append(subprocess.Popen(backend_cmd, env=env, stdout=sys.stderr))
+        wait_until_up(f"http://127.0.0.1:{args.port}/api/ready", proc=procs[1])
+    except Exception:
+        stop(procs)
+        raise
+    return procs
+
+def stop(procs: list):
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        try:
+            p.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("retrieve", "answer", "legislation", "chat"):
+            raise argparse.ArgumentTypeError(f"Unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def load_questions(path: str) -> list:
+    pool = list(questions)
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            pool += [q["question"] for q in json.load(f)]
+    return pool
 
 if __name__ == "__main__":
-    run_test()
+    parser = argparse.ArgumentParser(description="Concurrent load test for the backend API")
+    parser.add_argument("--url", default="http://localhost:8000", help="Backend to test (ignored with --offline)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("retrieve=5,answer=2,legislation=3"),
+                        help="Weighted endpoints: retrieve, answer, legislation, chat")
+    parser.add_argument("--concurrency", type=int, default=10, help="Workers (closed loop) or max in flight (open loop)")
+    parser.add_argument("--rate", type=float, default=None, help="Open loop: mean requests/second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many requests instead")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--questions", default="backend/data/test_questions_100.json")
+    parser.add_argument("--output", default=None, help="Also write the JSON report here")
+    parser.add_argument("--seed", type=int, default=0)
+
+    offline = parser.add_argument_group("offline mode")
+    offline.add_argument("--offline", action="store_true", help="Start mock Gemini + backend locally")
+    offline.add_argument("--port", type=int, default=8100)
+    offline.add_argument("--workers", type=int, default=1, help="Backend worker processes")
+    offline.add_argument("--mock-port", type=int, default=8765)
+    offline.add_argument("--mock-latency", type=float, default=0.3, help="Simulated Gemini latency (s)")
+    offline.add_argument("--mock-429", type=float, default=0.0, help="Fraction of Gemini calls answered with 429")
+    offline.add_argument("--mock-rpm", type=int, default=0, help="Simulated Gemini quota per minute (0 = none)")
+    offline.add_argument("--mock-5xx", type=float, default=0.0, help="Fraction of Gemini calls answered with 503")
+    offline.add_argument("--mock-down-models", default="", help="Comma separated models that always return 503")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    procs = start_offline(args) if args.offline else []
+    base_url = f"http://127.0.0.1:{args.port}" if args.offline else args.url
+    try:
+        generator = LoadGenerator(base_url, args.mix, load_questions(args.questions), timeout=args.timeout)
+        report = asyncio.run(generator.run(
+            duration=None if args.requests else args.duration,
+            total_requests=args.requests,
+            concurrency=args.concurrency,
+            rate=args.rate,
+        ))
+    finally:
+        stop(procs)
+
+    report["config"] = {
+        "url": base_url, "mix": args.mix, "concurrency": args.concurrency, "rate": args.rate,
+        **({"workers": args.workers, "mock_latency": args.mock_latency, "mock_429": args.mock_429,
+            "mock_rpm": args.mock_rpm, "mock_5xx": args.mock_5xx, "mock_down_models": args.mock_down_models}
+           if args.offline else {}),
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
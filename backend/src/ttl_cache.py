@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import time
+import atexit
+from collections import OrderedDict
+from typing import Any, Optional
+
+def normalize_question(text: str) -> str:
+    """Cache key form of a question: lowercase, single spaces, no trailing punctuation."""
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry and hit/miss counters."""
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None, on_evict=None):
+        self.max_size = max_size
+        self.ttl = ttl # Seconds, None = never expires
+        self.on_evict = on_evict # Called as on_evict(key, value) for LRU-evicted / expired entries, outside the lock
+        self._data = OrderedDict() # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._expired(entry[0], now):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        if entry is not None and self.on_evict:
+            self.on_evict(key, entry[1])
+        return default
+
+    def peek(self, key, default=None):
+        """get() without touching LRU order or the hit/miss counters."""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or self._expired(entry[0], time.time()):
+            return default
+        return entry[1]
+
+    def put(self, key, value: Any, stored_at: float = None):
+        evicted = []
+        with self._lock:
+            self._data[key] = (stored_at or time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                evicted.append(self._data.popitem(last=False)) # Evict least recently used
+        if self.on_evict:
+            for old_key, (_, old_value) in evicted:
+                self.on_evict(old_key, old_value)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """Snapshot of (key, stored_at, value) for live entries, oldest first."""
+        now = time.time()
+        with self._lock:
+            return [(k, t, v) for k, (t, v) in self._data.items() if not self._expired(t, now)]
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+class EmbeddingCache(TTLCache):
+    """
+    Query embedding cache keyed on (model, normalized question).
+    If persist_path is set, entries are saved to a JSON file every `save_every`
+    new entries and at exit, and loaded back on startup (survives cold starts
+    as long as the file system does, e.g. /tmp on a warm Vercel container).
+    The periodic saves run in a background thread from a snapshot taken under
+    the lock: dumping a full cache takes a while, and put_vector() is called
+    from the event loop.
+    """
+
+    def __init__(self, model_name: str, max_size: int = 2048, ttl: Optional[float] = None,
+                 persist_path: str = None, save_every: int = 20):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.model_name = model_name
+        self.persist_path = persist_path
+        self.save_every = save_every
+        self._unsaved = 0
+        self._saving = threading.Lock() # One writer at a time (background vs shutdown save)
+        if persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    def key(self, text: str) -> str:
+        return f"{self.model_name}|{normalize_question(text)}"
+
+    def get_vector(self, text: str):
+        return self.get(self.key(text))
+
+    def peek_vector(self, text: str):
+        return self.peek(self.key(text))
+
+    def put_vector(self, text: str, vector):
+        self.put(self.key(text), list(vector))
+        if self.persist_path:
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self.save_in_background()
+
+    def save_in_background(self):
+        """save() in a daemon thread; the caller does not wait for the dump. No-op while a save runs."""
+        if not self._saving.locked():
+            threading.Thread(target=self.save, name="embedding-cache-save", daemon=True).start()
+
+    def load(self):
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for key, stored_at, vector in data.get("entries", []):
+                # Other models' vectors live in a different space, never mix them
+                if key.startswith(self.model_name + "|"):
+                    self.put(key, vector, stored_at=stored_at)
+            print(f"Embedding cache loaded: {len(self)} entries from {self.persist_path}")
+        except Exception as e:
+            print(f"Embedding cache load error: {e}")
+
+    def save(self):
+        if not self.persist_path:
+            return
+        with self._saving:
+            unsaved = self._unsaved
+            entries = self.items() # Snapshot under the cache lock; the dump below runs without it
+            try:
+                tmp_path = self.persist_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"entries": entries}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.persist_path)
+                self._unsaved = max(self._unsaved - unsaved, 0) # Puts during the dump still count
+            except Exception as e:
+                print(f"Embedding cache save error: {e}")
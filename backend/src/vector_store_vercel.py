@@ -1,116 +1,368 @@
+import asyncio
+import hashlib
 import json
 import os
-import math
+import numpy as np
 from typing import List, Dict, Any
+from index_artifact import index_exists, index_paths, load_index, normalize_rows, source_matches
+from ann_index import ANN_MIN_DOCS, DEFAULT_NPROBE, load_ivf
+from quantized_index import load_quantized
+from ttl_cache import EmbeddingCache
+from gemini_client import get_client
+from embedding_batcher import EmbeddingBatcher
+from metrics import stage
+
+# batchEmbedContents accepts at most 100 requests per call
+BATCH_EMBED_LIMIT = 100
+
+# Documents are partitioned by this metadata field (later e.g. the law number)
+SHARD_KEY = "source"
+DEFAULT_SOURCE = "Anayasa" # Older chunks have no source
+
+class Shard:
+    """Rows of one source. Sources are ingested one after another, so usually a contiguous slice."""
+
+    def __init__(self, key: str, rows: np.ndarray):
+        self.key = key
+        self.rows = rows # Sorted row ids
+        contiguous = rows.size > 0 and rows[-1] - rows[0] + 1 == rows.size
+        self.span = slice(int(rows[0]), int(rows[-1]) + 1) if contiguous else None
+
+    def __len__(self):
+        return self.rows.size
+
+    def vectors(self, matrix: np.ndarray) -> np.ndarray:
+        # A slice is a view (no copy, and stays lazily paged in when memory-mapped)
+        return matrix[self.span] if self.span is not None else matrix[self.rows]
+
+def empty_result() -> dict:
+    return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
 
 class VectorStoreVercel:
     def __init__(self, embeddings_path: str = "backend/data/embeddings_gemini.json"):
         self.embeddings_path = embeddings_path
-        self.documents = []
-        self.vectors = [] # List of lists (not numpy array)
+        # Compiled index lives next to the JSON: embeddings_gemini.npy + embeddings_gemini.meta.json
+        self.index_prefix = os.path.splitext(embeddings_path)[0]
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.matrix = None # (N, D) float32, rows L2-normalized (memory-mapped when compiled)
+        self.ann = None # IVFIndex for large corpora (ann_index.py), None = exact search
+        self.quantized = None # QuantizedMatrix first pass (quantized_index.py), None = float32 scan
+        self.shards = {} # SHARD_KEY value -> Shard
+        self.row_shard = None # (N,) shard number per row, for filtering ANN candidates
+        self.version = None
         self.model_name = 'models/text-embedding-004'
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found in env")
-            
+        self.client = get_client() # Shared, connection-pooled
+
+        # Popular questions repeat a lot; skip the embedContent round trip for them.
+        # EMBED_CACHE_PATH (e.g. /tmp/query_embeddings.json) keeps it across restarts.
+        ttl = float(os.getenv("EMBED_CACHE_TTL", "0")) or None
+        self.embedding_cache = EmbeddingCache(
+            self.model_name,
+            max_size=int(os.getenv("EMBED_CACHE_SIZE", "2048")),
+            ttl=ttl,
+            persist_path=os.getenv("EMBED_CACHE_PATH") or None
+        )
+
+        # Concurrent cache misses share one batchEmbedContents call (0 = one call per query)
+        self.embed_batcher = EmbeddingBatcher(
+            self.client, self.model_name,
+            window=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")) / 1000,
+            max_batch=BATCH_EMBED_LIMIT
+        )
+
         # Lazy load data only when needed (or we can load here if we want to fail fast)
         self._load_data()
 
     def _load_data(self):
+        if index_exists(self.index_prefix) and self._load_compiled():
+            return
+
         if not os.path.exists(self.embeddings_path):
              print(f"Warning: {self.embeddings_path} not found. DB empty.")
              return
 
-        with open(self.embeddings_path, 'r') as f:
-            data = json.load(f)
-            
-        self.documents = data
-        self.vectors = [d['embedding'] for d in data]
-        print(f"Vector Store Loaded: {len(self.documents)} docs.")
-        
-    def query(self, query_text: str, n_results: int = 5):
-        # Local import used to be here, now removed.
-        import requests
-        
-        # 1. Embed Query
-        url = f"https://generativelanguage.googleapis.com/v1beta/{self.model_name}:embedContent?key={self.api_key}"
-        
-        payload = {
-            "model": f"models/{self.model_name}" if "models/" not in self.model_name else self.model_name,
-            "content": {
-                "parts": [{ "text": query_text }]
-            },
-            "taskType": "retrieval_query" 
-        }
-        
+        # Slow path: parse the JSON (run index_artifact.py to compile it)
+        with open(self.embeddings_path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw)
+        self.version = hashlib.sha1(raw).hexdigest()[:16]
+
+        self.ids = [d['id'] for d in data]
+        self.texts = [d['text'] for d in data]
+        self.metadatas = [d['metadata'] for d in data]
+        self.matrix = self._build_matrix([d['embedding'] for d in data])
+        self._build_shards()
+        print(f"Vector Store Loaded (JSON): {len(self.ids)} docs.")
+
+    def _load_compiled(self) -> bool:
+        """Loads the compiled index. False (nothing loaded) if the JSON changed after it was compiled."""
+        matrix, sidecar = load_index(self.index_prefix)
+        if not source_matches(sidecar, self.embeddings_path, index_paths(self.index_prefix)[1]):
+            print(f"Warning: {self.embeddings_path} changed after {self.index_prefix}.npy was compiled; "
+                  f"loading the JSON instead. Run index_artifact.py to recompile.")
+            return False
+        self.ids = sidecar["ids"]
+        self.texts = sidecar["texts"]
+        self.metadatas = sidecar["metadatas"]
+        self.matrix = matrix if matrix.shape[0] else None
+        self.version = sidecar.get("version")
+        if len(self.ids) >= ANN_MIN_DOCS:
+            self.ann = load_ivf(self.index_prefix, self.version)
+        quantization = os.getenv("VECTOR_QUANTIZATION", "").lower()
+        if quantization:
+            self.quantized = load_quantized(self.index_prefix, quantization, self.version)
+            if self.quantized is None:
+                print(f"Warning: no {quantization} index next to {self.index_prefix}, using float32 scan.")
+        self._build_shards()
+        print(f"Vector Store Loaded (compiled): {len(self.ids)} docs" + (f", ANN {self.ann.nlist} lists." if self.ann else "."))
+        return True
+
+    def _build_shards(self):
+        keys = [m.get(SHARD_KEY, DEFAULT_SOURCE) for m in self.metadatas]
+        names = list(dict.fromkeys(keys)) # Corpus order
+        number = {name: i for i, name in enumerate(names)}
+        self.row_shard = np.array([number[k] for k in keys], dtype=np.int32)
+        self.shards = {name: Shard(name, np.flatnonzero(self.row_shard == i)) for i, name in enumerate(names)}
+
+    def sources(self) -> list:
+        return list(self.shards)
+
+    def in_source(self, row: int, source: str = None) -> bool:
+        return source is None or self.metadatas[row].get(SHARD_KEY, DEFAULT_SOURCE) == source
+
+    @staticmethod
+    def _build_matrix(vectors) -> np.ndarray:
+        """Stacks vectors into one contiguous float32 matrix with unit-length rows."""
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] == 0:
+            return None
+        # Zero vectors stay zero (score 0.0), same as the old pure Python path
+        return normalize_rows(matrix)
+
+    def embed_query(self, query_text: str):
+        """Embeds the query via Gemini REST API. Returns a list of floats or None on error."""
+        cached = self.embedding_cache.get_vector(query_text)
+        if cached is not None:
+            return cached
+
         try:
-            resp = requests.post(url, json=payload, timeout=10)
-            resp.raise_for_status() # Raise for 4xx/5xx
-            frame = resp.json()
-            # Extract embedding: frame['embedding']['values']
-            query_vector = frame['embedding']['values']
-            
-            # DEBUG: Print dims
-            # print(f"Query Dim: {len(query_vector)}")
-            
+            with stage("embed"):
+                vector = self.client.embed(self.model_name, query_text, task_type="retrieval_query")
         except Exception as e:
             print(f"Embedding API Error: {e}")
-            # Fallback or empty result to avoid crash
-            return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
-        
-        # 2. Cosine Similarity (Pure Python)
-        
-        # Calculate norm of query vector
-        query_norm = math.sqrt(sum(x * x for x in query_vector))
-        
-        scores = []
-        for i, doc_vec in enumerate(self.vectors):
-            # Ensure doc_vec is float list
-            # doc_vec = [float(x) for x in doc_vec] # Expensive loop? Assuming they are already.
-            
-            # Dot Product
-            # Optimization: Pre-compute doc norms? Too much RAM? 
-            # Doing it on the fly is O(N*D).
-            
-            dot_product = sum(a * b for a, b in zip(doc_vec, query_vector))
-            # Doc vectors are usually normalized by embedding model, but let's be safe?
-            # Assuming pre-computed vectors are normalized or we trust dot product for ranking if query is normalized.
-            # Actually for cosine similarity: (A . B) / (|A| * |B|)
-            # If we assume doc vectors |B| approx 1 (usually true for embeddings), and we normalize A...
-            
-            # Let's do full cosine for correctness
-            doc_norm = math.sqrt(sum(x * x for x in doc_vec))
-            
-            if query_norm * doc_norm == 0:
-                score = 0.0
-            else:
-                score = dot_product / (query_norm * doc_norm)
-            scores.append(score)
-        
-        # 3. Get Top K
-        # Create list of (index, score)
-        indexed_scores = list(enumerate(scores))
-        # Sort by score descending
-        indexed_scores.sort(key=lambda x: x[1], reverse=True)
-        
-        top_indices = [x[0] for x in indexed_scores[:n_results]]
-        
+            return None
+        self.embedding_cache.put_vector(query_text, vector)
+        return vector
+
+    async def aembed_query(self, query_text: str):
+        """Async embed_query() for the FastAPI handlers (does not block the event loop). Misses are micro-batched."""
+        cached = self.embedding_cache.get_vector(query_text)
+        if cached is not None:
+            return cached
+
+        try:
+            with stage("embed"):
+                vector = await self.embed_batcher.embed(query_text)
+        except Exception as e:
+            print(f"Embedding API Error: {e}")
+            return None
+        self.embedding_cache.put_vector(query_text, vector)
+        return vector
+
+    def _cached_vectors(self, query_texts: List[str]):
+        """Cache lookups for a batch. Returns (vectors with None for misses, unique missing texts)."""
+        vectors = [self.embedding_cache.get_vector(t) for t in query_texts]
+        # Unique misses only - the same question twice in a batch costs one embedding
+        missing = list(dict.fromkeys(t for t, v in zip(query_texts, vectors) if v is None))
+        return vectors, missing
+
+    def _store_fetched(self, chunk: List[str], fetched_vectors: list, fetched: dict):
+        for text, vector in zip(chunk, fetched_vectors):
+            fetched[text] = vector
+            self.embedding_cache.put_vector(text, vector)
+
+    def embed_queries(self, query_texts: List[str]) -> list:
+        """
+        Embeds many queries with batchEmbedContents (cache hits are skipped).
+        Returns vectors in input order; None for queries that failed.
+        """
+        vectors, missing = self._cached_vectors(query_texts)
+        fetched = {}
+        for start in range(0, len(missing), BATCH_EMBED_LIMIT):
+            chunk = missing[start:start + BATCH_EMBED_LIMIT]
+            try:
+                with stage("embed"):
+                    batch = self.client.batch_embed(self.model_name, chunk, task_type="retrieval_query")
+                self._store_fetched(chunk, batch, fetched)
+            except Exception as e:
+                print(f"Batch Embedding API Error: {e}")
+
+        return [v if v is not None else fetched.get(t) for t, v in zip(query_texts, vectors)]
+
+    async def aembed_queries(self, query_texts: List[str]) -> list:
+        """Async embed_queries(). Chunks of BATCH_EMBED_LIMIT are sent concurrently."""
+        vectors, missing = self._cached_vectors(query_texts)
+        chunks = [missing[i:i + BATCH_EMBED_LIMIT] for i in range(0, len(missing), BATCH_EMBED_LIMIT)]
+        with stage("embed"):
+            batches = await asyncio.gather(
+                *[self.client.abatch_embed(self.model_name, c, task_type="retrieval_query") for c in chunks],
+                return_exceptions=True
+            )
+
+        fetched = {}
+        for chunk, batch in zip(chunks, batches):
+            if isinstance(batch, Exception):
+                print(f"Batch Embedding API Error: {batch}")
+                continue
+            self._store_fetched(chunk, batch, fetched)
+
+        return [v if v is not None else fetched.get(t) for t, v in zip(query_texts, vectors)]
+
+    def scores(self, query_vector) -> np.ndarray:
+        """Cosine similarity of the query against every document (one mat-vec product)."""
+        q = np.asarray(query_vector, dtype=np.float32)
+        q_norm = np.linalg.norm(q)
+        if self.matrix is None or q_norm == 0:
+            return np.zeros(len(self.ids), dtype=np.float32)
+        return self.matrix @ (q / q_norm)
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k best scores, best first. Partial selection instead of a full sort."""
+        n = scores.shape[0]
+        k = min(k, n)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < n:
+            kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+            # Everything tied with the k-th score competes in corpus order, like the old stable sort
+            idx = np.flatnonzero(scores >= kth)
+        else:
+            idx = np.arange(n)
+        # Only the selected entries get sorted (stable, so ties keep corpus order)
+        return idx[np.argsort(-scores[idx], kind="stable")][:k]
+
+    def scores_many(self, query_vectors) -> np.ndarray:
+        """(Q, N) cosine similarities for a batch of queries (one mat-mat product)."""
+        q = np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1)
+        if self.matrix is None:
+            return np.zeros((q.shape[0], len(self.ids)), dtype=np.float32)
+        q_norms = np.linalg.norm(q, axis=1, keepdims=True)
+        q_norms[q_norms == 0] = np.inf # Zero query -> all scores 0.0
+        return (q / q_norms) @ self.matrix.T
+
+    @staticmethod
+    def _unit(query_vector) -> np.ndarray:
+        q = np.asarray(query_vector, dtype=np.float32)
+        q_norm = np.linalg.norm(q)
+        return q / q_norm if q_norm else q
+
+    @property
+    def exact_scan(self) -> bool:
+        """True if nearest() scores every float32 row, so batches can share one scores_many() product."""
+        return self.ann is None and self.quantized is None
+
+    def _scan_shard(self, shard: Shard, query: np.ndarray, n: int):
+        """Top n inside one shard: (row ids, similarities). Quantized first pass + rescoring when enabled."""
+        if self.quantized is not None:
+            rows = shard.span if shard.span is not None else shard.rows
+            return self.quantized.search(self.matrix, query, n, rows=rows, row_ids=shard.rows)
+        sims = shard.vectors(self.matrix) @ query
+        top = self.top_k(sims, n)
+        return shard.rows[top], sims[top]
+
+    def nearest(self, query_vector, n: int, nprobe: int = None, source: str = None):
+        """
+        (row ids, similarities) of the n closest documents, best first.
+        source: only that shard is scanned (unknown source -> nothing).
+        Uses the ANN index when loaded (at least nprobe lists probed, DEFAULT_NPROBE if None), else exact
+        scans per shard whose top-n lists are merged.
+        """
+        none = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        if self.matrix is None:
+            return none
+        query = self._unit(query_vector)
+        nprobe = nprobe or DEFAULT_NPROBE
+
+        if source is not None:
+            shard = self.shards.get(source)
+            if shard is None:
+                return none
+            if self.ann is not None and len(shard) >= ANN_MIN_DOCS:
+                number = list(self.shards).index(source)
+                return self.ann.search(self.matrix, query, n, nprobe, row_mask=self.row_shard == number)
+            return self._scan_shard(shard, query, n)
+
+        if self.ann is not None:
+            return self.ann.search(self.matrix, query, n, nprobe)
+        if len(self.shards) == 1:
+            return self._scan_shard(next(iter(self.shards.values())), query, n)
+        parts = [self._scan_shard(shard, query, n) for shard in self.shards.values()]
+        ids = np.concatenate([p[0] for p in parts])
+        sims = np.concatenate([p[1] for p in parts])
+        # Back to corpus order first, so ties resolve exactly like a single full scan
+        order = np.argsort(ids, kind="stable")
+        ids, sims = ids[order], sims[order]
+        top = self.top_k(sims, n)
+        return ids[top], sims[top]
+
+    def score_rows(self, query_vector, ids) -> np.ndarray:
+        """Exact similarities for selected rows only (e.g. keyword candidates the ANN search did not return)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.matrix is None or ids.size == 0:
+            return np.zeros(ids.size, dtype=np.float32)
+        return self.matrix[ids] @ self._unit(query_vector)
+
+    def _format_results(self, ids, sims) -> dict:
         results = {
             "documents": [],
             "metadatas": [],
-            "distances": [] 
+            "distances": []
         }
-        
-        for idx in top_indices:
-            doc = self.documents[idx]
-            score = scores[idx]
-            results["documents"].append(doc["text"])
-            results["metadatas"].append(doc["metadata"])
+
+        for idx, sim in zip(ids, sims):
+            results["documents"].append(self.texts[idx])
+            results["metadatas"].append(self.metadatas[idx])
             # Convert similarity to distance
-            results["distances"].append(1.0 - score) 
-            
+            results["distances"].append(1.0 - float(sim))
+
         return {
             "documents": [results["documents"]],
             "metadatas": [results["metadatas"]],
             "distances": [results["distances"]]
         }
+
+    def search(self, query_vector, n_results: int = 5, nprobe: int = None, source: str = None):
+        """Scores an already embedded query. Returns the Chroma-like result dict."""
+        return self._format_results(*self.nearest(query_vector, n_results, nprobe, source))
+
+    def query(self, query_text: str, n_results: int = 5, source: str = None):
+        # 1. Embed Query
+        query_vector = self.embed_query(query_text)
+        if query_vector is None:
+            # Fallback or empty result to avoid crash
+            return empty_result()
+
+        # 2. Cosine Similarity + Top K (NumPy), only over the requested source's shard
+        return self.search(query_vector, n_results, source=source)
+
+    def query_many(self, query_texts: List[str], n_results: int = 5) -> list:
+        """Batch version of query(): one embedding call, one matrix product. Input order is kept."""
+        vectors = self.embed_queries(query_texts)
+        ok = [i for i, v in enumerate(vectors) if v is not None]
+
+        results = [empty_result() for _ in query_texts]
+        if ok and not self.exact_scan:
+            for i in ok:
+                results[i] = self.search(vectors[i], n_results)
+        elif ok:
+            sims = self.scores_many([vectors[i] for i in ok])
+            for row, i in enumerate(ok):
+                ids = self.top_k(sims[row], n_results)
+                results[i] = self._format_results(ids, sims[row][ids])
+        return results
@@ -0,0 +1,153 @@
+"""
+Shared fixtures: a small two-source corpus on disk and an in-process stand-in
+for the Gemini client, so nothing here needs a key or the network.
+
+Run from backend/:  python -m pytest -q
+"""
+import asyncio
+import json
+import os
+from collections import Counter
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+# Anything that still builds a real GeminiClient gets a closed port instead of the real API
+os.environ["GEMINI_API_BASE"] = "http://127.0.0.1:9/v1beta"
+
+import pytest
+import gemini_client
+from benchmark import FakeEmbedder
+
+DIM = 64
+
+# (source, madde, konu, text) - real articles, shortened
+ARTICLES = [
+    ("Anayasa", 1, "Devletin şekli", "Türkiye Devleti bir Cumhuriyettir."),
+    ("Anayasa", 2, "Cumhuriyetin nitelikleri",
+     "Türkiye Cumhuriyeti, toplumun huzuru, millî dayanışma ve adalet anlayışı içinde, insan haklarına saygılı, "
+     "demokratik, lâik ve sosyal bir hukuk Devletidir."),
+    ("Anayasa", 3, "Devletin bütünlüğü, resmî dili, bayrağı, millî marşı ve başkenti",
+     "Türkiye Devleti, ülkesi ve milletiyle bölünmez bir bütündür. Dili Türkçedir. Başkenti Ankara'dır."),
+    ("Anayasa", 10, "Kanun önünde eşitlik",
+     "Herkes, dil, ırk, renk, cinsiyet, siyasî düşünce, felsefî inanç, din, mezhep ve benzeri sebeplerle ayırım "
+     "gözetilmeksizin kanun önünde eşittir."),
+    ("Anayasa", 17, "Kişinin dokunulmazlığı, maddî ve manevî varlığı",
+     "Herkes, yaşama, maddî ve manevî varlığını koruma ve geliştirme hakkına sahiptir."),
+    ("Anayasa", 26, "Düşünceyi açıklama ve yayma hürriyeti",
+     "Herkes, düşünce ve kanaatlerini söz, yazı, resim veya başka yollarla tek başına veya toplu olarak açıklama "
+     "ve yayma hakkına sahiptir."),
+    ("TIHEK Kanunu", 1, "Amaç",
+     "Bu Kanunun amacı; insan onurunu temel alarak insan haklarının korunması ve geliştirilmesi, ayrımcılığın "
+     "önlenmesidir."),
+    ("TIHEK Kanunu", 2, "Kapsam",
+     "Bu Kanun hükümleri, kamu kurum ve kuruluşları ile özel hukuk gerçek ve tüzel kişileri hakkında uygulanır."),
+    ("TIHEK Kanunu", 3, "Eşitlik ilkesi ve ayrımcılık yasağı",
+     "Herkes, hukuken tanınmış hak ve hürriyetlerden yararlanmada eşittir. Ayrımcılık yasaktır."),
+    ("TIHEK Kanunu", 10, "Kurumun görevleri",
+     "Kurum, insan haklarını korumak ve ayrımcılık yasağı ihlallerini incelemekle görevlidir."),
+]
+
+def make_records(embedder: FakeEmbedder) -> list:
+    """embeddings_gemini.json records. Vectors come from the topic only, so "<konu> nedir?" lands well inside the 0.6 cutoff."""
+    records = []
+    for source, madde, konu, text in ARTICLES:
+        records.append({
+            "id": f"MADDE {madde}" if source == "Anayasa" else f"{source} MADDE {madde}",
+            "text": f"KONU: {konu}\nMadde {madde} – {text}",
+            "metadata": {"source": source, "madde": madde, "konu": konu, "page": 1 + madde // 3},
+            "embedding": embedder.embed(konu).tolist(),
+        })
+    return records
+
+class FakeGeminiClient:
+    """
+    GeminiClient stand-in: FakeEmbedder vectors, scripted generation.
+    behaviour[model] = an exception to raise, or seconds to wait before answering.
+    """
+
+    def __init__(self, dim: int = DIM):
+        self.embedder = FakeEmbedder(dim)
+        self.calls = Counter()
+        self.generated = [] # Model names, in call order
+        self.behaviour = {}
+
+    def _vector(self, text: str) -> list:
+        return self.embedder.embed(text).tolist()
+
+    def embed(self, model_name, text, task_type="retrieval_query", timeout=10):
+        self.calls["embed"] += 1
+        return self._vector(text)
+
+    async def aembed(self, model_name, text, task_type="retrieval_query", timeout=10):
+        self.calls["embed"] += 1
+        return self._vector(text)
+
+    def batch_embed(self, model_name, texts, task_type="retrieval_query", timeout=30, retries=None):
+        self.calls["batch_embed"] += 1
+        return [self._vector(t) for t in texts]
+
+    async def abatch_embed(self, model_name, texts, task_type="retrieval_query", timeout=30, retries=None):
+        self.calls["batch_embed"] += 1
+        return [self._vector(t) for t in texts]
+
+    async def _behave(self, model_name):
+        self.generated.append(model_name)
+        behaviour = self.behaviour.get(model_name)
+        if isinstance(behaviour, BaseException):
+            raise behaviour
+        if behaviour:
+            await asyncio.sleep(behaviour)
+
+    async def agenerate(self, model_name, prompt_text, timeout=30, retries=None):
+        await self._behave(model_name)
+        return f"{model_name} cevabı"
+
+    async def astream_generate(self, model_name, prompt_text, timeout=30):
+        await self._behave(model_name)
+        for piece in ("Cevap ", "parça ", "parça."):
+            yield piece
+
+    async def awarm_up(self, connections=2):
+        pass
+
+    async def aclose(self):
+        pass
+
+@pytest.fixture
+def records():
+    return make_records(FakeEmbedder(DIM))
+
+@pytest.fixture
+def embeddings_path(tmp_path, records):
+    path = tmp_path / "embeddings_gemini.json"
+    path.write_text(json.dumps(records, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeGeminiClient()
+    monkeypatch.setattr(gemini_client, "_client", client)
+    monkeypatch.delenv("EMBED_CACHE_PATH", raising=False)
+    return client
+
+@pytest.fixture
+def store(embeddings_path, fake_client):
+    from vector_store_vercel import VectorStoreVercel
+    return VectorStoreVercel(embeddings_path)
+
+@pytest.fixture
+def engine(embeddings_path, fake_client):
+    from rag_engine import RAGEngine
+    engine = RAGEngine(embeddings_path=embeddings_path)
+    engine._initialize_lazy()
+    return engine
+
+@pytest.fixture
+def api(engine, monkeypatch):
+    """TestClient over main.app with the fixture engine already loaded (no lifespan, no warm-up)."""
+    import main
+    from fastapi.testclient import TestClient
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(main, "engine_state", "warm")
+    main.answer_cache.clear()
+    main.context_handles.clear()
+    return TestClient(main.app)
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from ann_index import IVFIndex, exact_top_k, sample_queries, synthetic_corpus
+
+@pytest.fixture(scope="module")
+def corpus():
+    matrix = synthetic_corpus(3000, dim=64, clusters=60)
+    return matrix, IVFIndex.build(matrix, nlist=64), sample_queries(matrix, 100)
+
+def recall(matrix, index, queries, k, nprobe, row_mask=None):
+    hits = 0
+    allowed = np.flatnonzero(row_mask) if row_mask is not None else np.arange(matrix.shape[0])
+    for q in queries:
+        truth = allowed[exact_top_k(matrix[allowed], q[None, :], k)[0]]
+        ids, _ = index.search(matrix, q, k, nprobe, row_mask=row_mask)
+        hits += len(set(ids.tolist()) & set(truth.tolist()))
+    return hits / (k * len(queries))
+
+def test_probing_every_list_is_exact(corpus):
+    matrix, index, queries = corpus
+    assert recall(matrix, index, queries, 10, nprobe=index.nlist) == 1.0
+
+def test_recall_grows_with_nprobe(corpus):
+    matrix, index, queries = corpus
+    recalls = [recall(matrix, index, queries, 10, nprobe) for nprobe in (1, 8, 32)]
+    assert recalls == sorted(recalls)
+    assert recalls[1] >= 0.9
+
+def test_results_are_sorted_with_true_scores(corpus):
+    matrix, index, queries = corpus
+    ids, scores = index.search(matrix, queries[0], 10, 8)
+    assert np.all(np.diff(scores) <= 0)
+    assert np.allclose(scores, matrix[ids] @ queries[0], atol=1e-6)
+
+def test_filtered_search_widens_until_k_rows_match(corpus):
+    matrix, index, queries = corpus
+    # A small "statute": 20 rows from the lists farthest from the query
+    query = queries[0]
+    far_lists = np.argsort(index.centroids @ query)[:4]
+    rows = np.concatenate([index.order[index.offsets[l]:index.offsets[l + 1]] for l in far_lists])[:20]
+    mask = np.zeros(matrix.shape[0], dtype=bool)
+    mask[rows] = True
+
+    ids, _ = index.search(matrix, query, 5, nprobe=1, row_mask=mask)
+    assert len(ids) == 5 and mask[ids].all()
+    ids, _ = index.search(matrix, query, 50, nprobe=1, row_mask=mask)
+    assert sorted(ids.tolist()) == sorted(rows.tolist()) # Fewer than k allowed rows: all of them
+
+def test_filtered_recall(corpus):
+    matrix, index, queries = corpus
+    mask = np.zeros(matrix.shape[0], dtype=bool)
+    mask[::10] = True
+    assert recall(matrix, index, queries, 5, 8, row_mask=mask) >= 0.8
+
+def test_save_and_load_round_trip(tmp_path, corpus):
+    matrix, index, _ = corpus
+    saved = IVFIndex(index.centroids, index.offsets, index.order, "v1")
+    saved.save(str(tmp_path / "x.ivf.npz"))
+    loaded = IVFIndex.load(str(tmp_path / "x.ivf.npz"))
+    assert loaded.version == "v1" and loaded.nlist == index.nlist
+    assert np.array_equal(loaded.order, index.order)
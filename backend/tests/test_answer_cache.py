@@ -0,0 +1,61 @@
+from answer_cache import AnswerCache, context_key
+from ttl_cache import TTLCache
+
+def doc(madde, text, source="Anayasa", konu="Konu"):
+    return {"madde_no": madde, "text": text, "metadata": {"source": source, "konu": konu}}
+
+CONTEXT = [doc(1, "Türkiye Devleti bir Cumhuriyettir."), doc(2, "… demokratik, lâik ve sosyal bir hukuk Devletidir.")]
+
+def test_context_key_ignores_order_but_not_content():
+    assert context_key(CONTEXT) == context_key(list(reversed(CONTEXT)))
+    assert context_key(CONTEXT).startswith("Anayasa:1|Anayasa:2#")
+    forged = [doc(1, "Türkiye Devleti bir Krallıktır."), CONTEXT[1]]
+    assert context_key(forged) != context_key(CONTEXT)
+    assert context_key([doc(1, CONTEXT[0]["text"], konu="Başka")]) != context_key(CONTEXT[:1])
+
+def test_forged_context_neither_reads_nor_poisons_the_real_entry():
+    cache = AnswerCache()
+    forged = [doc(1, "Türkiye Devleti bir Krallıktır."), CONTEXT[1]]
+    cache.put("Devletin şekli nedir?", forged, "Krallık.", "m", "v1")
+    assert cache.lookup("Devletin şekli nedir?", CONTEXT, "v1") is None
+    cache.put("Devletin şekli nedir?", CONTEXT, "Cumhuriyet.", "m", "v1")
+    assert cache.lookup("devletin şekli nedir", CONTEXT, "v1")["answer"] == "Cumhuriyet."
+
+def test_new_corpus_version_invalidates():
+    cache = AnswerCache()
+    cache.put("Soru", CONTEXT, "Cevap", "m", "v1")
+    assert cache.lookup("Soru", CONTEXT, "v1") is not None
+    assert cache.lookup("Soru", CONTEXT, "v2") is None
+    assert len(cache.entries) == 0 and cache.by_context == {}
+
+def test_semantic_hit_needs_same_context_and_close_embedding():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.put("Devletin şekli nedir?", CONTEXT, "Cumhuriyet.", "m", "v1", embedding=[1.0, 0.0])
+    assert cache.lookup("Devlet hangi şekildedir?", CONTEXT, "v1", embedding=[0.99, 0.05])["answer"] == "Cumhuriyet."
+    assert cache.lookup("Başka bir soru", CONTEXT, "v1", embedding=[0.0, 1.0]) is None
+    assert cache.lookup("Devlet hangi şekildedir?", CONTEXT[:1], "v1", embedding=[1.0, 0.0]) is None
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["hits"], stats["misses"]) == (1, 1, 2)
+
+def test_evicted_entries_leave_no_context_lists_behind():
+    cache = AnswerCache(max_size=2)
+    for madde in range(1, 6):
+        cache.put("Soru", [doc(madde, f"Metin {madde}")], "Cevap", "m", "v1")
+    assert len(cache.entries) == 2
+    assert sorted(cache.by_context) == sorted(("v1", context_key([doc(m, f"Metin {m}")])) for m in (4, 5))
+
+def test_expired_entries_are_pruned_on_lookup():
+    cache = AnswerCache(ttl=10)
+    cache.put("Soru", CONTEXT, "Cevap", "m", "v1")
+    key = next(iter(cache.by_context.values()))[0]
+    stored = cache.entries.peek(key)
+    cache.entries.put(key, stored, stored_at=1.0)
+    assert cache.lookup("Soru", CONTEXT, "v1") is None
+    assert cache.by_context == {}
+
+def test_ttl_cache_on_evict_runs_outside_the_lock():
+    evicted = []
+    cache = TTLCache(max_size=1, on_evict=lambda k, v: evicted.append((k, v, cache._lock.locked())))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert evicted == [("a", 1, False)]
@@ -0,0 +1,46 @@
+from rag_engine import GENERATION_MODELS
+
+def test_chat_greeting_is_ok(api):
+    response = api.post("/api/chat", json={"question": "Merhaba"})
+    assert response.status_code == 200
+    assert response.json()["prompt"] == "Greeting"
+    assert response.json()["vis_data"] is None
+
+def test_chat_without_context_is_ok(api):
+    response = api.post("/api/chat", json={"question": "zzz qqq xxx"})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["prompt"], body["context_docs"], body["vis_data"]) == ("No Context", [], None)
+
+def test_chat_answers_with_its_context(api):
+    response = api.post("/api/chat", json={"question": "Devletin şekli nedir?"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["context_docs"][0]["metadata"]["konu"] == "Devletin şekli"
+    assert body["answer"].startswith(f"{GENERATION_MODELS[0]} cevabı")
+
+def test_retrieve_without_strong_matches_has_no_handle(api):
+    response = api.post("/api/retrieve", json={"question": "zzz qqq xxx"})
+    assert response.status_code == 200
+    assert response.json()["context_id"] is None
+
+def test_answer_accepts_the_context_handle(api):
+    question = "Kanun önünde eşitlik nedir?"
+    retrieved = api.post("/api/retrieve", json={"question": question}).json()
+    response = api.post("/api/answer", json={"question": question, "context_id": retrieved["context_id"]})
+    assert response.status_code == 200
+    assert "Kanun önünde eşitlik" in response.json()["prompt"]
+
+def test_expired_handle_without_docs_is_409(api):
+    response = api.post("/api/answer", json={"question": "Devletin şekli nedir?", "context_id": "gone"})
+    assert response.status_code == 409
+
+def test_expired_handle_falls_back_to_inline_docs(api):
+    question = "Devletin şekli nedir?"
+    docs = api.post("/api/retrieve", json={"question": question}).json()["context_docs"]
+    response = api.post("/api/answer", json={"question": question, "context_id": "gone", "context_docs": docs})
+    assert response.status_code == 200
+
+def test_explicit_nulls_are_accepted(api):
+    response = api.post("/api/answer", json={"question": "Merhaba", "context_docs": None, "context_id": None})
+    assert response.status_code == 200
@@ -0,0 +1,46 @@
+import gzip
+import json
+import pytest
+
+@pytest.fixture
+def client():
+    import main
+    from fastapi.testclient import TestClient
+    return TestClient(main.app)
+
+def test_full_listing_is_sorted_per_source(client):
+    articles = client.get("/api/legislation", params={"source": "Anayasa"}).json()["articles"]
+    numbers = [a["madde_no"] for a in articles]
+    assert numbers == sorted(numbers) and numbers[0] == 1
+    assert {a["metadata"]["source"] for a in articles} == {"Anayasa"}
+
+def test_etag_round_trip_gives_304(client):
+    first = client.get("/api/legislation", params={"mode": "toc"})
+    etag = first.headers["etag"]
+    second = client.get("/api/legislation", params={"mode": "toc"}, headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert second.status_code == 304 and second.content == b""
+    assert second.headers["etag"] == etag
+
+def test_gzip_only_when_accepted(client):
+    import main
+    prepared = main.get_legislation_store().toc(None)
+    assert gzip.decompress(prepared.gzipped) == prepared.body
+    plain = client.get("/api/legislation", params={"mode": "toc"}, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["vary"]
+
+def test_toc_has_no_bodies_and_paging_slices(client):
+    toc = client.get("/api/legislation", params={"mode": "toc", "source": "Anayasa"}).json()
+    assert "text" not in toc["articles"][0] and toc["total"] == len(toc["articles"])
+    page = client.get("/api/legislation", params={"source": "Anayasa", "offset": 2, "limit": 3}).json()
+    assert [a["madde_no"] for a in page["articles"]] == [a["madde_no"] for a in toc["articles"][2:5]]
+    assert page["total"] == toc["total"]
+
+def test_single_article(client):
+    response = client.get("/api/legislation/Anayasa/1")
+    assert response.status_code == 200
+    assert json.loads(response.content)["articles"][0]["metadata"]["konu"] == "Devletin şekli"
+
+@pytest.mark.parametrize("path", ["/api/legislation/Anayasa/9999", "/api/legislation/Yok Kanunu/1"])
+def test_missing_article_is_404(client, path):
+    assert client.get(path).status_code == 404
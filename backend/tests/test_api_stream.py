@@ -0,0 +1,63 @@
+import json
+from gemini_client import GeminiError
+from rag_engine import GENERATION_MODELS
+
+def sse_events(text: str) -> list:
+    """(event, data) pairs; every frame must be 'event: ...' + 'data: <json>' + blank line."""
+    assert text.endswith("\n\n")
+    events = []
+    for frame in text[:-2].split("\n\n"):
+        event_line, data_line = frame.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        events.append((event_line[7:], json.loads(data_line[6:])))
+    return events
+
+def retrieved(api, question):
+    return api.post("/api/retrieve", json={"question": question}).json()["context_docs"]
+
+def stream(api, body):
+    response = api.post("/api/answer_stream", json=body)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    return sse_events(response.text)
+
+def test_event_order_and_payloads(api):
+    question = "Devletin şekli nedir?"
+    events = stream(api, {"question": question, "context_docs": retrieved(api, question)})
+    names = [name for name, _ in events]
+    assert names[:2] == ["sources", "vis"] and names[-1] == "done"
+    assert set(names[2:-1]) == {"token"}
+    assert "".join(data["text"] for name, data in events if name == "token") == "Cevap parça parça."
+    assert "text" not in events[0][1]["context_docs"][0] # Sources carry no article bodies
+    assert events[-1][1]["model"] == GENERATION_MODELS[0]
+    assert "AI Güveni" in events[-1][1]["footer"]
+
+def test_greeting_is_one_token_and_done(api):
+    events = stream(api, {"question": "Merhaba", "context_docs": []})
+    assert [name for name, _ in events] == ["token", "done"]
+    assert events[1][1]["prompt"] == "Greeting"
+
+def test_second_stream_is_served_from_the_answer_cache(api, fake_client):
+    question = "Kanun önünde eşitlik nedir?"
+    body = {"question": question, "context_docs": retrieved(api, question)}
+    stream(api, body)
+    events = stream(api, body)
+    assert fake_client.generated == [GENERATION_MODELS[0]]
+    assert "önbellek" in events[-1][1]["footer"]
+
+def test_all_models_failing_sends_one_error_event(api, fake_client):
+    for model in GENERATION_MODELS:
+        fake_client.behaviour[model] = GeminiError("down", 503)
+    question = "Devletin şekli nedir?"
+    events = stream(api, {"question": question, "context_docs": retrieved(api, question)})
+    assert events[-1][0] == "error" and events[-1][1]["status"] is None # Failed models, not the deadline
+    assert "token" not in [name for name, _ in events]
+
+def test_deadline_is_reported_as_a_504_error_event(api):
+    question = "Devletin şekli nedir?"
+    body = {"question": question, "context_docs": retrieved(api, question)}
+    response = api.post("/api/answer_stream", json=body, headers={"X-Request-Timeout-Ms": "100"})
+    name, data = sse_events(response.text)[-1]
+    assert (name, data["status"]) == ("error", 504)
+    assert "meşgul" in data["message"]
@@ -0,0 +1,39 @@
+import numpy as np
+from benchmark import ARTICLES_PER_SOURCE, STAGES, FakeEmbedder, bench_size, compare, synthetic_chunks, synthetic_questions
+
+VOCABULARY = [f"kelime{i}" for i in range(500)]
+
+def report(load_s=0.1, p50_ms=1.0, peak_kb=100.0, docs=200):
+    stages = {stage: {"p50_ms": p50_ms, "peak_kb": peak_kb} for stage in STAGES}
+    return {"results": [{"docs": docs, "load_s": load_s, "stages": stages}]}
+
+def test_compare_flags_only_real_regressions():
+    baseline = report()
+    assert compare(report(p50_ms=1.4), baseline, tolerance=0.5) == []
+    assert compare(report(p50_ms=1.02, peak_kb=150), baseline, tolerance=0.01) == [] # Below MIN_DELTA_*
+    slower = compare(report(p50_ms=2.0), baseline, tolerance=0.5)
+    assert {r["metric"] for r in slower} == {f"{stage}.p50_ms" for stage in STAGES}
+    assert slower[0]["ratio"] == 2.0
+    assert compare(report(p50_ms=9.0, docs=10000), baseline, tolerance=0.5) == [] # Size not in the baseline
+
+def test_synthetic_corpus_shape():
+    chunks = synthetic_chunks(ARTICLES_PER_SOURCE + 10, VOCABULARY)
+    assert len({c["id"] for c in chunks}) == len(chunks)
+    assert chunks[0]["metadata"]["source"] == "Anayasa"
+    assert chunks[ARTICLES_PER_SOURCE]["id"] == "Kanun 1 MADDE 1"
+    assert synthetic_chunks(30, VOCABULARY) == chunks[:30] # Same seed, same corpus
+    assert len(synthetic_questions(chunks, 7)) == 7
+
+def test_fake_embedder_puts_shared_words_close():
+    embedder = FakeEmbedder(64)
+    a, b, c = (embedder.embed(t) for t in ("ayrımcılık yasağı", "ayrımcılık yasağı nedir", "başkent ankara"))
+    cos = lambda x, y: float(x @ y / np.linalg.norm(x) / np.linalg.norm(y))
+    assert np.array_equal(a, FakeEmbedder(64).embed("ayrımcılık yasağı"))
+    assert cos(a, b) > cos(a, c)
+    assert not embedder.embed("").any()
+
+def test_bench_size_smoke(tmp_path):
+    result = bench_size(60, VOCABULARY, queries=12, dim=32, work_dir=str(tmp_path))
+    assert result["docs"] == 60 and not result["ann"]
+    assert set(result["stages"]) == set(STAGES)
+    assert all(s["p50_ms"] >= 0 and s["peak_kb"] >= 0 for s in result["stages"].values())
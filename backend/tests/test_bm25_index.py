@@ -0,0 +1,28 @@
+from bm25_index import BM25Field, BM25Index, tokenize
+
+def test_tokenize_is_turkish_aware_and_stems():
+    assert tokenize("İNSAN Hakları, ırk ve DİL") == ["insan", "hakla", "ırk", "ve", "dil"]
+    assert tokenize("Madde 3 – a") == ["madde", "3"]
+
+def test_rarer_terms_weigh_more():
+    field = BM25Field(["devlet cumhuriyet", "devlet meclis", "devlet bayrak"])
+    scores = field.score(tokenize("devlet bayrak"))
+    assert scores[2] > scores[0] == scores[1] > 0
+
+def test_scores_are_normalized_and_only_cover_matches():
+    field = BM25Field(["devlet cumhuriyet", "devlet meclis", "başkent ankara"])
+    scores = field.score(tokenize("devlet cumhuriyet yok"))
+    assert set(scores) == {0, 1}
+    assert all(0 < s <= 1 for s in scores.values())
+    assert field.score(["bilinmeyen"]) == {}
+
+def test_field_weights_cap_the_boost():
+    index = BM25Index({"konu": ["Devletin şekli", "Meclis"], "text": ["Cumhuriyet", "Devletin meclisi"]})
+    scores = index.score("devletin şekli", {"konu": 0.2, "text": 0.05})
+    assert scores[0] > scores[1] > 0
+    assert scores[0] <= 0.25
+
+def test_ranking_follows_the_topic(engine):
+    scores = engine.bm25.score("Kanun önünde eşitlik nedir?", {"konu": 0.2, "text": 0.05})
+    best = max(scores, key=scores.get)
+    assert engine.vector_store.metadatas[best]["konu"] == "Kanun önünde eşitlik"
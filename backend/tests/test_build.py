@@ -0,0 +1,52 @@
+import json
+import numpy as np
+import pytest
+
+pytest.importorskip("fitz") # build -> ingest_all -> data_processor
+import build
+from build import Build
+
+def chunk(madde, text):
+    return {"id": f"MADDE {madde}", "text": text, "metadata": {"source": "Anayasa", "madde": madde, "konu": f"Konu {madde}"}}
+
+@pytest.fixture
+def embedded(monkeypatch, fake_client):
+    """build.embed_chunks backed by the fake client; returns the list of texts embedded per call."""
+    calls = []
+    def embed_chunks(chunks, model, checkpoint_path=None):
+        calls.append([c["text"] for c in chunks])
+        return [dict(c, embedding=fake_client._vector(c["text"])) for c in chunks]
+    monkeypatch.setattr(build, "embed_chunks", embed_chunks)
+    return calls
+
+def test_only_changed_chunks_are_reembedded(tmp_path, embedded):
+    builder = Build(data_dir=str(tmp_path))
+    chunks = [chunk(1, "Bir"), chunk(2, "İki"), chunk(3, "Üç")]
+    first = builder.embed(chunks)
+    assert embedded == [["Bir", "İki", "Üç"]]
+
+    chunks[1] = chunk(2, "İki (değişik)")
+    second = builder.embed(chunks)
+    assert embedded[1:] == [["İki (değişik)"]]
+    assert first["MADDE 1"] == second["MADDE 1"] and first["MADDE 2"] != second["MADDE 2"]
+
+    with open(builder.embeddings_path) as f:
+        records = json.load(f)
+    assert [r["text"] for r in records] == ["Bir", "İki (değişik)", "Üç"]
+
+def test_unchanged_chunks_leave_the_embeddings_file_alone(tmp_path, embedded):
+    builder = Build(data_dir=str(tmp_path))
+    chunks = [chunk(1, "Bir"), chunk(2, "İki")]
+    builder.embed(chunks)
+    mtime = (tmp_path / "embeddings_gemini.json").stat().st_mtime_ns
+    builder.embed(chunks)
+    assert len(embedded) == 1
+    assert (tmp_path / "embeddings_gemini.json").stat().st_mtime_ns == mtime
+
+def test_stale_points_land_next_to_their_nearest_neighbour():
+    matrix = np.array([[1.0, 0.0], [0.0, 1.0], [0.99, 0.14]], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    xy = np.array([[0.1, 0.1], [0.9, 0.9], [0.0, 0.0]])
+    placed = Build.place(matrix, xy, np.array([False, False, True]), k=2)
+    assert np.allclose(placed[:2], xy[:2])
+    assert np.linalg.norm(placed[2] - xy[0]) < 0.05
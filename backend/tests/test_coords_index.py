@@ -0,0 +1,50 @@
+import json
+import pytest
+from coords_index import CoordsIndex
+
+POINTS = [
+    {"id": "MADDE 1", "x": 0.2, "y": 0.4, "madde": 1, "source": "Anayasa"},
+    {"id": "MADDE 1 tekrar", "x": 0.9, "y": 0.9, "madde": 1, "source": "Anayasa"},
+    {"id": "TIHEK Kanunu MADDE 1", "x": 0.8, "y": 0.1, "madde": 1, "source": "TIHEK Kanunu"},
+]
+
+@pytest.fixture
+def index(tmp_path):
+    path = tmp_path / "visualization_coords.json"
+    path.write_text(json.dumps(POINTS), encoding="utf-8")
+    return CoordsIndex(str(path))
+
+def test_lookup_first_point_wins_and_matches_loosely(index):
+    assert index.lookup("Anayasa", 1)["id"] == "MADDE 1"
+    assert index.lookup("anayasa", "1")["id"] == "MADDE 1"
+    assert index.lookup("TIHEK", 1)["id"] == "TIHEK Kanunu MADDE 1"
+    assert index.lookup("Anayasa", 2) is None
+    assert index.lookup("Başka Kanun", 1) is None
+
+def test_vis_data_is_a_weighted_query_point(index, monkeypatch):
+    import main
+    monkeypatch.setattr(main, "coords_index", index)
+    docs = [
+        {"metadata": {"source": "Anayasa", "madde": 1}, "score": 1.0},
+        {"metadata": {"source": "TIHEK Kanunu", "madde": 1}, "score": 1.0},
+        {"metadata": {"source": "Anayasa", "madde": 99}, "score": 1.0},
+    ]
+    vis = main.calculate_vis_data(docs)
+    assert vis.matched_ids == ["MADDE 1", "TIHEK Kanunu MADDE 1"]
+    assert vis.query_point["x"] == pytest.approx(0.5) and vis.query_point["y"] == pytest.approx(0.25)
+    assert vis.map_version == index.version and vis.map_points is None
+    assert main.calculate_vis_data([]) is None
+
+def test_map_endpoint_versions(index, monkeypatch):
+    import main
+    from fastapi.testclient import TestClient
+    monkeypatch.setattr(main, "coords_index", index)
+    client = TestClient(main.app)
+
+    latest = client.get("/api/map")
+    assert latest.json() == {"version": index.version, "map_points": POINTS}
+    assert "immutable" not in latest.headers["cache-control"]
+    pinned = client.get("/api/map", params={"v": index.version})
+    assert "immutable" in pinned.headers["cache-control"]
+    stale = client.get("/api/map", params={"v": "old"})
+    assert "immutable" not in stale.headers["cache-control"]
@@ -0,0 +1,81 @@
+import asyncio
+from embedding_batcher import EmbeddingBatcher
+from gemini_client import GeminiError
+
+class RecordingClient:
+    """Vector = [len(text)]; records every call. batch_reply overrides what abatch_embed returns."""
+
+    def __init__(self, delay=0.0, batch_reply=None):
+        self.calls = []
+        self.delay = delay
+        self.batch_reply = batch_reply
+
+    async def aembed(self, model_name, text, task_type=None):
+        self.calls.append([text])
+        await asyncio.sleep(self.delay)
+        return [float(len(text))]
+
+    async def abatch_embed(self, model_name, texts, task_type=None):
+        self.calls.append(list(texts))
+        await asyncio.sleep(self.delay)
+        if isinstance(self.batch_reply, Exception):
+            raise self.batch_reply
+        return self.batch_reply if self.batch_reply is not None else [[float(len(t))] for t in texts]
+
+def gather(batcher, texts):
+    async def main():
+        return await asyncio.gather(*[batcher.embed(t) for t in texts], return_exceptions=True)
+    return asyncio.run(main())
+
+def test_concurrent_misses_share_one_call():
+    client = RecordingClient()
+    batcher = EmbeddingBatcher(client, "m", window=0.01)
+    assert gather(batcher, ["a", "bb", "a", "ccc"]) == [[1.0], [2.0], [1.0], [3.0]]
+    assert client.calls == [["a", "bb", "ccc"]] # Duplicate text embedded once
+    assert batcher.stats()["max_batch_seen"] == 3
+
+def test_lone_request_uses_plain_embed():
+    client = RecordingClient()
+    assert gather(EmbeddingBatcher(client, "m", window=0.01), ["a"]) == [[1.0]]
+    assert client.calls == [["a"]]
+
+def test_full_batch_goes_out_without_waiting_for_the_window():
+    client = RecordingClient()
+    batcher = EmbeddingBatcher(client, "m", window=10, max_batch=2)
+    assert gather(batcher, ["a", "bb"]) == [[1.0], [2.0]]
+
+def test_window_zero_disables_batching():
+    client = RecordingClient()
+    gather(EmbeddingBatcher(client, "m", window=0), ["a", "bb"])
+    assert sorted(client.calls) == [["a"], ["bb"]]
+
+def test_errors_reach_every_caller():
+    client = RecordingClient(batch_reply=GeminiError("busy", 503))
+    results = gather(EmbeddingBatcher(client, "m", window=0.01), ["a", "bb"])
+    assert all(isinstance(r, GeminiError) and r.status_code == 503 for r in results)
+
+def test_short_reply_fails_the_leftover_callers():
+    client = RecordingClient(batch_reply=[[9.0]])
+    first, second = gather(EmbeddingBatcher(client, "m", window=0.01), ["a", "bb"])
+    assert first == [9.0]
+    assert isinstance(second, GeminiError) and "1 vectors for 2 texts" in str(second)
+
+def test_callers_stop_waiting_after_the_timeout():
+    client = RecordingClient(delay=5)
+    batcher = EmbeddingBatcher(client, "m", window=0.001, timeout=0.05)
+    results = gather(batcher, ["a", "bb"])
+    assert all(isinstance(r, GeminiError) and r.status_code == 504 for r in results)
+
+def test_batcher_survives_a_new_event_loop():
+    client = RecordingClient()
+    batcher = EmbeddingBatcher(client, "m", window=0.01)
+    assert gather(batcher, ["a"]) == [[1.0]]
+    assert gather(batcher, ["bb"]) == [[2.0]]
+
+def test_store_fans_out_concurrent_queries(store, fake_client):
+    async def main():
+        questions = [f"Soru {i % 10}" for i in range(50)]
+        return questions, await asyncio.gather(*[store.aembed_query(q) for q in questions])
+    questions, vectors = asyncio.run(main())
+    assert all(v == fake_client._vector(q) for q, v in zip(questions, vectors))
+    assert fake_client.calls["batch_embed"] == 1 and fake_client.calls["embed"] == 0
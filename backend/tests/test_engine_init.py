@@ -0,0 +1,63 @@
+import threading
+import time
+import pytest
+
+class SlowEngine:
+    """RAGEngine stand-in whose load takes a while (and can be made to fail)."""
+    loads = 0
+    fail = False
+
+    def __init__(self):
+        self.vector_store = None
+        self.client = self
+
+    def _initialize_lazy(self):
+        time.sleep(0.1)
+        SlowEngine.loads += 1
+        if SlowEngine.fail:
+            raise RuntimeError("index missing")
+
+    async def awarm_up(self):
+        pass
+
+@pytest.fixture
+def cold(monkeypatch):
+    import main
+    SlowEngine.loads, SlowEngine.fail = 0, False
+    monkeypatch.setattr(main, "RAGEngine", SlowEngine)
+    monkeypatch.setattr(main, "engine", None)
+    monkeypatch.setattr(main, "engine_state", "cold")
+    monkeypatch.setattr(main, "engine_error", None)
+    return main
+
+def test_concurrent_first_requests_load_once(cold):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cold.get_engine())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert SlowEngine.loads == 1
+    assert len(results) == 8 and all(r is results[0] for r in results)
+    assert cold.engine_state == "warm"
+
+def test_ready_reports_cold_then_warm(cold):
+    from fastapi.testclient import TestClient
+    client = TestClient(cold.app)
+    response = client.get("/api/ready")
+    assert (response.status_code, response.json()) == (503, {"status": "cold"})
+    response = client.post("/api/warmup")
+    assert (response.status_code, response.json()) == (200, {"status": "warm"})
+    assert client.get("/api/ready").status_code == 200
+
+def test_failed_load_is_reported_and_retried(cold):
+    from fastapi.testclient import TestClient
+    client = TestClient(cold.app)
+    SlowEngine.fail = True
+    response = client.get("/api/warmup")
+    assert response.status_code == 503
+    assert response.json() == {"status": "failed", "error": "index missing"}
+
+    SlowEngine.fail = False
+    assert client.get("/api/warmup").status_code == 200
+    assert SlowEngine.loads == 2
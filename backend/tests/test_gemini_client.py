@@ -0,0 +1,80 @@
+import asyncio
+import httpx
+import pytest
+from gemini_client import GeminiClient, GeminiError
+
+def scripted(responses, seen):
+    """MockTransport handler answering with `responses` in order (a status, or (status, headers))."""
+    def handler(request):
+        seen.append(request)
+        status, headers = responses.pop(0) if isinstance(responses[0], tuple) else (responses.pop(0), {})
+        if status == 200:
+            return httpx.Response(200, json={"embedding": {"values": [0.1, 0.2]}})
+        return httpx.Response(status, headers=headers, text="busy")
+    return handler
+
+def client_with(handler, **kwargs):
+    client = GeminiClient("secret-key", base_url="https://gemini.test/v1beta", backoff=0, **kwargs)
+    client._sync_client = httpx.Client(headers=client.headers, transport=httpx.MockTransport(handler))
+    return client
+
+def test_key_travels_in_a_header_not_the_url():
+    seen = []
+    client = client_with(scripted([200], seen))
+    assert client.embed("models/text-embedding-004", "soru") == [0.1, 0.2]
+    assert seen[0].headers["x-goog-api-key"] == "secret-key"
+    assert "secret-key" not in str(seen[0].url)
+    assert str(seen[0].url) == "https://gemini.test/v1beta/models/text-embedding-004:embedContent"
+
+def test_retries_transient_errors_then_succeeds():
+    seen = []
+    client = client_with(scripted([503, (429, {"retry-after": "0"}), 200], seen))
+    assert client.embed("text-embedding-004", "soru") == [0.1, 0.2]
+    assert len(seen) == 3
+
+def test_gives_up_with_status_and_retry_after():
+    seen = []
+    client = client_with(scripted([(429, {"retry-after": "0"}), (429, {"retry-after": "7"})], seen), max_retries=1)
+    with pytest.raises(GeminiError) as error:
+        client.embed("text-embedding-004", "soru")
+    assert (error.value.status_code, error.value.retry_after, len(seen)) == (429, 7.0, 2)
+
+def test_client_errors_are_not_retried():
+    seen = []
+    client = client_with(scripted([400, 200], seen))
+    with pytest.raises(GeminiError) as error:
+        client.embed("text-embedding-004", "soru")
+    assert error.value.status_code == 400 and len(seen) == 1
+
+def test_unreachable_api_raises_gemini_error():
+    def handler(request):
+        raise httpx.ConnectError("refused")
+    with pytest.raises(GeminiError, match="unreachable"):
+        client_with(handler, max_retries=1).embed("text-embedding-004", "soru")
+
+def test_async_stream_yields_text_pieces():
+    body = (
+        'data: {"candidates": [{"content": {"parts": [{"text": "Mer"}]}}]}\n\n'
+        'data: not json\n\n'
+        'data: {"candidates": [{"content": {"parts": [{"text": "haba"}]}}]}\n\n'
+    )
+    def handler(request):
+        assert request.url.params["alt"] == "sse"
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    async def collect():
+        client = GeminiClient("k", base_url="https://gemini.test/v1beta")
+        client._async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client._async_loop = asyncio.get_running_loop()
+        return [piece async for piece in client.astream_generate("gemini-2.0-flash", "Merhaba de")]
+    assert asyncio.run(collect()) == ["Mer", "haba"]
+
+def test_async_client_of_a_finished_loop_is_closed():
+    client = GeminiClient("key", base_url="https://gemini.test/v1beta")
+    async def current():
+        return client.async_client
+    first = asyncio.run(current())
+    assert first.is_closed # Closed when asyncio.run() shut its loop down
+    second = asyncio.run(current())
+    assert second is not first and second.is_closed
+    assert not client._closers
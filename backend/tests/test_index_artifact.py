@@ -0,0 +1,66 @@
+import json
+import os
+import numpy as np
+from index_artifact import convert_json, load_index
+
+def load(path):
+    from vector_store_vercel import VectorStoreVercel
+    return VectorStoreVercel(path)
+
+def test_compiled_index_matches_json(embeddings_path, fake_client):
+    from_json = load(embeddings_path)
+    convert_json(embeddings_path)
+    compiled = load(embeddings_path)
+
+    assert isinstance(compiled.matrix, np.memmap)
+    assert compiled.ids == from_json.ids
+    assert compiled.texts == from_json.texts
+    assert compiled.metadatas == from_json.metadatas
+    assert np.allclose(compiled.matrix, from_json.matrix, atol=1e-7)
+    query = fake_client._vector("insan hakları")
+    assert compiled.search(query, 5) == from_json.search(query, 5)
+
+def test_sidecar_records_the_source_json(embeddings_path):
+    convert_json(embeddings_path)
+    _, sidecar = load_index(os.path.splitext(embeddings_path)[0])
+    assert sidecar["source_json"]["size"] == os.path.getsize(embeddings_path)
+    assert sidecar["count"] == len(sidecar["ids"])
+
+def test_reembedded_json_wins_over_stale_index(embeddings_path, records, fake_client, capsys):
+    convert_json(embeddings_path)
+    records[0]["embedding"] = [-x for x in records[0]["embedding"]]
+    with open(embeddings_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False)
+
+    store = load(embeddings_path)
+    assert "changed after" in capsys.readouterr().out
+    assert not isinstance(store.matrix, np.memmap)
+    assert np.allclose(store.scores(records[0]["embedding"])[0], 1.0, atol=1e-6)
+
+def test_touched_but_identical_json_keeps_the_index(embeddings_path, fake_client):
+    convert_json(embeddings_path)
+    stat = os.stat(embeddings_path)
+    os.utime(embeddings_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9)) # e.g. a fresh checkout
+    assert isinstance(load(embeddings_path).matrix, np.memmap)
+
+def test_checkout_is_hashed_once_then_trusted_by_mtime(embeddings_path, fake_client, monkeypatch):
+    import index_artifact
+    convert_json(embeddings_path)
+    stat = os.stat(embeddings_path)
+    os.utime(embeddings_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert isinstance(load(embeddings_path).matrix, np.memmap) # Hashes, then records the new mtime
+
+    def no_hashing(*args, **kwargs):
+        raise AssertionError("hashed the JSON again")
+    monkeypatch.setattr(index_artifact, "file_fingerprint", no_hashing)
+    assert isinstance(load(embeddings_path).matrix, np.memmap)
+
+def test_read_only_sidecar_still_loads(embeddings_path, fake_client, monkeypatch):
+    import index_artifact
+    convert_json(embeddings_path)
+    stat = os.stat(embeddings_path)
+    os.utime(embeddings_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    def read_only(*args, **kwargs):
+        raise PermissionError("read-only file system")
+    monkeypatch.setattr(index_artifact, "_write_sidecar", read_only)
+    assert isinstance(load(embeddings_path).matrix, np.memmap)
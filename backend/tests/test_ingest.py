@@ -0,0 +1,45 @@
+import json
+import pytest
+
+pytest.importorskip("fitz") # data_processor parses PDFs with PyMuPDF
+from data_processor import DataProcessor
+from ingest_all import ingest_document, merge_parts
+
+PAGES = [
+    (1, "I. Devletin şekli\nMADDE 1 – Türkiye Devleti bir Cumhuriyettir.\n"),
+    (2, "II. Cumhuriyetin nitelikleri\nMADDE 2 – Türkiye Cumhuriyeti\nbir hukuk Devletidir.\nMADDE 2 – Tekrar.\n"),
+    (3, "MADDE 3 – Bu Kanun yayımı tarihinde yürürlüğe girer.\nMADDE 4 – Son madde.\n"),
+]
+
+def processor(source="Anayasa"):
+    p = DataProcessor("unused.pdf", source_name=source)
+    p.pages = list(PAGES)
+    return p
+
+def test_streaming_and_list_split_agree():
+    p = processor()
+    streamed = list(p.iter_articles(iter(PAGES)))
+    assert streamed == p.split_into_articles()
+    assert [a["id"] for a in streamed] == ["MADDE 1", "MADDE 2", "MADDE 2_1", "MADDE 4"]
+    assert streamed[1]["text"] == "KONU: Cumhuriyetin nitelikleri\nMADDE 2 – Türkiye Cumhuriyeti bir hukuk Devletidir."
+    assert [a["metadata"]["page"] for a in streamed] == [1, 2, 2, 3]
+
+def test_merge_keeps_json_dump_layout_and_unique_ids(tmp_path, monkeypatch):
+    parts = []
+    for i, source in enumerate(["Anayasa", "Anayasa"]):
+        part = tmp_path / f"{i}.jsonl"
+        monkeypatch.setattr(DataProcessor, "iter_pages", lambda self: iter(PAGES))
+        ingest_document({"path": "unused.pdf", "source": source}, str(part))
+        parts.append(str(part))
+
+    total = merge_parts(parts, str(tmp_path / "chunks.jsonl"), str(tmp_path / "chunks.json"))
+    merged = json.loads((tmp_path / "chunks.json").read_text(encoding="utf-8"))
+    assert total == len(merged) == 8
+    assert len({a["id"] for a in merged}) == 8
+    assert (tmp_path / "chunks.json").read_text(encoding="utf-8") == json.dumps(merged, ensure_ascii=False, indent=2)
+    lines = (tmp_path / "chunks.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(l) for l in lines] == merged
+
+def test_merge_of_nothing_is_an_empty_list(tmp_path):
+    assert merge_parts([], str(tmp_path / "c.jsonl"), str(tmp_path / "c.json")) == 0
+    assert json.loads((tmp_path / "c.json").read_text()) == []
@@ -0,0 +1,51 @@
+import argparse
+import json
+import pytest
+from fastapi.testclient import TestClient
+import mock_gemini
+from stress_test import Stats, parse_mix
+
+@pytest.fixture
+def mock(monkeypatch):
+    monkeypatch.setitem(mock_gemini.MOCK_CONFIG, "latency", 0)
+    monkeypatch.setitem(mock_gemini.MOCK_CONFIG, "dim", 8)
+    return TestClient(mock_gemini.app)
+
+def test_stats_report_percentiles_and_errors():
+    stats = Stats()
+    for ms in range(1, 101):
+        stats.record("retrieve", 200, ms / 1000)
+    stats.record("retrieve", 503, 0.5)
+    report = stats.report(elapsed=2.0)
+    entry = report["endpoints"]["retrieve"]
+    assert (entry["requests"], entry["errors"], entry["statuses"]) == (101, 1, {"200": 100, "503": 1})
+    assert entry["latency_ms"]["p50"] == 50.5 and entry["latency_ms"]["max"] == 100.0
+    assert report["throughput_rps"] == 50.5
+
+def test_parse_mix():
+    assert parse_mix("retrieve=5,answer,chat=0.5") == {"retrieve": 5.0, "answer": 1.0, "chat": 0.5}
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix("upload=1")
+
+def test_mock_embeddings_are_deterministic(mock):
+    body = {"content": {"parts": [{"text": "soru"}]}}
+    first = mock.post("/v1beta/models/text-embedding-004:embedContent", json=body).json()
+    again = mock.post("/v1beta/models/text-embedding-004:embedContent", json=body).json()
+    assert first == again and len(first["embedding"]["values"]) == 8
+    batch = mock.post("/v1beta/models/text-embedding-004:batchEmbedContents", json={"requests": [body, body]}).json()
+    assert [e["values"] for e in batch["embeddings"]] == [first["embedding"]["values"]] * 2
+
+def test_mock_down_model_and_quota(mock, monkeypatch):
+    monkeypatch.setitem(mock_gemini.MOCK_CONFIG, "down_models", ["gemini-x"])
+    body = {"contents": [{"parts": [{"text": "soru"}]}]}
+    assert mock.post("/v1beta/models/gemini-x:generateContent", json=body).status_code == 503
+    monkeypatch.setitem(mock_gemini.MOCK_CONFIG, "rate_429", 1.0)
+    response = mock.post("/v1beta/models/gemini-y:generateContent", json=body)
+    assert response.status_code == 429 and response.headers["retry-after"]
+
+def test_mock_streams_sse_pieces(mock):
+    body = {"contents": [{"parts": [{"text": "soru"}]}]}
+    response = mock.post("/v1beta/models/gemini-y:streamGenerateContent?alt=sse", json=body)
+    events = [json.loads(block[len("data: "):]) for block in response.text.split("\r\n\r\n") if block]
+    text = "".join(e["candidates"][0]["content"]["parts"][0]["text"] for e in events)
+    assert len(events) > 1 and text.startswith("[gemini-y]")
@@ -0,0 +1,41 @@
+import httpx
+from gemini_client import GeminiClient
+from metrics import BUCKETS, STAGE_SECONDS, HistogramFamily, server_timing_header
+
+def stage_count(name):
+    child = STAGE_SECONDS.children.get((name,))
+    return child.count if child else 0
+
+def test_histogram_renders_cumulative_buckets():
+    family = HistogramFamily("demo_seconds", "Demo", ["stage"])
+    for seconds in (0.0002, 0.003, 0.003, 100.0):
+        family.observe(seconds, 'a"b')
+    lines = family.render()
+    assert lines[:2] == ["# HELP demo_seconds Demo", "# TYPE demo_seconds histogram"]
+    buckets = [int(l.rsplit(" ", 1)[1]) for l in lines if "_bucket" in l]
+    assert len(buckets) == len(BUCKETS) + 1
+    assert buckets == sorted(buckets) and buckets[0] == 1 and buckets[-1] == 4
+    assert 'demo_seconds_bucket{stage="a\\"b",le="0.005"} 3' in lines
+    assert 'demo_seconds_count{stage="a\\"b"} 4' in lines
+
+def test_server_timing_header_format():
+    header = server_timing_header([("embed", 12.345, None), ("generate", 800.0, "models/x ok")], 1.0)
+    assert header == 'embed;dur=12.35, generate;desc="models/x ok";dur=800.00, total;dur=1000.00'
+
+def test_retry_waits_are_timed_as_backoff():
+    replies = [httpx.Response(503, text="busy"), httpx.Response(200, json={"embedding": {"values": [1.0]}})]
+    client = GeminiClient("key", base_url="https://gemini.test/v1beta", backoff=0)
+    client._sync_client = httpx.Client(transport=httpx.MockTransport(lambda request: replies.pop(0)))
+    before = stage_count("backoff")
+    assert client.embed("text-embedding-004", "soru") == [1.0]
+    assert stage_count("backoff") == before + 1
+
+def test_requests_carry_server_timing_and_feed_metrics(api):
+    response = api.post("/api/retrieve", json={"question": "Devletin şekli nedir?"})
+    names = [part.split(";")[0] for part in response.headers["server-timing"].split(", ")]
+    assert {"embed", "vector_search", "rerank", "total"} <= set(names)
+    assert names[-1] == "total"
+
+    body = api.get("/api/metrics").text
+    assert 'rag_stage_seconds_count{stage="vector_search"}' in body
+    assert 'http_request_seconds_count{route="/api/retrieve",status="200"}' in body
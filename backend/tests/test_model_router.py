@@ -0,0 +1,144 @@
+import asyncio
+import time
+import pytest
+from conftest import FakeGeminiClient
+from gemini_client import GeminiError
+from model_router import DeadlineExceeded, ModelRouter
+
+# demote_error_rate 1.0: failing models keep their place, so the breaker tests see every attempt
+FAST = {"breaker_failures": 2, "breaker_cooldown": 0.05, "min_attempt": 0.01, "hedge_default_delay": 0.05,
+        "demote_error_rate": 1.0}
+
+def router(config=None, models=("a", "b")):
+    return ModelRouter(FakeGeminiClient(), list(models), {**FAST, **(config or {})})
+
+def generate(r, deadline_in=None):
+    async def main():
+        return await r.generate("prompt", time.monotonic() + deadline_in if deadline_in else None)
+    return asyncio.run(main())
+
+def test_falls_back_to_the_next_model():
+    r = router()
+    r.client.behaviour["a"] = GeminiError("busy", 503)
+    assert generate(r) == ("b cevabı", "b")
+    assert r.client.generated == ["a", "b"]
+
+def test_failing_model_moves_behind_the_healthy_one():
+    r = router({"demote_error_rate": 0.5})
+    r.client.behaviour["a"] = GeminiError("busy", 503)
+    generate(r)
+    r.client.generated.clear()
+    assert generate(r) == ("b cevabı", "b")
+    assert r.client.generated == ["b"]
+    assert r.candidates() == ["b", "a"]
+
+def test_breaker_opens_skips_and_recovers_through_a_probe():
+    r = router()
+    r.client.behaviour["a"] = GeminiError("busy", 503)
+    generate(r)
+    generate(r)
+    assert r.breakers["a"].state == "open"
+    r.client.generated.clear()
+    assert generate(r) == ("b cevabı", "b")
+    assert r.client.generated == ["b"] # No attempt on the open model
+
+    time.sleep(0.06)
+    del r.client.behaviour["a"]
+    assert generate(r) == ("a cevabı", "a") # Half-open probe succeeds
+    assert r.breakers["a"].state == "closed"
+
+def test_failed_probe_doubles_the_cooldown():
+    r = router()
+    r.client.behaviour["a"] = GeminiError("busy", 503)
+    generate(r)
+    generate(r)
+    time.sleep(0.06)
+    generate(r)
+    assert r.breakers["a"].state == "open" and r.breakers["a"].cooldown == pytest.approx(0.1)
+
+def test_bad_requests_do_not_trip_the_breaker():
+    r = router()
+    r.client.behaviour["a"] = GeminiError("bad prompt", 400)
+    for _ in range(3):
+        generate(r)
+    assert r.breakers["a"].state == "closed"
+
+def test_every_breaker_open_is_a_503_with_retry_after():
+    r = router()
+    for model in ("a", "b"):
+        r.client.behaviour[model] = GeminiError("busy", 503, retry_after=1)
+    for _ in range(2):
+        with pytest.raises(GeminiError):
+            generate(r)
+    with pytest.raises(GeminiError) as error:
+        generate(r)
+    assert error.value.status_code == 503 and error.value.retry_after > 0
+
+def test_hedge_starts_the_backup_and_the_first_answer_wins():
+    r = router({"hedging": True})
+    r.client.behaviour["a"] = 1.0
+    started = time.monotonic()
+    assert generate(r) == ("b cevabı", "b")
+    assert time.monotonic() - started < 0.5
+    assert (r.hedges, r.hedge_wins) == (1, 1)
+    assert r.breakers["a"].state == "closed" # Losing a race is not a failure
+
+def test_fast_primary_is_not_hedged():
+    r = router({"hedging": True})
+    assert generate(r) == ("a cevabı", "a")
+    assert r.hedges == 0 and r.client.generated == ["a"]
+
+def test_slow_models_end_at_the_deadline_with_a_504():
+    r = router()
+    r.client.behaviour["a"] = r.client.behaviour["b"] = 1.0
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded) as error:
+        generate(r, deadline_in=0.2)
+    assert error.value.status_code == 504
+    assert time.monotonic() - started < 0.5
+
+def test_no_attempt_starts_without_min_attempt_left():
+    r = router({"min_attempt": 1.0})
+    with pytest.raises(DeadlineExceeded) as error:
+        generate(r, deadline_in=0.5)
+    assert error.value.status_code == 504 and r.client.generated == []
+    assert r.deadline_exceeded == 1
+
+def test_model_timeouts_with_budget_left_are_not_the_deadline():
+    r = router({"attempt_timeout": 0.05})
+    r.client.behaviour["a"] = r.client.behaviour["b"] = 1.0
+    with pytest.raises(GeminiError) as error:
+        generate(r, deadline_in=5)
+    assert error.value.status_code == 504 and not isinstance(error.value, DeadlineExceeded)
+    assert r.deadline_exceeded == 0
+
+def test_answer_past_its_deadline_is_a_504(api):
+    question = "Devletin şekli nedir?"
+    docs = api.post("/api/retrieve", json={"question": question}).json()["context_docs"]
+    # Less than the router's minimum attempt time: the deadline is already gone
+    response = api.post("/api/answer", json={"question": question, "context_docs": docs},
+                        headers={"X-Request-Timeout-Ms": "100"})
+    assert response.status_code == 504
+    assert "meşgul" in response.json()["detail"]
+
+def test_failed_models_still_answer_200_with_the_failure_text(api, fake_client):
+    from rag_engine import GENERATION_MODELS
+    for model in GENERATION_MODELS:
+        fake_client.behaviour[model] = GeminiError("bad prompt", 400)
+    question = "Devletin şekli nedir?"
+    docs = api.post("/api/retrieve", json={"question": question}).json()["context_docs"]
+    response = api.post("/api/answer", json={"question": question, "context_docs": docs})
+    assert response.status_code == 200
+    assert response.json()["answer"].startswith("Üzgünüm")
+
+def test_last_model_timing_out_with_budget_left_answers_200(api, fake_client, monkeypatch):
+    import main
+    from rag_engine import GENERATION_MODELS
+    monkeypatch.setitem(main.engine.router.config, "attempt_timeout", 0.05)
+    for model in GENERATION_MODELS:
+        fake_client.behaviour[model] = 1.0
+    question = "Devletin şekli nedir?"
+    docs = api.post("/api/retrieve", json={"question": question}).json()["context_docs"]
+    response = api.post("/api/answer", json={"question": question, "context_docs": docs})
+    assert response.status_code == 200
+    assert response.json()["answer"].startswith("Üzgünüm")
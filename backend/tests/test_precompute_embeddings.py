@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+import precompute_embeddings
+from gemini_client import GeminiError
+from precompute_embeddings import Checkpoint, aembed_chunks, content_hash, join_queue
+
+def chunks(n):
+    return [{"id": f"MADDE {i}", "text": f"Madde {i} metni", "metadata": {"konu": f"Konu {i}"}} for i in range(n)]
+
+class FlakyClient:
+    """GeminiClient stand-in: failures[i] is raised by the i-th call, later calls succeed."""
+    failures = []
+    calls = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def abatch_embed(self, model, texts, task_type=None, timeout=None):
+        FlakyClient.calls += 1
+        if FlakyClient.failures:
+            raise FlakyClient.failures.pop(0)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    async def aclose(self):
+        pass
+
+@pytest.fixture
+def flaky(monkeypatch):
+    FlakyClient.failures, FlakyClient.calls = [], 0
+    monkeypatch.setattr(precompute_embeddings, "GeminiClient", FlakyClient)
+    monkeypatch.setattr(precompute_embeddings, "RETRY_BASE_DELAY", 0)
+    return FlakyClient
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, timeout=5)) # A hang fails the test instead of the run
+
+def test_unexpected_errors_are_retried(flaky):
+    flaky.failures = [KeyError("embeddings"), ValueError("bad json")]
+    records = run(aembed_chunks(chunks(5), batch_size=2, concurrency=2, rate=1000))
+    assert [r["id"] for r in records] == [f"MADDE {i}" for i in range(5)]
+    assert flaky.calls == 5 # 3 batches + 2 retries
+
+def test_persistent_errors_fail_the_run_instead_of_hanging(flaky):
+    flaky.failures = [KeyError("embeddings")] * 10
+    with pytest.raises(RuntimeError, match="could not be embedded"):
+        run(aembed_chunks(chunks(3), batch_size=1, concurrency=2, rate=1000, max_attempts=2))
+
+def test_rejected_batch_is_split_to_isolate_the_bad_chunk(flaky):
+    flaky.failures = [GeminiError("too long", status_code=400)]
+    records = run(aembed_chunks(chunks(4), batch_size=4, concurrency=1, rate=1000))
+    assert len(records) == 4 and flaky.calls == 3
+
+def test_checkpoint_resumes_and_skips_torn_lines(tmp_path, flaky):
+    path = str(tmp_path / "e.checkpoint.jsonl")
+    done = chunks(3)[:2]
+    checkpoint = Checkpoint(path)
+    checkpoint.add([content_hash(c) for c in done], [[9.0, 9.0]] * 2)
+    checkpoint.close()
+    with open(path, "a") as f:
+        f.write('{"hash": "torn')
+
+    records = run(aembed_chunks(chunks(3), concurrency=1, rate=1000, checkpoint_path=path))
+    assert flaky.calls == 1
+    assert [r["embedding"] for r in records][:2] == [[9.0, 9.0]] * 2
+
+def test_join_queue_raises_once_every_worker_is_gone():
+    async def main():
+        queue = asyncio.Queue()
+        queue.put_nowait("batch")
+        async def broken():
+            raise OSError("disk full")
+        workers = [asyncio.create_task(broken()) for _ in range(2)]
+        with pytest.raises(RuntimeError, match="1 batches left") as info:
+            await join_queue(queue, workers)
+        assert isinstance(info.value.__cause__, OSError)
+    run(main())
@@ -0,0 +1,70 @@
+import os
+import numpy as np
+import pytest
+from ann_index import exact_top_k, sample_queries, synthetic_corpus
+from quantized_index import QuantizedMatrix, build_quantized, load_quantized, quantized_path
+
+@pytest.fixture(scope="module")
+def corpus():
+    matrix = synthetic_corpus(4000, dim=128, clusters=80)
+    return matrix, sample_queries(matrix, 100)
+
+def recall(matrix, quantized, queries, k):
+    truth = exact_top_k(matrix, queries, k)
+    hits = sum(len(set(quantized.search(matrix, q, k)[0].tolist()) & set(t.tolist())) for q, t in zip(queries, truth))
+    return hits / truth.size
+
+@pytest.mark.parametrize("mode, minimum", [("int8", 0.99), ("binary", 0.9)])
+def test_recall_after_rescoring(corpus, mode, minimum):
+    matrix, queries = corpus
+    assert recall(matrix, QuantizedMatrix.from_matrix(matrix, mode), queries, 10) >= minimum
+
+@pytest.mark.parametrize("mode", ["int8", "binary"])
+def test_returned_scores_are_exact(corpus, mode):
+    matrix, queries = corpus
+    ids, scores = QuantizedMatrix.from_matrix(matrix, mode).search(matrix, queries[0], 10)
+    assert np.all(np.diff(scores) <= 0)
+    assert np.allclose(scores, matrix[ids] @ queries[0], atol=1e-6)
+
+def test_int8_approximation_is_close(corpus):
+    matrix, queries = corpus
+    approx = QuantizedMatrix.from_matrix(matrix, "int8").approx_scores(queries[0])
+    assert np.abs(approx - matrix @ queries[0]).max() < 0.02
+
+def test_codes_are_smaller(corpus):
+    matrix, _ = corpus
+    assert QuantizedMatrix.from_matrix(matrix, "int8").nbytes < matrix.nbytes / 3.5
+    assert QuantizedMatrix.from_matrix(matrix, "binary").nbytes == matrix.nbytes / 32
+
+def test_shard_positions_map_back_to_matrix_rows(corpus):
+    matrix, queries = corpus
+    rows = np.arange(1, matrix.shape[0], 3)
+    quantized = QuantizedMatrix.from_matrix(matrix, "int8")
+    ids, _ = quantized.search(matrix, queries[0], 5, rows=rows, row_ids=rows)
+    assert set(ids.tolist()) <= set(rows.tolist())
+    expected = rows[exact_top_k(matrix[rows], queries[:1], 5)[0]]
+    assert ids.tolist() == expected.tolist()
+
+def test_store_uses_the_quantized_pass(embeddings_path, fake_client, monkeypatch):
+    from index_artifact import convert_json
+    from vector_store_vercel import VectorStoreVercel
+    exact = VectorStoreVercel(embeddings_path)
+    convert_json(embeddings_path)
+    prefix = os.path.splitext(embeddings_path)[0]
+    build_quantized(prefix)
+    monkeypatch.setenv("VECTOR_QUANTIZATION", "binary")
+    store = VectorStoreVercel(embeddings_path)
+
+    assert store.quantized is not None and not store.exact_scan
+    query = fake_client._vector("insan hakları")
+    ids, sims = store.nearest(query, 5)
+    expected_ids, expected_sims = exact.nearest(query, 5)
+    assert ids.tolist() == expected_ids.tolist()
+    assert np.allclose(sims, expected_sims, atol=1e-6)
+
+def test_stale_codes_are_ignored(tmp_path, corpus):
+    matrix, _ = corpus
+    prefix = str(tmp_path / "x")
+    QuantizedMatrix.from_matrix(matrix, "int8", version="old").save(quantized_path(prefix, "int8"))
+    assert load_quantized(prefix, "int8", version="old").version == "old"
+    assert load_quantized(prefix, "int8", version="new") is None
@@ -0,0 +1,55 @@
+import asyncio
+import numpy as np
+
+QUESTIONS = ["Devletin şekli nedir?", "Kanun önünde eşitlik nedir?", "Kurumun görevleri nedir?", "Devletin şekli nedir?"]
+
+def test_retrieve_many_matches_single_retrieves(engine):
+    batch = engine.retrieve_many(QUESTIONS)
+    assert len(batch) == len(QUESTIONS)
+    for question, result in zip(QUESTIONS, batch):
+        single = engine.retrieve(question)
+        assert result["metadatas"] == single["metadatas"]
+        assert np.allclose(result["distances"][0], single["distances"][0], atol=1e-6) # mat-mat vs mat-vec rounding
+    assert batch[0]["metadatas"][0][0]["konu"] == "Devletin şekli"
+    assert batch[2]["metadatas"][0][0]["source"] == "TIHEK Kanunu"
+
+def test_retrieve_many_embeds_once_per_distinct_question(engine, fake_client):
+    asyncio.run(engine.aretrieve_many(QUESTIONS))
+    assert fake_client.calls == {"batch_embed": 1}
+    engine.retrieve_many(QUESTIONS) # All cached now
+    assert fake_client.calls == {"batch_embed": 1}
+
+def test_retrieve_batch_endpoint_keeps_order(api):
+    response = api.post("/api/retrieve_batch", json={"questions": QUESTIONS[:3]})
+    assert response.status_code == 200
+    topics = [r["context_docs"][0]["metadata"]["konu"] for r in response.json()["results"]]
+    assert topics == ["Devletin şekli", "Kanun önünde eşitlik", "Kurumun görevleri"]
+
+def test_retrieve_batch_endpoint_rejects_oversized_batches(api):
+    import main
+    response = api.post("/api/retrieve_batch", json={"questions": ["soru"] * (main.MAX_BATCH_QUESTIONS + 1)})
+    assert response.status_code == 400
+
+def sources_and_numbers(result):
+    return [(m["source"], m["madde"]) for m in result["metadatas"][0]]
+
+def test_madde_question_boosts_the_default_source_only(engine):
+    result = sources_and_numbers(engine.retrieve("Madde 1 nedir?"))
+    assert result[0] == ("Anayasa", 1)
+    assert ("TIHEK Kanunu", 1) not in result
+
+def test_madde_question_naming_a_source_boosts_that_source(engine):
+    assert engine.madde_source("TİHEK madde 3 nedir?") == "TIHEK Kanunu"
+    assert sources_and_numbers(engine.retrieve("TİHEK madde 3 nedir?"))[0] == ("TIHEK Kanunu", 3)
+
+def test_source_filter_decides_whose_madde(engine):
+    result = sources_and_numbers(engine.retrieve("Madde 10 nedir?", source="TIHEK Kanunu"))
+    assert result[0] == ("TIHEK Kanunu", 10)
+    assert all(source == "TIHEK Kanunu" for source, _ in result)
+
+def test_keyword_match_outside_the_vector_candidates_is_found(engine, monkeypatch):
+    import rag_engine
+    monkeypatch.setattr(rag_engine, "VECTOR_CANDIDATES", 1)
+    # "ayrımcılık yasağı" is in the topic of TIHEK 3 and the text of TIHEK 10
+    result = sources_and_numbers(engine.retrieve("ayrımcılık yasağı"))
+    assert ("TIHEK Kanunu", 3) in result
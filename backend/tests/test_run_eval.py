@@ -0,0 +1,47 @@
+import json
+import pytest
+import run_eval
+from conftest import ARTICLES
+from run_eval import is_target, run_retrieval_evaluation
+
+@pytest.fixture
+def questions_path(tmp_path, monkeypatch):
+    questions = [{"id": i, "question": f"{konu} nedir?", "target_madde": madde, "source": source}
+                 for i, (source, madde, konu, _) in enumerate(ARTICLES)]
+    path = tmp_path / "test_questions_100.json"
+    path.write_text(json.dumps(questions, ensure_ascii=False), encoding="utf-8")
+    monkeypatch.setattr(run_eval, "QUESTIONS_PATH", str(path))
+    return path
+
+@pytest.fixture
+def evaluate(engine, questions_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(run_eval, "RAGEngine", lambda: engine)
+    replay = str(tmp_path / "query_embeddings.json")
+    return lambda **kw: run_retrieval_evaluation(ks=(1, 3), workers=4, replay_path=replay, output_path="", **kw)
+
+def test_is_target_needs_the_source_too():
+    question = {"target_madde": 3, "source": "TIHEK Kanunu"}
+    assert is_target({"madde": 3, "source": "TIHEK Kanunu"}, question)
+    assert not is_target({"madde": 3, "source": "Anayasa"}, question)
+    assert is_target({"madde": 3}, {"target_madde": 3}) # Both default to Anayasa
+
+def test_first_run_embeds_then_offline_replays(evaluate, fake_client):
+    first = evaluate()
+    assert first["timings"]["embed"]["embedded"] == len(ARTICLES)
+    assert first["recall@3"] == 1.0 and first["mrr@3"] > 0.5
+    calls = sum(fake_client.calls.values())
+
+    again = evaluate(offline=True)
+    assert sum(fake_client.calls.values()) == calls # Nothing embedded twice
+    assert again["timings"]["embed"]["replayed"] == len(ARTICLES)
+    assert {k: again[k] for k in ("recall@1", "recall@3", "mrr@3")} == {k: first[k] for k in ("recall@1", "recall@3", "mrr@3")}
+
+def test_offline_without_a_replay_stops(evaluate):
+    with pytest.raises(SystemExit):
+        evaluate(offline=True)
+
+def test_retrieval_stages_are_reported_separately(evaluate):
+    stages = evaluate()["timings"]["stages_ms"]
+    assert {"lexical", "vector_search", "rerank"} <= set(stages)
+    assert all(s["count"] == len(ARTICLES) and 0 <= s["p50"] <= s["p95"] for name, s in stages.items()
+               if name in ("lexical", "vector_search", "rerank"))
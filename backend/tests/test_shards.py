@@ -0,0 +1,52 @@
+import json
+import numpy as np
+import pytest
+
+def full_scan(store, query, n):
+    sims = store.scores(query)
+    top = store.top_k(sims, n)
+    return top.tolist(), sims[top]
+
+@pytest.fixture
+def interleaved(tmp_path, records, fake_client):
+    """Both sources mixed row by row, so neither shard is a contiguous slice."""
+    from vector_store_vercel import VectorStoreVercel
+    anayasa = [r for r in records if r["metadata"]["source"] == "Anayasa"]
+    tihek = [r for r in records if r["metadata"]["source"] != "Anayasa"]
+    mixed = [r for pair in zip(anayasa, tihek) for r in pair] + anayasa[len(tihek):]
+    path = tmp_path / "embeddings_gemini.json"
+    path.write_text(json.dumps(mixed, ensure_ascii=False), encoding="utf-8")
+    return VectorStoreVercel(str(path))
+
+def test_shards_cover_every_row_once(store):
+    assert store.sources() == ["Anayasa", "TIHEK Kanunu"]
+    rows = np.concatenate([s.rows for s in store.shards.values()])
+    assert sorted(rows.tolist()) == list(range(len(store.ids)))
+    assert all(s.span is not None for s in store.shards.values())
+
+@pytest.mark.parametrize("fixture", ["store", "interleaved"])
+def test_merged_shard_scans_equal_one_full_scan(fixture, request):
+    store = request.getfixturevalue(fixture)
+    for query in np.random.default_rng(2).standard_normal((10, store.matrix.shape[1])):
+        ids, sims = store.nearest(query, 4)
+        expected_ids, expected_sims = full_scan(store, query, 4)
+        assert ids.tolist() == expected_ids
+        assert np.allclose(sims, expected_sims, atol=1e-6)
+
+@pytest.mark.parametrize("fixture", ["store", "interleaved"])
+def test_source_filter_scans_only_that_shard(fixture, request):
+    store = request.getfixturevalue(fixture)
+    query = np.random.default_rng(3).standard_normal(store.matrix.shape[1])
+    ids, sims = store.nearest(query, 10, source="TIHEK Kanunu")
+    assert len(ids) == 4
+    assert all(store.metadatas[i]["source"] == "TIHEK Kanunu" for i in ids)
+    assert np.all(np.diff(sims) <= 0)
+
+def test_unknown_source_finds_nothing(store):
+    assert store.search(store.matrix[0], 5, source="Yok Kanunu") == {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+def test_retrieve_endpoint_passes_the_source_filter(api):
+    body = api.post("/api/retrieve", json={"question": "Eşitlik ilkesi ve ayrımcılık yasağı", "source": "TIHEK Kanunu"}).json()
+    assert {d["metadata"]["source"] for d in body["context_docs"]} == {"TIHEK Kanunu"}
+    body = api.post("/api/retrieve", json={"question": "Kanun önünde eşitlik", "source": "TIHEK Kanunu"}).json()
+    assert all(d["metadata"]["source"] == "TIHEK Kanunu" for d in body["context_docs"])
@@ -0,0 +1,94 @@
+import asyncio
+import httpx
+import pytest
+from single_flight import SingleFlight
+
+def test_identical_keys_share_one_run():
+    runs = []
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.02)
+        return "sonuç"
+    async def main():
+        flights = SingleFlight()
+        results = await asyncio.gather(*[flights.do("k", work) for _ in range(5)], flights.do("other", work))
+        return flights, results
+    flights, results = asyncio.run(main())
+    assert results == ["sonuç"] * 6 and len(runs) == 2
+    assert flights.stats() == {"in_flight": 0, "started": 2, "joined": 4, "join_rate": 0.667}
+
+def test_exceptions_are_shared_and_nothing_is_kept():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+    async def main():
+        flights = SingleFlight()
+        results = await asyncio.gather(flights.do("k", fail), flights.do("k", fail), return_exceptions=True)
+        again = await asyncio.gather(flights.do("k", fail), return_exceptions=True)
+        return flights, results + again
+    flights, results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flights.stats()["started"] == 2 # The later call started a new flight
+
+def test_first_caller_cancelling_does_not_cancel_the_others():
+    async def work():
+        await asyncio.sleep(0.05)
+        return "sonuç"
+    async def main():
+        flights = SingleFlight()
+        first = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+    assert asyncio.run(main()) == "sonuç"
+
+@pytest.fixture
+def flights(api, monkeypatch, fake_client):
+    import main
+    from rag_engine import GENERATION_MODELS
+    fake_client.behaviour[GENERATION_MODELS[0]] = 0.2 # Long enough for concurrent requests to overlap
+    answer = SingleFlight()
+    monkeypatch.setattr(main, "answer_flights", answer)
+    return answer
+
+def post_concurrently(bodies):
+    import main
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await asyncio.gather(*[client.post("/api/answer", json=b) for b in bodies])
+    return asyncio.run(run())
+
+def test_identical_answers_in_flight_generate_once(api, flights):
+    question = "Devletin şekli nedir?"
+    docs = api.post("/api/retrieve", json={"question": question}).json()["context_docs"]
+    responses = post_concurrently([{"question": question, "context_docs": docs}] * 4)
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.json()["answer"] for r in responses}) == 1
+    assert (flights.started, flights.joined) == (1, 3)
+
+def test_forged_context_does_not_join_the_real_flight(api, flights):
+    question = "Devletin şekli nedir?"
+    docs = api.post("/api/retrieve", json={"question": question}).json()["context_docs"]
+    forged = [dict(docs[0], text="KONU: Devletin şekli\nMadde 1 – Türkiye Devleti bir Krallıktır.")] + docs[1:]
+    responses = post_concurrently([{"question": question, "context_docs": docs},
+                                   {"question": question, "context_docs": forged}])
+    assert {r.status_code for r in responses} == {200}
+    assert "Krallıktır" not in responses[0].json()["prompt"] and "Krallıktır" in responses[1].json()["prompt"]
+    assert (flights.started, flights.joined) == (2, 0)
+
+def test_short_client_deadline_does_not_share_its_504(api, flights, monkeypatch):
+    import main
+    monkeypatch.setitem(main.engine.router.config, "min_attempt", 0.05)
+    question = "Devletin şekli nedir?"
+    docs = api.post("/api/retrieve", json={"question": question}).json()["context_docs"]
+    body = {"question": question, "context_docs": docs}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await asyncio.gather(client.post("/api/answer", json=body, headers={"X-Request-Timeout-Ms": "100"}),
+                                        client.post("/api/answer", json=body))
+    hurried, patient = asyncio.run(run())
+    assert (hurried.status_code, patient.status_code) == (504, 200)
+    assert (flights.started, flights.joined) == (2, 0)
@@ -0,0 +1,24 @@
+import socket
+import subprocess
+import sys
+from types import SimpleNamespace
+import pytest
+from stress_test import port_in_use, start_offline, wait_until_up
+
+def test_exited_server_fails_fast():
+    proc = subprocess.Popen([sys.executable, "-c", "raise SystemExit(3)"])
+    proc.wait()
+    with pytest.raises(RuntimeError, match="exited with code 3"):
+        wait_until_up("http://127.0.0.1:9/", timeout=30, proc=proc)
+
+def test_busy_port_is_refused_before_starting_anything(monkeypatch):
+    monkeypatch.setattr(subprocess, "Popen", lambda *a, **kw: pytest.fail("started a process"))
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        port = sock.getsockname()[1]
+        assert port_in_use(port)
+        args = SimpleNamespace(mock_port=port, port=port, mock_latency=0, mock_429=0, mock_rpm=0, mock_5xx=0,
+                               mock_down_models="", workers=1)
+        with pytest.raises(RuntimeError, match=f"Port {port} is already in use"):
+            start_offline(args)
@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+from ttl_cache import EmbeddingCache, TTLCache, normalize_question
+
+def test_lru_eviction_and_counters():
+    cache = TTLCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1 # a is now the most recent
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(cache) == 2
+
+def test_expired_entries_miss():
+    cache = TTLCache(ttl=10)
+    cache.put("old", 1, stored_at=time.time() - 11)
+    cache.put("new", 2)
+    assert cache.get("old") is None
+    assert cache.peek("new") == 2
+    assert [k for k, _, _ in cache.items()] == ["new"]
+
+def test_peek_leaves_order_and_counters_alone():
+    cache = TTLCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.peek("a") == 1
+    cache.put("c", 3)
+    assert cache.peek("a") is None # peek did not refresh a
+    assert (cache.hits, cache.misses) == (0, 0)
+
+def test_normalize_question():
+    assert normalize_question("  Devletin   Şekli nedir? ") == "devletin şekli nedir"
+
+def test_embedding_cache_is_keyed_per_model():
+    cache = EmbeddingCache("models/a")
+    cache.put_vector("Soru?", [1.0, 2.0])
+    assert cache.get_vector("soru") == [1.0, 2.0]
+    assert EmbeddingCache("models/b").get_vector("soru") is None
+
+def test_periodic_save_runs_off_the_calling_thread(tmp_path, monkeypatch):
+    cache = EmbeddingCache("models/a", persist_path=str(tmp_path / "cache.json"), save_every=2)
+    saved_on = []
+    dump = json.dump
+    def slow_dump(*args, **kwargs):
+        saved_on.append(threading.current_thread())
+        time.sleep(0.2)
+        dump(*args, **kwargs)
+    monkeypatch.setattr(json, "dump", slow_dump)
+
+    started = time.perf_counter()
+    cache.put_vector("bir", [1.0])
+    cache.put_vector("iki", [2.0])
+    assert time.perf_counter() - started < 0.1 # The put did not wait for the dump
+    for thread in threading.enumerate():
+        if thread.name == "embedding-cache-save":
+            thread.join()
+    assert saved_on and saved_on[0] is not threading.current_thread()
+
+    reloaded = EmbeddingCache("models/a", persist_path=str(tmp_path / "cache.json"))
+    assert reloaded.get_vector("iki") == [2.0]
+    assert cache._unsaved == 0
+
+def test_load_ignores_other_models(tmp_path):
+    path = str(tmp_path / "cache.json")
+    first = EmbeddingCache("models/a", persist_path=path)
+    first.put_vector("soru", [1.0])
+    first.save()
+    assert len(EmbeddingCache("models/a", persist_path=path)) == 1
+    assert len(EmbeddingCache("models/b", persist_path=path)) == 0
@@ -0,0 +1,53 @@
+import json
+import math
+import numpy as np
+import pytest
+
+def python_cosine_ranking(vectors: list, query: list, n: int):
+    """The original pure-Python scoring loop of VectorStoreVercel.query, as a reference."""
+    query_norm = math.sqrt(sum(x * x for x in query))
+    scores = []
+    for doc_vec in vectors:
+        dot = sum(a * b for a, b in zip(doc_vec, query))
+        doc_norm = math.sqrt(sum(x * x for x in doc_vec))
+        scores.append(0.0 if query_norm * doc_norm == 0 else dot / (query_norm * doc_norm))
+    ranked = sorted(enumerate(scores), key=lambda x: x[1], reverse=True)[:n]
+    return [i for i, _ in ranked], [s for _, s in ranked]
+
+def test_matrix_scores_match_pure_python(store, records):
+    vectors = [r["embedding"] for r in records]
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        query = rng.standard_normal(len(vectors[0])).tolist()
+        expected_ids, expected_scores = python_cosine_ranking(vectors, query, 5)
+        result = store.search(query, n_results=5)
+        assert [m["madde"] for m in result["metadatas"][0]] == [records[i]["metadata"]["madde"] for i in expected_ids]
+        assert np.allclose([1 - d for d in result["distances"][0]], expected_scores, atol=1e-5)
+
+def test_scores_many_matches_single_queries(store):
+    queries = np.random.default_rng(1).standard_normal((4, store.matrix.shape[1]))
+    batch = store.scores_many(queries)
+    for row, query in zip(batch, queries):
+        assert np.allclose(row, store.scores(query), atol=1e-6)
+
+def test_zero_vectors_score_zero(tmp_path, records, fake_client):
+    from vector_store_vercel import VectorStoreVercel
+    records[0]["embedding"] = [0.0] * len(records[0]["embedding"])
+    path = tmp_path / "embeddings_gemini.json"
+    path.write_text(json.dumps(records), encoding="utf-8")
+    store = VectorStoreVercel(str(path))
+
+    assert store.scores(records[1]["embedding"])[0] == 0.0
+    assert not store.scores([0.0] * store.matrix.shape[1]).any()
+
+@pytest.mark.parametrize("k", [0, 1, 3, 100])
+def test_top_k_is_sorted_and_stable(k):
+    from vector_store_vercel import VectorStoreVercel
+    scores = np.array([0.5, 0.9, 0.5, 0.1, 0.9], dtype=np.float32)
+    expected = sorted(range(len(scores)), key=lambda i: -scores[i])[:k] # sorted() is stable too
+    assert VectorStoreVercel.top_k(scores, k).tolist() == expected
+
+def test_query_embeds_and_returns_the_topic(store):
+    result = store.query("Devletin şekli nedir?", n_results=3)
+    assert result["metadatas"][0][0]["konu"] == "Devletin şekli"
+    assert result["distances"][0] == sorted(result["distances"][0])